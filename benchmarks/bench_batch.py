@@ -0,0 +1,70 @@
+# Benchmark: batch mode (--batch) against one analyzer process per file,
+# and a check that every batch result is the text the per-file run printed.
+#
+#   python benchmarks/bench_batch.py                          # 200 files of 300 rows
+#   python benchmarks/bench_batch.py --files 1000 --rows 100 --workers 1 4 8
+#
+# All runs use --no-model-cache. The exit status is 1 when a batch result
+# differs from the per-file output.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from generate_students import write_students  # noqa: E402
+
+READER = os.path.join(BENCH_DIR, '..', 'utils', 'enhanced_csv_reader.py')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time batch mode against one process per file')
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    report = {'files': args.files, 'rows': args.rows, 'cpus': os.cpu_count(), 'batch': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = os.path.join(tmp, 'inputs')
+        os.makedirs(inputs)
+        for i in range(args.files):
+            write_students(os.path.join(inputs, f"class-{i:05d}.csv"), args.rows, seed=i)
+
+        expected = {}
+        start = time.perf_counter()
+        for name in sorted(os.listdir(inputs)):
+            proc = subprocess.run([sys.executable, READER, '--no-model-cache', os.path.join(inputs, name)],
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+            expected[name] = proc.stdout
+        report['per_file_s'] = round(time.perf_counter() - start, 3)
+        print(f"per-file processes   {report['per_file_s']:8.2f}s", file=sys.stderr)
+
+        for workers in args.workers:
+            out_dir = os.path.join(tmp, f"out-{workers}")
+            start = time.perf_counter()
+            subprocess.run([sys.executable, READER, '--no-model-cache', '--batch', inputs, '--batch-out', out_dir,
+                            '--batch-workers', str(workers)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            seconds = time.perf_counter() - start
+            identical = True
+            for name, text in expected.items():
+                with open(os.path.join(out_dir, f"{name}.json"), encoding='utf-8') as f:
+                    identical = identical and f.read() == text
+            entry = {'workers': workers, 'seconds': round(seconds, 3),
+                     'speedup': round(report['per_file_s'] / seconds, 2), 'identical': identical}
+            report['batch'].append(entry)
+            print(f"batch, {workers:>3} processes {seconds:8.2f}s  speedup {entry['speedup']:.2f}x  "
+                  f"identical {identical}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if not all(entry['identical'] for entry in report['batch']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Benchmark: cohort mode (--cohort) on 1, 2, 4, ... pool processes, and a
+# check that its per-student entries are those of a plain run.
+#
+#   python benchmarks/bench_cohorts.py                                  # 1M rows, 40 sections
+#   python benchmarks/bench_cohorts.py --rows 200000 --cohorts 12 --workers 1 2 4 8
+#
+# Every run is a separate `enhanced_csv_reader.py` process without the model
+# cache. A small file whose Section has both "unassigned" and blank values
+# runs first: each must get its own cohort. The exit status is 1 when that
+# check fails or a cohort run's "data" or "individual_student_analysis"
+# differs from the plain run.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from generate_students import make_students, write_students  # noqa: E402
+
+READER = os.path.join(BENCH_DIR, '..', 'utils', 'enhanced_csv_reader.py')
+
+
+def run_reader(file_path, extra):
+    # (parsed output, seconds) of one analyzer process
+    args = [sys.executable, READER, '--no-model-cache'] + extra + [file_path]
+    start = time.perf_counter()
+    proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return json.loads(proc.stdout), time.perf_counter() - start
+
+
+def identical_to(result, plain):
+    return (result['data'] == plain['data'] and result['analysis']['individual_student_analysis']
+            == plain['analysis']['individual_student_analysis'])
+
+
+def unassigned_check(tmp, seed):
+    # A cohort literally named "unassigned" next to rows with no cohort
+    path = os.path.join(tmp, 'unassigned.csv')
+    df = make_students(2000, seed=seed, cohorts=4)
+    df.loc[df.index % 5 == 0, 'Section'] = 'unassigned'
+    df.loc[df.index % 7 == 0, 'Section'] = None
+    df.to_csv(path, index=False)
+    plain, _ = run_reader(path, [])
+    result, _ = run_reader(path, ['--cohort', 'Section', '--cohort-workers', '2'])
+    cohorts = result['analysis']['cohorts']
+    return (identical_to(result, plain) and {'unassigned', 'unassigned (2)'} <= set(cohorts)
+            and sum(block['total_students'] for block in cohorts.values()) == len(df))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time cohort mode against the number of pool processes')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--cohorts', type=int, default=40)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[n for n in (1, 2, 4, 8, 16) if n <= (os.cpu_count() or 1)])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    report = {'rows': args.rows, 'cohorts': args.cohorts, 'cpus': os.cpu_count(), 'runs': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'district.csv')
+        report['unassigned_check'] = unassigned_check(tmp, args.seed)
+        print(f"unassigned check {report['unassigned_check']}", file=sys.stderr)
+        write_students(path, args.rows, seed=args.seed, cohorts=args.cohorts)
+        plain, plain_s = run_reader(path, [])
+        report['plain_s'] = round(plain_s, 3)
+        print(f"plain           {plain_s:7.2f}s", file=sys.stderr)
+
+        for workers in args.workers:
+            result, seconds = run_reader(path, ['--cohort', 'Section', '--cohort-workers', str(workers)])
+            identical = identical_to(result, plain)
+            entry = {'workers': workers, 'seconds': round(seconds, 3),
+                     'speedup': round(report['runs'][0]['seconds'] / seconds, 2) if report['runs'] else 1.0,
+                     'identical': identical}
+            report['runs'].append(entry)
+            print(f"{workers:>3} processes   {seconds:7.2f}s  speedup {entry['speedup']:.2f}x  "
+                  f"identical {identical}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if not report['unassigned_check'] or not all(entry['identical'] for entry in report['runs']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
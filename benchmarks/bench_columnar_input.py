@@ -0,0 +1,80 @@
+# Benchmark: the same roster as CSV, Parquet and Arrow, in the streaming
+# modes, and a check that the formats give the same output.
+#
+#   python benchmarks/bench_columnar_input.py                     # 100k rows, chunks of 10000
+#   python benchmarks/bench_columnar_input.py --rows 1000000 --chunksize 50000
+#
+# Each format runs `enhanced_csv_reader.py --chunksize` and `--ndjson
+# --chunksize` (no model cache). Parquet and Arrow files are read in record
+# batches, so their chunks must carry on numbering rows where the previous
+# one stopped, as read_csv(chunksize=...) does. The exit status is 1 when a
+# format's per-student entries (and so their "index"), or NDJSON student
+# lines, differ from those of the CSV.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from generate_students import write_students  # noqa: E402
+
+READER = os.path.join(BENCH_DIR, '..', 'utils', 'enhanced_csv_reader.py')
+
+
+def run_reader(file_path, extra):
+    # (stdout, seconds) of one analyzer process
+    args = [sys.executable, READER, '--no-model-cache'] + extra + [file_path]
+    start = time.perf_counter()
+    proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True)
+    return proc.stdout, time.perf_counter() - start
+
+
+def students(text, ndjson):
+    # per-student entries of a --chunksize result, or the student lines of --ndjson
+    if ndjson:
+        return [line for line in text.splitlines() if json.loads(line).get('type') == 'student']
+    return json.loads(text)['analysis']['individual_student_analysis']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare CSV, Parquet and Arrow inputs in the streaming modes')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--chunksize', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    report = {'rows': args.rows, 'chunksize': args.chunksize, 'runs': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {'csv': os.path.join(tmp, 'students.csv')}
+        write_students(paths['csv'], args.rows, seed=args.seed)
+        df = pd.read_csv(paths['csv'])
+        # uploads have no extension; the format is recognised from the bytes
+        paths['parquet'] = os.path.join(tmp, 'students-parquet')
+        df.to_parquet(paths['parquet'], index=False)
+        paths['arrow'] = os.path.join(tmp, 'students-arrow')
+        df.to_feather(paths['arrow'])
+
+        for mode, extra in (('json', []), ('ndjson', ['--ndjson'])):
+            expected = None
+            for fmt, path in paths.items():
+                text, seconds = run_reader(path, extra + ['--chunksize', str(args.chunksize)])
+                entries = students(text, mode == 'ndjson')
+                if expected is None:
+                    expected = entries
+                entry = {'mode': mode, 'format': fmt, 'seconds': round(seconds, 3), 'identical': entries == expected}
+                report['runs'].append(entry)
+                print(f"{mode:<6} {fmt:<7} {seconds:7.2f}s  identical {entry['identical']}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if not all(entry['identical'] for entry in report['runs']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
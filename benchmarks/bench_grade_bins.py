@@ -0,0 +1,72 @@
+# Benchmark: grade_distribution as value_counts() against GradeBins
+# histograms, and a check that every layout counts every mark once.
+#
+#   python benchmarks/bench_grade_bins.py                 # 1M marks
+#   python benchmarks/bench_grade_bins.py --rows 100000
+#
+# The columns include the ones whose bin labels used to repeat: constant
+# 1e6 and 85.5 marks and a range narrower than the printed precision. The
+# exit status is 1 when a distribution's counts do not add up to the
+# number of non-null marks, or it has fewer labels than bins.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from grade_bins import GradeBins  # noqa: E402
+
+
+def columns(n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    marks = np.clip(np.round(rng.normal(68, 14, n_rows)), 0, 100)
+    marks[rng.random(n_rows) < 0.02] = np.nan
+    return {
+        'integer_marks': marks,
+        'fractional_marks': np.clip(rng.normal(68, 14, n_rows), 0, 100).round(2),
+        'constant_1e6': np.full(n_rows, 1e6),
+        'constant_85_5': np.full(n_rows, 85.5),
+        'narrow_range': 1e6 + rng.random(n_rows) * 1e-3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time GradeBins histograms and check their counts')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    layouts = {'bins=10': GradeBins(n_bins=10), 'bins=20': GradeBins(n_bins=20),
+               'edges': GradeBins.parse_bins('0,40,60,75,90,100'), 'bands': GradeBins.parse_bands()}
+    report = {'rows': args.rows, 'columns': {}}
+    ok = True
+    for name, values in columns(args.rows, args.seed).items():
+        present = int((~np.isnan(values)).sum())
+        start = time.perf_counter()
+        distinct = len(pd.Series(values).value_counts())
+        entry = {'value_counts_s': round(time.perf_counter() - start, 4), 'distinct': distinct}
+        for layout_name, layout in layouts.items():
+            start = time.perf_counter()
+            distribution = layout.histogram(values)
+            seconds = time.perf_counter() - start
+            counted = sum(distribution.values())
+            labels_ok = layout.n_bins is None or len(distribution) >= layout.n_bins
+            entry[layout_name] = {'seconds': round(seconds, 4), 'counted': counted, 'labels': len(distribution),
+                                  'ok': counted == present and labels_ok}
+            ok = ok and entry[layout_name]['ok']
+        report['columns'][name] = entry
+        print(f"{name:<18} value_counts {entry['value_counts_s']:7.3f}s ({distinct} entries)  "
+              f"bins=10 {entry['bins=10']['seconds']:7.3f}s  ok "
+              f"{all(entry[n]['ok'] for n in layouts)}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Benchmark: peak memory of the default vs the --lean analyzer, and a check
+# that both print exactly the same result.
+#
+#   python benchmarks/bench_lean.py                       # 100k and 1M rows
+#   python benchmarks/bench_lean.py --rows 10000 --subjects 8
+#
+# Each run is a separate `enhanced_csv_reader.py` process (no model cache, so
+# both fit the model); its peak RSS comes from wait4(). The exit status is 1
+# when the two outputs differ.
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from generate_students import write_students  # noqa: E402
+
+READER = os.path.join(BENCH_DIR, '..', 'utils', 'enhanced_csv_reader.py')
+
+
+def run_reader(file_path, lean):
+    # (sha256 of stdout, seconds, peak RSS in MB) of one analyzer process
+    args = [sys.executable, READER, '--no-model-cache'] + (['--lean'] if lean else []) + [file_path]
+    digest = hashlib.sha256()
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as out:
+        proc = subprocess.Popen(args, stdout=out, stderr=subprocess.DEVNULL)
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        seconds = time.perf_counter() - start
+        if proc.returncode:
+            raise RuntimeError(f"{' '.join(args)} exited with {proc.returncode}")
+        out.seek(0)
+        for block in iter(lambda: out.read(1 << 20), b''):
+            digest.update(block)
+    peak = usage.ru_maxrss / 2**20 if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    return digest.hexdigest(), seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare peak memory and output of the default and lean analyzer')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--subjects', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.rows:
+            path = os.path.join(tmp, f'students-{n_rows}.csv')
+            write_students(path, n_rows, args.subjects, seed=args.seed)
+            default_hash, default_s, default_mb = run_reader(path, lean=False)
+            lean_hash, lean_s, lean_mb = run_reader(path, lean=True)
+            entry = {'rows': n_rows,
+                     'default_peak_mb': round(default_mb, 1), 'lean_peak_mb': round(lean_mb, 1),
+                     'memory_ratio': round(lean_mb / default_mb, 3),
+                     'default_s': round(default_s, 3), 'lean_s': round(lean_s, 3),
+                     'identical': default_hash == lean_hash}
+            report.append(entry)
+            print(f"{n_rows:>9} rows  peak {default_mb:8.0f} MB -> {lean_mb:8.0f} MB "
+                  f"({entry['memory_ratio']:.2f}x)  time {default_s:7.2f}s -> {lean_s:7.2f}s  "
+                  f"identical {entry['identical']}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if not all(entry['identical'] for entry in report):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Benchmark: ingesting an analysis result into MongoDB one student per round
+# trip (what StudentController.saveStudentsToDatabase() does: findOne, then
+# save) against the batched upserts of mongo_sink.
+#
+#   python benchmarks/bench_mongo_sink.py                                   # 100k rows, local MongoDB
+#   python benchmarks/bench_mongo_sink.py --uri mongodb://db:27017/bench --batch-size 500 2000
+#   python benchmarks/bench_mongo_sink.py --memory                          # in-memory stand-in, no server
+#
+# The collection (default "students_bench") is dropped before every run and
+# after the last. Rows the Student model would reject are skipped by both.
+# The exit status is 1 when a batched run leaves a different number of
+# documents than the per-student run.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+UTILS_DIR = os.path.join(BENCH_DIR, '..', 'utils')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, UTILS_DIR)
+from generate_students import write_students  # noqa: E402
+import mongo_sink  # noqa: E402
+
+
+def analysis_result(rows, seed):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'students.csv')
+        write_students(path, rows, seed=seed)
+        proc = subprocess.run([sys.executable, os.path.join(UTILS_DIR, 'enhanced_csv_reader.py'), '--no-model-cache',
+                               path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return json.loads(proc.stdout)
+
+
+def one_by_one(collection, result):
+    # A find and a write per student, like the controller's loop
+    now = datetime.now(timezone.utc)
+    individual = result['analysis']['individual_student_analysis']
+    for i, (record, student) in enumerate(zip(result['data'], individual)):
+        try:
+            student_id, fields, defaults = mongo_sink.student_document(record, student, i, now)
+        except ValueError:
+            continue
+        existing = collection.find_one({'student_id': student_id})
+        if existing is None:
+            collection.insert_one({'student_id': student_id, **defaults, **fields})
+        else:
+            collection.update_one({'_id': existing['_id']}, {'$set': fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time batched MongoDB upserts against one round trip per student')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1000])
+    parser.add_argument('--uri', default=mongo_sink.default_uri())
+    parser.add_argument('--collection', default='students_bench')
+    parser.add_argument('--memory', action='store_true', help='use the in-memory stand-in instead of a server')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    result = analysis_result(args.rows, args.seed)
+    report = {'rows': args.rows, 'batched': []}
+
+    if args.memory:
+        for batch_size in args.batch_size:
+            target = mongo_sink.MemoryTarget()
+            sink = mongo_sink.write_students(target, result, batch_size)
+            report['batched'].append({'batch_size': batch_size, 'seconds': sink['seconds'], 'report': sink,
+                                      'documents': len(target.documents)})
+            print(f"memory, batches of {batch_size:>5}  {sink['seconds']:8.2f}s", file=sys.stderr)
+        print(json.dumps(report, indent=2))
+        return
+
+    target = mongo_sink.MongoTarget(args.uri, args.collection)
+    collection = target.collection
+    try:
+        collection.drop()
+        collection.create_index('student_id', unique=True)
+        start = time.perf_counter()
+        one_by_one(collection, result)
+        report['one_by_one_s'] = round(time.perf_counter() - start, 3)
+        expected = collection.count_documents({})
+        print(f"one by one               {report['one_by_one_s']:8.2f}s", file=sys.stderr)
+
+        for batch_size in args.batch_size:
+            collection.drop()
+            collection.create_index('student_id', unique=True)
+            sink = mongo_sink.write_students(target, result, batch_size)
+            documents = collection.count_documents({})
+            entry = {'batch_size': batch_size, 'seconds': sink['seconds'],
+                     'speedup': round(report['one_by_one_s'] / sink['seconds'], 1), 'report': sink,
+                     'documents': documents, 'ok': documents == expected}
+            report['batched'].append(entry)
+            print(f"batches of {batch_size:>5}          {sink['seconds']:8.2f}s  speedup {entry['speedup']}x",
+                  file=sys.stderr)
+    finally:
+        collection.drop()
+        target.close()
+
+    print(json.dumps(report, indent=2))
+    if not all(entry['ok'] for entry in report['batched']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
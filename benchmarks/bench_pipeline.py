@@ -0,0 +1,174 @@
+# Benchmark: the whole enhanced_csv_reader.py pipeline, stage by stage.
+#
+#   python benchmarks/bench_pipeline.py                          # 1k ... 5M rows
+#   python benchmarks/bench_pipeline.py --sizes 1000 100000 --output results.json
+#   python benchmarks/bench_pipeline.py --save-baseline          # store benchmarks/baseline.json
+#   python benchmarks/bench_pipeline.py --tolerance 0.2          # fail on >20% slowdowns
+#   python benchmarks/bench_pipeline.py --sizes 1000000 --ml-budget 30   # adaptive ML stage
+#
+# Input files come from generate_students.py (seeded, so every run measures
+# the same data) and are kept in --data-dir between runs. Each size is one
+# run of enhanced_csv_reader.py (no model cache) in a fresh process, so peak
+# RSS is not inherited from a bigger size. Its stages are the ones the
+# analyzer records itself: the report holds, from the --diagnostics-events
+# lines of utils/diagnostics.py, each stage's wall and CPU seconds, rows per
+# second and the process peak RSS at its end.
+#
+# With a baseline file present, stage times that grew by more than
+# --tolerance (and by at least --min-seconds, so millisecond noise does not
+# count) are reported as regressions and the exit status is 1.
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+READER = os.path.join(BENCH_DIR, '..', 'utils', 'enhanced_csv_reader.py')
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 5_000_000]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+STAGES = ['parse', 'cleaning', 'records', 'summary_stats', 'student_analysis', 'ml_fit', 'predict', 'serialization']
+
+
+def run_stages(file_path, n_rows, ml_budget=None):
+    """Run the analyzer on `file_path` and collect its stage records."""
+    budget = ['--ml-budget', str(ml_budget)] if ml_budget else []
+    args = [sys.executable, READER, '--no-model-cache', '--diagnostics-events'] + budget + [file_path]
+    with tempfile.TemporaryFile() as out:
+        proc = subprocess.run(args, stdout=out, stderr=subprocess.PIPE, text=True, check=True)
+        output_bytes = os.fstat(out.fileno()).st_size
+        strategy = None
+        if ml_budget:
+            out.seek(0)
+            strategy = json.load(out)['analysis']['ml_predictions'].get('strategy')
+
+    stages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('{"event"'):
+            continue
+        event = json.loads(line)
+        if event['event'] != 'stage':
+            continue
+        seconds = event['wall_s']
+        stages[event['stage']] = {
+            'seconds': seconds,
+            'cpu_s': event['cpu_s'],
+            'rows_per_s': round(n_rows / seconds) if n_rows and seconds > 0 else None,
+            'peak_rss_mb': event['peak_rss_mb'],
+        }
+    run = {'rows': n_rows, 'output_mb': round(output_bytes / 2**20, 1), 'stages': stages,
+           'total_seconds': round(sum(r['seconds'] for r in stages.values()), 4)}
+    if strategy is not None:
+        run['ml_strategy'] = strategy
+    return run
+
+
+def environment():
+    import numpy
+    import pandas
+    import sklearn
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def compare(report, baseline, tolerance, min_seconds):
+    # Stage slowdowns beyond tolerance, as printable lines
+    regressions = []
+    old_runs = {run['rows']: run for run in baseline.get('runs', [])}
+    for run in report['runs']:
+        old = old_runs.get(run['rows'])
+        if old is None:
+            continue
+        for name, result in run['stages'].items():
+            before = old['stages'].get(name, {}).get('seconds')
+            after = result['seconds']
+            if before is None:
+                continue
+            if after > before * (1 + tolerance) and after - before >= min_seconds:
+                regressions.append(f"{run['rows']:>9} rows  {name:<17} {before:.3f}s -> {after:.3f}s "
+                                   f"(+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the analysis pipeline stage by stage')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='row counts to run')
+    parser.add_argument('--subjects', type=int, default=4)
+    parser.add_argument('--missing-rate', type=float, default=0.02)
+    parser.add_argument('--bad-email-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, '..', '.cache', 'bench-data'),
+                        help='where generated CSVs are kept (default: <repo>/.cache/bench-data)')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline report to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store this report as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown per stage before it counts as a regression (default: 0.25)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='ignore slowdowns smaller than this many seconds (default: 0.05)')
+    parser.add_argument('--ml-budget', type=float, metavar='SECONDS',
+                        help='fit with the adaptive ML stage under this budget (see utils/ml_strategy.py)')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    from generate_students import write_students
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {'environment': environment(),
+              'generator': {'subjects': args.subjects, 'missing_rate': args.missing_rate,
+                            'bad_email_rate': args.bad_email_rate, 'seed': args.seed},
+              'runs': []}
+    for n_rows in args.sizes:
+        path = os.path.join(args.data_dir, f'students-{n_rows}-s{args.subjects}-m{args.missing_rate}'
+                                           f'-e{args.bad_email_rate}-seed{args.seed}.csv')
+        if not os.path.exists(path):
+            print(f"Generating {n_rows} rows ...", file=sys.stderr)
+            write_students(path, n_rows, args.subjects, args.missing_rate, args.bad_email_rate, args.seed)
+
+        run = run_stages(path, n_rows, args.ml_budget)
+        report['runs'].append(run)
+        print(f"{n_rows:>9} rows  " + '  '.join(f"{name} {run['stages'][name]['seconds']:.3f}s"
+                                                 for name in STAGES if name in run['stages'])
+              + f"  peak {max(r['peak_rss_mb'] for r in run['stages'].values()):.0f} MB", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(text + '\n')
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != report['environment']:
+        print("Warning: baseline was recorded in a different environment", file=sys.stderr)
+    regressions = compare(report, baseline, args.tolerance, args.min_seconds)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
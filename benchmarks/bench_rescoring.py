@@ -0,0 +1,85 @@
+# Benchmark: what-if rescoring (rescoring.py) of a saved analysis under
+# random policies, and a check that the default policy reproduces the
+# analysis' risk results.
+#
+#   python benchmarks/bench_rescoring.py                       # 1M rows, 200 policies
+#   python benchmarks/bench_rescoring.py --rows 100000 --policies 1000
+#
+# The analyzer runs once with --save-scores (no model cache). The report has
+# the median and p99 seconds per policy and the resulting policies per
+# second. The exit status is 1 when the default policy's risk scores, risk
+# levels or at-risk students differ from the analysis output.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+UTILS_DIR = os.path.join(BENCH_DIR, '..', 'utils')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, UTILS_DIR)
+from generate_students import write_students  # noqa: E402
+from rescoring import Rescorer  # noqa: E402
+
+
+def random_policy(rng):
+    academic = rng.uniform(0.4, 0.8)
+    attendance = rng.uniform(0.0, 1.0 - academic)
+    return {
+        'weights': {'academic': academic, 'attendance': attendance, 'study_hours': 1.0 - academic - attendance},
+        # distinct tenths, so the cutoffs increase strictly
+        'academic_cutoffs': sorted((rng.choice(np.arange(300, 900), 3, replace=False) / 10).tolist()),
+        'attendance_cutoffs': sorted((rng.choice(np.arange(600, 980), 3, replace=False) / 10).tolist()),
+        'risk_levels': {'high': int(rng.integers(50, 80)), 'medium': int(rng.integers(20, 50))},
+        'ml_percentile': float(rng.uniform(10, 50)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time rescoring under random policies')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--policies', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'students.csv')
+        scores_path = os.path.join(tmp, 'scores.npz')
+        write_students(csv_path, args.rows, seed=args.seed)
+        proc = subprocess.run([sys.executable, os.path.join(UTILS_DIR, 'enhanced_csv_reader.py'), '--no-model-cache',
+                               '--save-scores', scores_path, csv_path],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+        analysis = json.loads(proc.stdout)['analysis']
+        rescorer = Rescorer(scores_path)
+
+    default = rescorer.rescore({}, details=True)
+    individual = analysis['individual_student_analysis']
+    expected_at_risk = analysis['risk_analysis'].get('at_risk_students',
+                                                     [i for i, s in enumerate(individual) if s['at_risk']])
+    matches = (default['risk_score'] == [s['risk_score'] for s in individual]
+               and default['risk_level'] == [s['risk_level'] for s in individual]
+               and default['risk_analysis']['at_risk_students'] == expected_at_risk)
+
+    rng = np.random.default_rng(args.seed)
+    seconds = np.array([rescorer.rescore(random_policy(rng))['seconds'] for _ in range(args.policies)])
+    report = {
+        'rows': args.rows,
+        'policies': args.policies,
+        'median_s': round(float(np.median(seconds)), 4),
+        'p99_s': round(float(np.percentile(seconds, 99)), 4),
+        'policies_per_s': round(float(1 / np.median(seconds)), 1),
+        'default_matches_analysis': matches,
+    }
+    print(f"median {report['median_s'] * 1e3:.1f}ms  p99 {report['p99_s'] * 1e3:.1f}ms  "
+          f"{report['policies_per_s']} policies/s  default matches {matches}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    if not matches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
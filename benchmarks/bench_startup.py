@@ -0,0 +1,117 @@
+# Benchmark: start-up cost of enhanced_csv_reader.py on small uploads, and
+# how much of it is spent importing pandas, numpy, scipy and sklearn.
+#
+#   python benchmarks/bench_startup.py                      # this tree
+#   python benchmarks/bench_startup.py --before HEAD~1      # and the utils/ of an older commit
+#
+# Scenarios, each a fresh process run --repeat times (median reported):
+#   import  `import enhanced_csv_reader` and nothing else
+#   no_ml   a 200-row file with a single numeric column, so no model is fitted
+#   small   a 200-row generate_students.py file (model fitted, no model cache)
+#   cached  the same file answered from the result cache, as the Node
+#           controller runs it (--result-cache); a warm-up run stores it
+# Import costs come from `python -X importtime`: the cumulative time of the
+# outermost import of each package, so a package first imported by another
+# (numpy by pandas) is counted in both.
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from generate_students import write_students  # noqa: E402
+
+PACKAGES = ['pandas', 'numpy', 'scipy', 'sklearn']
+SMALL_ROWS = 200
+
+
+def import_costs(stderr):
+    # {package: seconds} from -X importtime output
+    costs = {}
+    depth = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        indent = len(name) - len(name.lstrip())
+        name = name.strip()
+        if name in PACKAGES and indent <= depth.get(name, indent):
+            depth[name] = indent
+            costs[name] = int(cumulative) / 1e6
+    return costs
+
+
+def run_once(utils_dir, args):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=utils_dir,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    return time.perf_counter() - start, import_costs(proc.stderr)
+
+
+def measure(utils_dir, scenarios, repeat):
+    report = {}
+    for name, args in scenarios.items():
+        run_once(utils_dir, args)  # warm-up, and fills the result cache
+        runs = [run_once(utils_dir, args) for _ in range(repeat)]
+        report[name] = {
+            'seconds': round(statistics.median(seconds for seconds, _ in runs), 3),
+            'imports': {pkg: round(statistics.median(costs.get(pkg, 0.0) for _, costs in runs), 3)
+                        for pkg in PACKAGES},
+        }
+    return report
+
+
+def extract_utils(rev, directory):
+    # utils/ of commit `rev`, unpacked under directory
+    archive = subprocess.run(['git', 'archive', rev, 'utils'], cwd=REPO_DIR, stdout=subprocess.PIPE, check=True)
+    with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar:
+        tar.extractall(directory)
+    return os.path.join(directory, 'utils')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure start-up and import cost of the analyzer')
+    parser.add_argument('--before', metavar='REV', help='also measure utils/ as of this git revision')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        no_ml = os.path.join(tmp, 'no_ml.csv')
+        with open(no_ml, 'w') as f:
+            f.write('Student_Id,Name,Section,Maths\n')
+            for i in range(1, SMALL_ROWS + 1):
+                f.write(f"{i},Student {i},{'AB'[i % 2]},{40 + i % 60}\n")
+        small = os.path.join(tmp, 'small.csv')
+        write_students(small, SMALL_ROWS)
+        scenarios = {
+            'import': ['-c', 'import enhanced_csv_reader'],
+            'no_ml': ['enhanced_csv_reader.py', '--no-model-cache', no_ml],
+            'small': ['enhanced_csv_reader.py', '--no-model-cache', small],
+            'cached': ['enhanced_csv_reader.py', '--cache-dir', os.path.join(tmp, 'cache'), '--result-cache',
+                       small],
+        }
+
+        report = {'after': measure(os.path.join(REPO_DIR, 'utils'), scenarios, args.repeat)}
+        if args.before:
+            report['before'] = measure(extract_utils(args.before, os.path.join(tmp, 'before')), scenarios,
+                                       args.repeat)
+
+    for name in scenarios:
+        for label in ('before', 'after'):
+            if label in report:
+                entry = report[label][name]
+                print(f"{name:<7} {label:<6} {entry['seconds']:6.3f}s  " + '  '.join(
+                    f"{pkg} {entry['imports'][pkg]:.3f}s" for pkg in PACKAGES), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
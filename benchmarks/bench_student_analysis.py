@@ -0,0 +1,82 @@
+# Benchmark: per-student analysis, iterrows() loop vs column-wise engine.
+#
+#   python benchmarks/bench_student_analysis.py                 # 10k, 100k, 1M rows
+#   python benchmarks/bench_student_analysis.py --rows 5000 50000
+#
+# The row-wise reference takes minutes at 1M rows, so it is only run up to
+# --rowwise-limit rows; above that only the vectorized engine is timed.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from student_analysis import analyze_students  # noqa: E402
+from student_analysis_rowwise import analyze_students_rowwise  # noqa: E402
+
+IDENTIFIER_COLUMNS = ['Student_Id', 'Name', 'Email']
+
+
+def make_frame(n_rows, seed=42):
+    # Same layout as sample.csv, with a few missing marks sprinkled in
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Student_Id': np.arange(1, n_rows + 1),
+        'Name': [f'Student {i}' for i in range(n_rows)],
+        'Email': [f'student{i}@school.edu' for i in range(n_rows)],
+        'Maths': rng.integers(0, 101, n_rows).astype(float),
+        'English': rng.integers(0, 101, n_rows).astype(float),
+        'Science': rng.integers(0, 101, n_rows).astype(float),
+        'Physics': rng.integers(0, 101, n_rows).astype(float),
+        'Attendence': rng.integers(50, 101, n_rows),
+        'Study_Hours': rng.integers(0, 11, n_rows),
+        'Final_Grade': rng.normal(70, 12, n_rows).round(2),
+    })
+    for col in ['Maths', 'English', 'Science', 'Physics']:
+        df.loc[rng.random(n_rows) < 0.02, col] = np.nan
+    return df
+
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the per-student analysis engines')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--rowwise-limit', type=int, default=100_000,
+                        help='largest row count to run the iterrows() reference on')
+    args = parser.parse_args()
+
+    report = []
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        analysis_df = df.drop(columns=IDENTIFIER_COLUMNS)
+
+        vectorized, vectorized_s = time_call(analyze_students, df, analysis_df, IDENTIFIER_COLUMNS)
+        entry = {'rows': n_rows, 'vectorized_s': round(vectorized_s, 4),
+                 'rowwise_s': None, 'speedup': None, 'identical': None}
+
+        if n_rows <= args.rowwise_limit:
+            rowwise, rowwise_s = time_call(analyze_students_rowwise, df, analysis_df, IDENTIFIER_COLUMNS)
+            entry['rowwise_s'] = round(rowwise_s, 4)
+            entry['speedup'] = round(rowwise_s / vectorized_s, 1)
+            entry['identical'] = json.dumps(vectorized) == json.dumps(rowwise)
+
+        report.append(entry)
+        print(f"{n_rows:>9} rows  vectorized {vectorized_s:8.3f}s  "
+              f"rowwise {entry['rowwise_s'] if entry['rowwise_s'] is not None else '-':>8}  "
+              f"speedup {entry['speedup'] if entry['speedup'] is not None else '-':>6}  "
+              f"identical {entry['identical']}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Benchmark: lookups in a student store (--student-store) against parsing
+# the result JSON.
+#
+#   python benchmarks/bench_student_store.py                   # 1M rows, 10000 lookups
+#   python benchmarks/bench_student_store.py --rows 200000 --lookups 50000
+#
+# The analyzer runs once (no model cache) and writes both outputs; the
+# report has the time to open the store, per-lookup latency percentiles in
+# microseconds, the at-risk query (first 50) and the time json.load() takes
+# on the full result. The exit status is 1 when a looked-up student does not
+# match its entry in the JSON, or when the dashboard figures and the
+# --db-at-risk list differ from those of the documents the database sink
+# writes (into mongo_sink.MemoryTarget, as getDashboardStats() and
+# getAtRiskStudents() would compute them).
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+UTILS_DIR = os.path.join(BENCH_DIR, '..', 'utils')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, UTILS_DIR)
+from generate_students import write_students  # noqa: E402
+import mongo_sink  # noqa: E402
+from student_store import PERFORMANCE_BANDS, StudentStore  # noqa: E402
+
+
+def database_view(result):
+    # (getDashboardStats() figures, getAtRiskStudents() ids) of the sink's documents
+    target = mongo_sink.MemoryTarget()
+    mongo_sink.write_students(target, result)
+    documents = list(target.documents.values())
+    distribution = dict.fromkeys([band for band, _ in PERFORMANCE_BANDS] + ['poor'], 0)
+    for document in documents:
+        # the Student model's overall_performance virtual
+        grades = [g for g in document['grades'].values() if g is not None]
+        performance = sum(grades) / len(grades) if grades else (document.get('final_grade') or 0)
+        band = next((band for band, low in PERFORMANCE_BANDS if performance >= low), 'poor')
+        distribution[band] += 1
+    at_risk = [d['student_id'] for d in documents if d['at_risk']]
+    total = len(documents)
+    stats = {
+        'totalStudents': total,
+        'atRiskStudents': len(at_risk),
+        'highRiskStudents': sum(d['risk_level'] == 'high' for d in documents),
+        'mediumRiskStudents': sum(d['risk_level'] == 'medium' for d in documents),
+        'atRiskPercentage': len(at_risk) / total * 100 if total else 0,
+        'performanceDistribution': distribution,
+    }
+    return stats, at_risk
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time student store lookups')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'students.csv')
+        json_path = os.path.join(tmp, 'result.json')
+        store_path = os.path.join(tmp, 'store')
+        write_students(csv_path, args.rows, seed=args.seed)
+        with open(json_path, 'w') as out:
+            subprocess.run([sys.executable, os.path.join(UTILS_DIR, 'enhanced_csv_reader.py'), '--no-model-cache',
+                            '--student-store', store_path, csv_path],
+                           stdout=out, stderr=subprocess.DEVNULL, check=True)
+
+        start = time.perf_counter()
+        store = StudentStore(store_path)
+        open_s = time.perf_counter() - start
+
+        key = store.meta['key']
+        rng = np.random.default_rng(args.seed)
+        rows = rng.integers(0, len(store), args.lookups)
+        ids = [store.record(int(row))[key] for row in rows]
+        latencies = np.empty(len(ids))
+        found = []
+        for i, student_id in enumerate(ids):
+            start = time.perf_counter()
+            found.append(store.student(student_id))
+            latencies[i] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        at_risk = store.at_risk(limit=50)
+        at_risk_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(json_path) as f:
+            result = json.load(f)
+        json_s = time.perf_counter() - start
+
+        dashboard, db_ids = database_view(result)
+        key = store.meta['key']
+        matches_database = (store.dashboard() == dashboard
+                            and [str(entry[key]) for entry in store.db_at_risk()] == db_ids)
+
+    individual = result['analysis']['individual_student_analysis']
+    matches = all(entry is not None and entry['risk_score'] == individual[entry['row']]['risk_score']
+                  and entry['overall_performance'] == individual[entry['row']]['overall_performance']
+                  for entry in found)
+    micros = latencies * 1e6
+    report = {
+        'rows': args.rows,
+        'open_ms': round(open_s * 1e3, 3),
+        'lookup_us': {q: round(float(np.percentile(micros, q)), 1) for q in (50, 90, 99)},
+        'at_risk_first_50_ms': round(at_risk_s * 1e3, 3),
+        'at_risk_returned': len(at_risk),
+        'json_load_s': round(json_s, 3),
+        'matches': matches,
+        'matches_database': matches_database,
+    }
+    print(f"open {report['open_ms']:.2f}ms  lookup p50 {report['lookup_us'][50]}us p99 {report['lookup_us'][99]}us"
+          f"  at-risk {report['at_risk_first_50_ms']:.1f}ms  json.load {json_s:.2f}s", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    if not matches or not matches_database:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Seeded generator of realistic student CSVs for the benchmarks.
+#
+#   python benchmarks/generate_students.py --rows 100000 -o /tmp/students.csv
+#   python benchmarks/generate_students.py --rows 1000000 --subjects 8 --missing-rate 0.05 \
+#       --bad-email-rate 0.02 --seed 7 -o /tmp/students.csv
+#   python benchmarks/generate_students.py --rows 100000 --cohorts 40 -o /tmp/district.csv
+#
+# Layout follows sample.csv (Student_Id, Name, Email, subject marks,
+# attendance, study hours, Final_Grade). Each student has an underlying
+# ability that drives all of their marks, and Final_Grade depends on the
+# marks, attendance and study hours, so the ML stage has something to learn.
+# With --cohorts a Section column assigns every student to one of that many
+# sections (drawn last, so the other columns do not change).
+# The same arguments always produce the same file; rows are generated in
+# fixed-size chunks, so memory stays flat however many rows are asked for.
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+SUBJECTS = ['Maths', 'English', 'Science', 'Physics', 'Chemistry', 'Biology', 'History']
+FIRST_NAMES = ['Aarav', 'Aditi', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Neha', 'Priya', 'Rahul',
+               'Rohan', 'Saanvi', 'Sneha', 'Tanvi', 'Vihaan', 'Vikram', 'Anika', 'Kabir', 'Riya', 'Zoya']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Das', 'Mehta',
+              'Joshi', 'Kapoor', 'Khan', 'Bose', 'Chopra', 'Rao', 'Pandey', 'Mishra', 'Agarwal', 'Malhotra']
+# Ways an exported email goes wrong: (prefix, replacement for '@', suffix)
+BAD_EMAILS = [('', '', ''), ('', '@@', ''), (' ', '@', ' x'), ('', '@', '.')]
+CHUNK_ROWS = 100_000
+
+
+def subject_columns(n_subjects):
+    names = SUBJECTS[:n_subjects]
+    names += [f'Elective_{i}_Score' for i in range(1, n_subjects - len(names) + 1)]
+    return names
+
+
+def make_students(n_rows, n_subjects=4, missing_rate=0.02, bad_email_rate=0.01, seed=42, start=0, rng=None,
+                  cohorts=0):
+    """DataFrame of `n_rows` students, numbered from `start` + 1."""
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    ids = np.arange(start + 1, start + n_rows + 1)
+    first = np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), n_rows)]
+    last = np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), n_rows)]
+    names = np.char.add(np.char.add(first, ' '), last)
+
+    local = np.char.add(np.char.add(np.char.lower(first), '.'), np.char.lower(last))
+    local = np.char.add(local, ids.astype(str))
+    emails = np.char.add(local, '@school.edu').astype(object)
+    bad = np.flatnonzero(rng.random(n_rows) < bad_email_rate)
+    kinds = rng.integers(0, len(BAD_EMAILS), len(bad))
+    for i, kind in zip(bad.tolist(), kinds.tolist()):
+        prefix, at, suffix = BAD_EMAILS[kind]
+        emails[i] = prefix + str(local[i]) + at + 'school' + suffix
+
+    ability = rng.normal(68, 14, n_rows)
+    df = pd.DataFrame({'Student_Id': ids, 'Name': names, 'Email': emails})
+    subjects = subject_columns(n_subjects)
+    for col in subjects:
+        df[col] = np.clip(np.round(ability + rng.normal(0, 9, n_rows)), 0, 100)
+    df['Attendance'] = np.clip(np.round(rng.normal(82, 10, n_rows) + (ability - 68) * 0.3), 30, 100)
+    df['Study_Hours'] = np.clip(np.round(rng.gamma(4, 1.3, n_rows) + (ability - 68) * 0.05, 1), 0, 12)
+    marks = df[subjects].mean(axis=1)
+    df['Final_Grade'] = np.round(0.75 * marks + 0.15 * df['Attendance'] + 1.0 * df['Study_Hours']
+                                 + rng.normal(0, 4, n_rows) - 8, 2)
+
+    for col in subjects + ['Attendance', 'Study_Hours']:
+        df.loc[rng.random(n_rows) < missing_rate, col] = np.nan
+    if cohorts:
+        sections = rng.integers(1, cohorts + 1, n_rows).astype(str)
+        df.insert(3, 'Section', np.char.add('S', np.char.zfill(sections, 3)))
+    return df
+
+
+def write_students(path, n_rows, n_subjects=4, missing_rate=0.02, bad_email_rate=0.01, seed=42, cohorts=0):
+    # Chunked write; a single generator is consumed in order, so the file
+    # does not depend on anything but the arguments
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, CHUNK_ROWS):
+        chunk = make_students(min(CHUNK_ROWS, n_rows - start), n_subjects, missing_rate, bad_email_rate,
+                              start=start, rng=rng, cohorts=cohorts)
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    if n_rows == 0:
+        make_students(0, n_subjects, rng=rng, cohorts=cohorts).to_csv(path, index=False)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Write a synthetic student CSV')
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--subjects', type=int, default=4, help='number of subject mark columns (default: 4)')
+    parser.add_argument('--missing-rate', type=float, default=0.02,
+                        help='share of empty marks, attendance and study hours cells (default: 0.02)')
+    parser.add_argument('--bad-email-rate', type=float, default=0.01,
+                        help='share of malformed email addresses (default: 0.01)')
+    parser.add_argument('--cohorts', type=int, default=0,
+                        help='add a Section column with this many sections (default: none)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', required=True, help='CSV file to write')
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_students(args.output, args.rows, args.subjects, args.missing_rate, args.bad_email_rate, args.seed,
+                   args.cohorts)
+    print(f"Wrote {args.rows} students to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
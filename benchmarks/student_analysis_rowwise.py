@@ -0,0 +1,187 @@
+# The original iterrows() per-student analysis, kept as the reference that
+# bench_student_analysis.py checks and times the column-wise engine
+# (student_analysis.analyze_students()) against. It is not used by the
+# analyzer.
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from schema_plan import (ACADEMIC_KEYWORDS, SUBJECT_KEYWORDS, NON_ACADEMIC_KEYWORDS, ATTENDANCE_KEYS,  # noqa: E402
+                         STUDY_KEYS)
+from student_analysis import LOW_PERFORMANCE_RECOMMENDATIONS, STUDY_RECOMMENDATIONS, find_metric_key  # noqa: E402
+
+
+def analyze_students_rowwise(df, analysis_df, identifier_columns):
+    """Original iterrows() implementation of student_analysis.analyze_students()."""
+    results = []
+    for index, row in df.iterrows():
+        student_analysis = {
+            'index': int(index),
+            'identifier': {},
+            'performance_metrics': {},
+            'risk_factors': {},
+            'strengths': [],
+            'weaknesses': [],
+            'recommendations': [],
+            'overall_performance': None,
+            'risk_level': None,
+            'at_risk': False,
+            'risk_score': 0
+        }
+
+        # Identifier info
+        for col in identifier_columns:
+            if col in row and pd.notna(row[col]):
+                student_analysis['identifier'][col] = str(row[col])
+
+        # Collect numeric performance metrics from analysis_df columns
+        numeric_scores = []
+        for col in analysis_df.columns:
+            val = row.get(col)
+            if pd.notna(val) and pd.api.types.is_numeric_dtype(analysis_df[col]):
+                try:
+                    value = float(val)
+                except Exception:
+                    continue
+                student_analysis['performance_metrics'][col] = value
+                # treat columns that look like subject/score columns as academic scores
+                if any(keyword in col.lower() for keyword in ACADEMIC_KEYWORDS):
+                    numeric_scores.append(value)
+            else:
+                # keep non-numeric as-is (e.g., category) if present
+                if pd.notna(val):
+                    student_analysis['performance_metrics'][col] = val
+
+        # Default fallback for academic_score if no explicit subject columns found:
+        if not numeric_scores:
+            # try to infer academic numeric columns (exclude attendance/study hours)
+            for col in analysis_df.columns:
+                if pd.api.types.is_numeric_dtype(analysis_df[col]):
+                    if not any(k in col.lower() for k in NON_ACADEMIC_KEYWORDS):
+                        v = row.get(col)
+                        if pd.notna(v):
+                            try:
+                                numeric_scores.append(float(v))
+                            except Exception:
+                                pass
+
+        # Compute academic_score (mean of academic numeric columns) or None
+        if numeric_scores:
+            academic_score = float(sum(numeric_scores) / len(numeric_scores))
+        else:
+            academic_score = 0.0
+
+        # Fetch attendance & study_hours with case-insensitive keys
+        att_key = find_metric_key(student_analysis['performance_metrics'], ATTENDANCE_KEYS)
+        study_key = find_metric_key(student_analysis['performance_metrics'], STUDY_KEYS)
+
+        attendance = student_analysis['performance_metrics'].get(att_key, 100 if att_key is None else student_analysis['performance_metrics'].get(att_key, 100))
+        study_hours = student_analysis['performance_metrics'].get(study_key, 5 if study_key is None else student_analysis['performance_metrics'].get(study_key, 5))
+
+        # Normalize numeric placeholders
+        try:
+            attendance = float(attendance)
+        except Exception:
+            attendance = 100.0
+        try:
+            study_hours = float(study_hours)
+        except Exception:
+            study_hours = 5.0
+
+        # Clamp attendance
+        attendance = min(max(attendance, 0.0), 100.0)
+        # Convert study hours to 0-100 scale (e.g., 10 hours -> 100). Adjust as per your context.
+        study_hours_score = min(max(study_hours * 10.0, 0.0), 100.0)
+
+        # Weighted final performance score: marks 70%, attendance 20%, study_hours 10%
+        final_performance_score = (0.7 * academic_score) + (0.2 * attendance) + (0.1 * study_hours_score)
+        student_analysis['overall_performance'] = round(final_performance_score, 2)
+
+        # Begin risk calculation dominated by academic performance
+        risk_score = 0
+
+        # Academic risk contribution
+        if academic_score <= 0:
+            # Extremely poor or missing academic marks
+            risk_score += 60
+            student_analysis['weaknesses'].append("Very poor or missing academic marks")
+        elif academic_score < 40:
+            risk_score += 50
+            student_analysis['weaknesses'].append("Very poor marks — immediate intervention needed")
+        elif academic_score < 60:
+            risk_score += 30
+            student_analysis['weaknesses'].append("Below-average academic performance")
+        elif academic_score >= 85:
+            student_analysis['strengths'].append("Excellent academic performance")
+
+        # Attendance risk (secondary)
+        if attendance < 70:
+            risk_score += 20
+            student_analysis['weaknesses'].append("Poor attendance record")
+        elif attendance < 85:
+            risk_score += 10
+            student_analysis['weaknesses'].append("Inconsistent attendance")
+        elif attendance >= 95:
+            student_analysis['strengths'].append("Outstanding attendance")
+
+        # Study hours contribution (minor)
+        if study_hours < 3:
+            risk_score += 20
+            student_analysis['weaknesses'].append("Insufficient study hours")
+        elif study_hours < 5:
+            risk_score += 10
+            student_analysis['weaknesses'].append("Limited study time")
+        elif study_hours >= 7:
+            student_analysis['strengths'].append("Excellent study discipline")
+
+        # Subject-specific analysis (best/worst subject) using probable subject columns
+        subject_performance = {}
+        for col in analysis_df.columns:
+            if pd.api.types.is_numeric_dtype(analysis_df[col]) and any(keyword in col.lower() for keyword in SUBJECT_KEYWORDS):
+                v = row.get(col)
+                if pd.notna(v):
+                    try:
+                        subject_performance[col] = float(v)
+                    except Exception:
+                        pass
+
+        if subject_performance:
+            best_subject = max(subject_performance, key=subject_performance.get)
+            worst_subject = min(subject_performance, key=subject_performance.get)
+            student_analysis['best_subject'] = {'subject': best_subject, 'score': subject_performance[best_subject]}
+            student_analysis['worst_subject'] = {'subject': worst_subject, 'score': subject_performance[worst_subject]}
+
+            if subject_performance[best_subject] >= 85:
+                student_analysis['strengths'].append(f"Excellent performance in {best_subject}")
+            if subject_performance[worst_subject] < 70:
+                student_analysis['weaknesses'].append(f"Needs improvement in {worst_subject}")
+                student_analysis['recommendations'].append(f"Focus on improving {worst_subject} through extra practice")
+
+        # Final risk classification
+        if risk_score >= 60:
+            student_analysis['risk_level'] = 'high'
+            student_analysis['at_risk'] = True
+        elif risk_score >= 30:
+            student_analysis['risk_level'] = 'medium'
+            student_analysis['at_risk'] = True
+        else:
+            student_analysis['risk_level'] = 'low'
+            student_analysis['at_risk'] = False
+
+        student_analysis['risk_score'] = int(risk_score)
+
+        # Recommendations based on thresholds
+        if student_analysis['overall_performance'] is not None and student_analysis['overall_performance'] < 75:
+            student_analysis['recommendations'].extend(LOW_PERFORMANCE_RECOMMENDATIONS)
+
+        if attendance < 90:
+            student_analysis['recommendations'].append("Improve class attendance")
+
+        if study_hours < 5:
+            student_analysis['recommendations'].extend(STUDY_RECOMMENDATIONS)
+
+        results.append(student_analysis)
+
+    return results
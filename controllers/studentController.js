@@ -8,7 +8,7 @@ class StudentController {
     async processStudentData(filePath) {
         return new Promise((resolve, reject) => {
             const pythonScript = path.join(__dirname, '../utils/enhanced_csv_reader.py');
-            const py = spawn('python', [pythonScript, filePath]);
+            const py = spawn('python', [pythonScript, '--result-cache', filePath]);
 
             let dataString = '';
             let errorString = '';
@@ -0,0 +1,267 @@
+# Long-running analysis worker.
+#
+# Spawning `python enhanced_csv_reader.py <file>` per upload pays for importing
+# pandas, numpy and sklearn every time. In worker mode those imports happen
+# once in a fork server and every pool process is forked from it warm:
+#
+#   python enhanced_csv_reader.py --worker [--workers 2] [--job-timeout 120]
+#   python enhanced_csv_reader.py --worker --socket /tmp/academesense.sock
+#
+# Jobs are JSON lines on stdin (or on each socket connection):
+#   {"id": "job-1", "file": "uploads/abc123", "timeout": 60, "schema": "schemas/erp.json"}
+# ("timeout" and "schema" are optional; "schema" overrides --schema for the job)
+# and every job gets exactly one JSON line back, in completion order:
+#   {"id": "job-1", "ok": true, "result": {...}}
+#   {"id": "job-1", "ok": false, "error": "..."}
+#
+# A job that runs past its timeout has its worker killed and replaced; a
+# worker that dies mid-job is replaced and the job is reported as failed.
+import json
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+
+from process_pool import mp_context
+
+DEFAULT_JOB_TIMEOUT = 120.0
+
+
+def _worker_loop(conn, model_cache_options, result_cache_options):
+    # Runs inside a pool process: one job in, one (ok, payload) tuple out.
+    # The result is serialized here so the parent only forwards a string.
+    from enhanced_csv_reader import analyze_csv
+    from model_cache import ModelCache
+    from result_cache import ResultCache, cached_analysis
+    from schema_plan import overrides_key
+
+    model_cache = ModelCache(**model_cache_options) if model_cache_options else None
+    result_cache = ResultCache(**result_cache_options) if result_cache_options else None
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        try:
+            schema_path = job.get('schema')
+
+            def analyze(path):
+                return analyze_csv(path, model_cache, schema_path)
+
+            if result_cache is not None:
+                text = cached_analysis(result_cache, job['file'], analyze, schema_key=overrides_key(schema_path))
+            else:
+                text = json.dumps(analyze(job['file']))
+            conn.send((True, text))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Slot:
+    # One pool process plus the pipe used to talk to it
+
+    def __init__(self, ctx, cache_options=(None, None)):
+        self.ctx = ctx
+        self.cache_options = cache_options
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self._start()
+
+    def _start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_worker_loop,
+                                        args=(child_conn, *self.cache_options), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def _restart(self):
+        self.stop(force=True)
+        self.restarts += 1
+        self._start()
+
+    def run(self, job, timeout):
+        if not self.process.is_alive():
+            self._restart()
+        try:
+            self.conn.send(job)
+            if not self.conn.poll(timeout):
+                self._restart()
+                return False, f"Job timed out after {timeout:g}s"
+            return self.conn.recv()
+        except (EOFError, OSError):
+            exitcode = self.process.exitcode
+            self._restart()
+            return False, f"Worker crashed (exit code {exitcode})"
+
+    def stop(self, force=False):
+        if not force:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class WorkerPool:
+    """Fixed-size pool of analysis processes fed from a shared job queue."""
+
+    def __init__(self, size=2, job_timeout=DEFAULT_JOB_TIMEOUT, model_cache=None, result_cache=None,
+                 schema_path=None):
+        self.job_timeout = job_timeout
+        self.schema_path = schema_path
+        self.jobs = queue.Queue()
+        ctx = mp_context()
+        self.slots = [_Slot(ctx, (model_cache, result_cache)) for _ in range(max(1, size))]
+        self.threads = [threading.Thread(target=self._dispatch, args=(slot,), daemon=True)
+                        for slot in self.slots]
+        for thread in self.threads:
+            thread.start()
+
+    def _dispatch(self, slot):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            job, reply = item
+            timeout = job.get('timeout') or self.job_timeout
+            schema_path = job.get('schema') or self.schema_path
+            ok, payload = slot.run({'file': job['file'], 'schema': schema_path}, float(timeout))
+            reply(_reply_line(job.get('id'), ok, payload))
+
+    def submit(self, job, reply):
+        # reply(line) is called from a dispatcher thread once the job is done.
+        # Returns an Event that is set after the reply has been written.
+        done = threading.Event()
+
+        def _reply(line):
+            try:
+                reply(line)
+            finally:
+                done.set()
+
+        if not isinstance(job, dict) or not isinstance(job.get('file'), str):
+            _reply(_reply_line(job.get('id') if isinstance(job, dict) else None,
+                               False, "Job must be an object with a 'file' path"))
+        elif not isinstance(job.get('timeout', 0), (int, float)):
+            _reply(_reply_line(job.get('id'), False, "Job 'timeout' must be a number of seconds"))
+        elif not isinstance(job.get('schema', ''), str):
+            _reply(_reply_line(job.get('id'), False, "Job 'schema' must be a file path"))
+        else:
+            self.jobs.put((job, _reply))
+        return done
+
+    def close(self):
+        # Finish queued jobs, then stop the pool processes
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        for slot in self.slots:
+            slot.stop()
+
+
+def _reply_line(job_id, ok, payload):
+    if ok:
+        # payload is already JSON text, so splice it in rather than re-encode
+        return '{"id": %s, "ok": true, "result": %s}' % (json.dumps(job_id), payload)
+    return json.dumps({'id': job_id, 'ok': False, 'error': payload})
+
+
+def _submit_line(pool, line, reply):
+    try:
+        job = json.loads(line)
+    except ValueError as e:
+        reply(_reply_line(None, False, f"Invalid JSON: {e}"))
+        return None
+    return pool.submit(job, reply)
+
+
+def serve_stdin(pool, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    lock = threading.Lock()
+
+    def reply(line):
+        with lock:
+            stdout.write(line + '\n')
+            stdout.flush()
+
+    for line in stdin:
+        if line.strip():
+            _submit_line(pool, line, reply)
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        lock = threading.Lock()
+        pending = []
+
+        def reply(line):
+            with lock:
+                try:
+                    self.wfile.write((line + '\n').encode('utf-8'))
+                    self.wfile.flush()
+                except OSError:
+                    pass  # client went away; the job still ran
+
+        for raw in self.rfile:
+            line = raw.decode('utf-8')
+            if line.strip():
+                done = _submit_line(self.server.pool, line, reply)
+                if done is not None:
+                    pending.append(done)
+        # Keep the connection open until every job sent on it has replied
+        for done in pending:
+            done.wait()
+
+
+class _JobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(pool, socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = _JobServer(socket_path, _JobHandler)
+    server.pool = pool
+    print(f"Analysis worker listening on {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run(workers=2, job_timeout=DEFAULT_JOB_TIMEOUT, socket_path=None, model_cache=None, result_cache=None,
+        schema_path=None):
+    # model_cache / result_cache: keyword arguments for ModelCache / ResultCache,
+    # or None to disable that cache; schema_path: default schema override file
+    pool = WorkerPool(size=workers, job_timeout=job_timeout, model_cache=model_cache, result_cache=result_cache,
+                      schema_path=schema_path)
+
+    def _terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        if socket_path:
+            serve_socket(pool, socket_path)
+        else:
+            serve_stdin(pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
@@ -0,0 +1,160 @@
+# Batch mode: many files analyzed in one run.
+#
+#   python enhanced_csv_reader.py --batch uploads/term3 --batch-out results/term3
+#   python enhanced_csv_reader.py --batch nightly.txt --batch-out results --batch-workers 8 --result-cache
+#
+# The input is a directory (every regular file in it, hidden files skipped)
+# or a manifest: a text file with one path per line, relative paths taken
+# from the manifest's directory, blank lines and "#" comments ignored. Each
+# file's result is written to <batch-out>/<file name>.json, the same text
+# `enhanced_csv_reader.py <file>` prints (with the same cache options), and
+# one JSON summary line goes to stdout:
+#
+#   {"files": 5000, "ok": 4998, "failed": [{"file": "...", "error": "..."}], "seconds": 812.4}
+#
+# Files are analyzed on a pool of processes forked warm, as in
+# analysis_worker; every process keeps its ModelCache, ResultCache and
+# ParseCache for the whole batch, and schema plans are cached per header
+# (schema_plan.plan_for), so files with the same columns share one plan. The
+# caches are on disk and shared by all processes. With one worker the files
+# are analyzed in this process.
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from process_pool import mp_context
+
+# per pool process, set by _attach()
+_worker = None
+
+
+def list_inputs(source):
+    # Paths named by a directory or a manifest file, in a stable order
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source))
+                if not name.startswith('.') and os.path.isfile(os.path.join(source, name))]
+    base = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                paths.append(os.path.join(base, line))
+    return paths
+
+
+def output_names(paths):
+    # <file name>.json per input, with -2, -3, ... for repeated names
+    names = []
+    seen = set()
+    for path in paths:
+        stem = os.path.basename(path)
+        name = f"{stem}.json"
+        n = 1
+        while name in seen:
+            n += 1
+            name = f"{stem}-{n}.json"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _attach(options):
+    # Pool process initializer (also called in-process for one worker)
+    global _worker
+    from columnar_input import ParseCache
+    from model_cache import ModelCache
+    from result_cache import ResultCache
+
+    _worker = dict(options)
+    _worker['model_cache'] = ModelCache(**options['model_cache']) if options['model_cache'] else None
+    _worker['result_cache'] = ResultCache(**options['result_cache']) if options['result_cache'] else None
+    _worker['parse_cache'] = ParseCache(**options['parse_cache']) if options['parse_cache'] else None
+
+
+def _result_text(file_path):
+    # What the CLI would print for file_path, without the trailing newline
+    import enhanced_csv_reader as reader
+    from result_cache import cached_analysis
+    from schema_plan import overrides_key
+
+    grade_bins = _worker['grade_bins']
+    ml_budget = _worker['ml_budget']
+
+    def analyze(path):
+        return reader.analyze(path, _worker['model_cache'], _worker['schema_path'], _worker['lean'], grade_bins,
+                              ml_budget, _worker['parse_cache'])
+
+    if _worker['result_cache'] is not None:
+        return cached_analysis(_worker['result_cache'], file_path, analyze, indent=2,
+                               schema_key=overrides_key(_worker['schema_path']),
+                               grades_key=grade_bins.key if grade_bins else '',
+                               ml_key=f"budget={ml_budget:g}" if ml_budget else '')
+    return json.dumps(analyze(file_path), indent=2)
+
+
+def _analyze_file(file_path, out_path):
+    # One file: (error or None, seconds). The result is written here, so
+    # only the outcome travels back to the parent.
+    start = time.perf_counter()
+    try:
+        text = _result_text(file_path)
+        tmp_path = out_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        os.replace(tmp_path, out_path)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return error, time.perf_counter() - start
+
+
+def analyze_batch(source, out_dir, workers=None, model_cache=None, result_cache=None, parse_cache=None,
+                  schema_path=None, lean=False, grade_bins=None, ml_budget=None):
+    """Analyze every file of the directory or manifest `source`, writing one
+    result per file to `out_dir`; returns the summary dict. model_cache,
+    result_cache, parse_cache: keyword arguments for the caches, or None."""
+    paths = list_inputs(source)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = list(zip(paths, (os.path.join(out_dir, name) for name in output_names(paths))))
+    options = {'model_cache': model_cache, 'result_cache': result_cache, 'parse_cache': parse_cache,
+               'schema_path': schema_path, 'lean': lean, 'grade_bins': grade_bins, 'ml_budget': ml_budget}
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    print(f"Analyzing {len(jobs)} files on {workers} processes", file=sys.stderr)
+
+    start = time.perf_counter()
+    failed = []
+
+    def report(file_path, error, seconds):
+        if error is None:
+            print(f"{file_path}: {seconds:.2f}s", file=sys.stderr)
+        else:
+            print(f"{file_path}: {error}", file=sys.stderr)
+            failed.append({'file': file_path, 'error': error})
+
+    if workers == 1:
+        _attach(options)
+        for file_path, out_path in jobs:
+            report(file_path, *_analyze_file(file_path, out_path))
+    else:
+        with ProcessPoolExecutor(workers, mp_context=mp_context('batch_analysis'), initializer=_attach,
+                                 initargs=(options,)) as pool:
+            futures = {pool.submit(_analyze_file, file_path, out_path): file_path
+                       for file_path, out_path in jobs}
+            for future in as_completed(futures):
+                try:
+                    error, seconds = future.result()
+                except Exception as e:
+                    # the pool process died (BrokenProcessPool)
+                    error, seconds = f"{type(e).__name__}: {e}", 0.0
+                report(futures[future], error, seconds)
+
+    failed.sort(key=lambda entry: entry['file'])
+    return {
+        'files': len(jobs),
+        'ok': len(jobs) - len(failed),
+        'failed': failed,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
@@ -0,0 +1,278 @@
+# Cohort-sharded analysis on a process pool.
+#
+#   python enhanced_csv_reader.py --cohort Section <data.csv>
+#   python enhanced_csv_reader.py --cohort School --cohort-workers 8 --cohort-models <data.csv>
+#
+# District exports put many classes in one CSV. Here the cleaned rows are
+# split by the cohort column and every cohort is a task for a pool of
+# processes, which computes its per-student analysis, summary stats, grade
+# distribution and insights (and, with --cohort-models, fits a model on the
+# cohort alone). Meanwhile the parent builds the output rows, the whole-file
+# summary and the whole-file model. --ml-budget applies to every model, each
+# cohort's included. The result is the analyze_csv() result,
+# with the same per-student entries, plus analysis.cohorts:
+#
+#   "cohorts": {"10-A": {"total_students": 41, "summary_stats": {...}, "grade_distribution": {...},
+#                        "performance_insights": {...}, "ml_predictions": {...}, "risk_analysis": {...}}, ...}
+#
+# ml_predictions and risk_analysis are only there with --cohort-models; a
+# cohort's ml_predictions leaves out the per-row predictions, and its
+# at_risk_students are row positions in the whole file. Rows with no cohort
+# value form the "unassigned" cohort; cohort names are unique, so when a
+# cohort value is itself "unassigned" (or two values print alike) the later
+# one gets a " (2)", " (3)", ... suffix.
+#
+# Rows reach the pool through one SharedMemory block rather than as pickled
+# frames: the parent copies every column, in cohort order, into the block, so
+# a cohort is a contiguous slice of each column. Numeric and bool columns are
+# stored as they are, text columns as factorize() codes with the distinct
+# strings as UTF-8 bytes plus an offsets array. A worker rebuilds only its
+# slice, with the original dtypes and row positions, so its per-student
+# entries are exactly those of a full run. Results are not kept in the
+# result cache.
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import diagnostics
+import enhanced_csv_reader as reader
+from process_pool import mp_context
+from schema_plan import plan_for
+from student_analysis import analyze_students
+
+UNASSIGNED = 'unassigned'
+# cohorts smaller than this get no model of their own
+MIN_COHORT_MODEL_ROWS = 20
+
+# per pool process, set by _attach()
+_worker = None
+
+
+def _cohort_names(labels):
+    # str() of each label, then UNASSIGNED, made unique with a suffix
+    names = []
+    seen = set()
+    for name in [str(label) for label in labels] + [UNASSIGNED]:
+        unique, n = name, 1
+        while unique in seen:
+            n += 1
+            unique = f"{name} ({n})"
+        seen.add(unique)
+        names.append(unique)
+    return names
+
+
+def _share_frame(df, order):
+    # Copy the rows of df, taken in `order`, into a new SharedMemory block.
+    # Returns (shm, layout): the row positions and, per column, its dtype,
+    # offset and, for text columns, where the distinct strings are.
+    arrays = {'positions': order.astype(np.int64)}
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if series.dtype.kind in 'biuf':
+            arrays[col] = series.to_numpy()[order]
+            columns.append({'column': col, 'text': None})
+            continue
+        codes, uniques = pd.factorize(series)
+        arrays[col] = codes[order].astype(np.int64)
+        uniques = list(uniques)
+        if all(isinstance(u, str) for u in uniques):
+            encoded = [u.encode('utf-8') for u in uniques]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            arrays[(col, 'offsets')] = offsets
+            arrays[(col, 'data')] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+            columns.append({'column': col, 'text': True})
+        else:
+            # e.g. dates: the few distinct values travel with the layout
+            columns.append({'column': col, 'text': uniques})
+
+    placed = {}
+    size = 0
+    for name, array in arrays.items():
+        placed[name] = (size, array.dtype.str, len(array))
+        size += (array.nbytes + 7) // 8 * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, array in arrays.items():
+        offset, dtype, length = placed[name]
+        view = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+        view[:] = array
+        del view
+
+    for entry in columns:
+        entry['array'] = placed[entry['column']]
+        if entry['text'] is True:
+            entry['offsets'] = placed[(entry['column'], 'offsets')]
+            entry['data'] = placed[(entry['column'], 'data')][0]
+    return shm, {'positions': placed['positions'], 'columns': columns}
+
+
+def _view(buf, placement):
+    offset, dtype, length = placement
+    return np.ndarray(length, dtype=dtype, buffer=buf, offset=offset)
+
+
+def _attach(shm_name, layout, identifier_columns, schema_path, grade_bins, model_cache, cohort_models, ml_budget):
+    # Pool process initializer: open the block for the lifetime of the process
+    global _worker
+    try:
+        # Python 3.13+: the parent owns (and unlinks) the block
+        shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    _worker = {
+        'shm': shm,
+        'layout': layout,
+        'identifier_columns': identifier_columns,
+        'plan': plan_for([entry['column'] for entry in layout['columns']], schema_path),
+        'grade_bins': grade_bins,
+        'model_cache': model_cache,
+        'cohort_models': cohort_models,
+        'ml_budget': ml_budget,
+    }
+
+
+def _slice_frame(start, stop):
+    # Rows start:stop of the shared block as a DataFrame indexed by their
+    # positions in the whole file
+    buf = _worker['shm'].buf
+    layout = _worker['layout']
+    data = {}
+    for entry in layout['columns']:
+        values = _view(buf, entry['array'])[start:stop]
+        text = entry['text']
+        if text is None:
+            data[entry['column']] = values.copy()
+            continue
+        present, inverse = np.unique(values, return_inverse=True)
+        decoded = np.empty(len(present), dtype=object)
+        if text is True:
+            offsets = _view(buf, entry['offsets'])
+            for i, code in enumerate(present.tolist()):
+                if code < 0:
+                    decoded[i] = np.nan
+                else:
+                    begin = entry['data'] + int(offsets[code])
+                    end = entry['data'] + int(offsets[code + 1])
+                    decoded[i] = bytes(buf[begin:end]).decode('utf-8')
+        else:
+            for i, code in enumerate(present.tolist()):
+                decoded[i] = np.nan if code < 0 else text[code]
+        data[entry['column']] = decoded[inverse.reshape(-1)]
+    index = pd.Index(_view(buf, layout['positions'])[start:stop].copy())
+    return pd.DataFrame(data, index=index)
+
+
+def _analyze_cohort(start, stop):
+    # One cohort in a pool process: (positions, per-student entries, cohort block)
+    plan = _worker['plan']
+    identifier_columns = _worker['identifier_columns']
+    df = _slice_frame(start, stop)
+    analysis_df = df.drop(columns=identifier_columns, errors='ignore')
+
+    individual = analyze_students(df, analysis_df, identifier_columns, plan)
+    block = {'total_students': len(df), 'summary_stats': {}, 'grade_distribution': {}}
+    reader.summarize_columns(block, analysis_df, plan, _worker['grade_bins'])
+    needing_attention = sum(1 for s in individual if s['at_risk'])
+    high_performers = sum(1 for s in individual if s.get('overall_performance', 0) >= 85)
+    block['performance_insights'] = (reader.performance_insights(block['summary_stats'], needing_attention,
+                                                                 high_performers)
+                                     if block['summary_stats'] else {})
+
+    if _worker['cohort_models']:
+        block['ml_predictions'] = {}
+        if len(df) < MIN_COHORT_MODEL_ROWS:
+            block['ml_predictions'] = {'note': f'Fewer than {MIN_COHORT_MODEL_ROWS} students in the cohort'}
+        else:
+            ml = reader.run_ml(block, analysis_df.reset_index(drop=True), _worker['model_cache'], plan,
+                               ml_budget=_worker['ml_budget'])
+            block['ml_predictions'].pop('predictions', None)
+            if ml is not None:
+                predictions, threshold = ml
+                # the cohort model flags students the way apply_ml_predictions()
+                # does, without touching the whole-file predictions on them
+                at_risk = [int(i) for i, student, p in zip(df.index, individual, predictions)
+                           if student['at_risk'] or p < threshold]
+                block['risk_analysis'] = reader.risk_summary(threshold, at_risk, len(df))
+    return df.index.to_numpy(), individual, block
+
+
+def analyze_csv_cohorts(file_path, cohort_column, workers=None, model_cache=None, schema_path=None,
+                        grade_bins=None, cohort_models=False, ml_budget=None, parse_cache=None):
+    """analyze_csv() result for `file_path` plus analysis.cohorts, with the
+    cohorts of `cohort_column` analyzed on a pool of `workers` processes."""
+    with diagnostics.stage('parse'):
+        plan, df = reader.read_planned_csv(file_path, schema_path, parse_cache)
+    if cohort_column not in df.columns:
+        raise ValueError(f"Cohort column '{cohort_column}' is not in the CSV")
+
+    identifier_columns = list(plan.identifier)
+    print(f"Identifier columns excluded from analysis: {identifier_columns}", file=sys.stderr)
+    with diagnostics.stage('cleaning'):
+        df, emails, quality = reader.clean_frame(df, plan)
+
+    with diagnostics.stage('sharding'):
+        codes, labels = pd.factorize(df[cohort_column])
+        # missing cohort values (-1) sort first; give them the last slot
+        codes = np.where(codes < 0, len(labels), codes)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 2))
+        names = _cohort_names(labels)
+        tasks = [(names[c], int(bounds[c]), int(bounds[c + 1])) for c in range(len(names))
+                 if bounds[c + 1] > bounds[c]]
+        shm, layout = _share_frame(df, order)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    print(f"Analyzing {len(tasks)} cohorts of '{cohort_column}' on {workers} processes", file=sys.stderr)
+    try:
+        with ProcessPoolExecutor(workers, mp_context=mp_context('cohort_analysis'), initializer=_attach,
+                                 initargs=(shm.name, layout, identifier_columns, schema_path, grade_bins,
+                                           model_cache, cohort_models, ml_budget)) as pool:
+            # largest cohorts first, so no big one is left for the end
+            futures = [None] * len(tasks)
+            for i in sorted(range(len(tasks)), key=lambda i: tasks[i][1] - tasks[i][2]):
+                futures[i] = pool.submit(_analyze_cohort, tasks[i][1], tasks[i][2])
+
+            # whole-file output rows and aggregates while the cohorts run
+            with diagnostics.stage('records'):
+                processed_data = reader.process_records(df, plan, emails)
+            analysis_df = df.drop(columns=identifier_columns, errors='ignore')
+            stats = reader.new_stats(len(df), df.columns, identifier_columns, analysis_df.columns)
+            stats['data_quality'] = quality
+            with diagnostics.stage('summary_stats'):
+                reader.summarize_columns(stats, analysis_df, plan, grade_bins)
+            ml = reader.run_ml(stats, analysis_df, model_cache, plan, ml_budget=ml_budget)
+
+            with diagnostics.stage('student_analysis'):
+                individual = [None] * len(df)
+                cohorts = {}
+                for (name, _, _), future in zip(tasks, futures):
+                    positions, students, block = future.result()
+                    for i, student in zip(positions.tolist(), students):
+                        individual[i] = student
+                    cohorts[name] = block
+    finally:
+        shm.close()
+        shm.unlink()
+
+    stats['individual_student_analysis'] = individual
+    if ml is not None:
+        predictions, threshold = ml
+        at_risk_indices = reader.apply_ml_predictions(individual, predictions, threshold)
+        stats['risk_analysis'] = reader.risk_summary(threshold, at_risk_indices, stats['total_students'])
+    if stats['summary_stats']:
+        stats['performance_insights'] = reader.performance_insights(
+            stats['summary_stats'],
+            len([s for s in individual if s['at_risk']]),
+            len([s for s in individual if s.get('overall_performance', 0) >= 85]))
+    stats['cohorts'] = cohorts
+
+    return {
+        'data': processed_data,
+        'analysis': stats
+    }
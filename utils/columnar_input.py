@@ -0,0 +1,181 @@
+# Columnar inputs and the parsed-CSV cache.
+#
+#   python enhanced_csv_reader.py roster.parquet
+#   python enhanced_csv_reader.py roster.feather              # Arrow IPC file (Feather v2), memory-mapped
+#   python enhanced_csv_reader.py --parse-cache <data.csv>    # parse each distinct CSV once
+#
+# The format is told by the file's first bytes, since uploads are stored
+# without an extension: "PAR1" is Parquet, "ARROW1" an Arrow IPC file,
+# anything else CSV. Columnar files are read with pyarrow (an optional
+# dependency, not in requirements.txt; plain CSV never needs it), Arrow IPC
+# files through a memory map, and converted to what pd.read_csv() would have
+# produced: text columns hold str and NaN, columns with the categorical role
+# are text, and other types (dates, ...) become their text form.
+#
+# ParseCache stores a parsed CSV as an uncompressed Arrow IPC file named after
+# a hash of the CSV's bytes and the dtypes it was read with. A later run on
+# the same bytes memory-maps that file instead of parsing the text. A frame
+# whose text columns mix types is not cached.
+#
+# `columns` limits a read to the columns a stage uses (the streaming scan
+# skips the identifier columns); CSV still has to tokenize every field, the
+# columnar formats do not read the others at all.
+import hashlib
+import os
+import sys
+
+from disk_cache import DiskCache, default_cache_dir
+from lazy_modules import lazy_module
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# bump when the conversion below changes
+PARSE_VERSION = 'arrow-v1'
+PARQUET_MAGIC = b'PAR1'
+ARROW_MAGIC = b'ARROW1'
+
+
+def input_format(file_path):
+    # 'parquet', 'arrow' or 'csv'
+    with open(file_path, 'rb') as f:
+        head = f.read(6)
+    if head[:4] == PARQUET_MAGIC:
+        return 'parquet'
+    if head == ARROW_MAGIC:
+        return 'arrow'
+    return 'csv'
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading Parquet/Arrow files and --parse-cache need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _open_arrow(file_path):
+    # Table over a memory map of an Arrow IPC file; pages are only read when
+    # a column is converted
+    pa = _pyarrow()
+    return pa.ipc.open_file(pa.memory_map(file_path)).read_all()
+
+
+def _read_table(file_path, fmt, columns=None):
+    if fmt == 'parquet':
+        return _pyarrow().parquet.read_table(file_path, columns=columns, memory_map=True)
+    table = _open_arrow(file_path)
+    return table.select(columns) if columns is not None else table
+
+
+def header(file_path):
+    # Column names, without reading any rows
+    fmt = input_format(file_path)
+    if fmt == 'csv':
+        return list(pd.read_csv(file_path, nrows=0).columns)
+    if fmt == 'parquet':
+        return list(_pyarrow().parquet.read_schema(file_path).names)
+    return list(_open_arrow(file_path).schema.names)
+
+
+def _as_csv_frame(df, text_columns=()):
+    # Columns of a pyarrow-converted frame the way pd.read_csv() types them
+    text_columns = set(text_columns)
+    for col in df.columns:
+        series = df[col]
+        missing = series.isna()
+        if col in text_columns or not (series.dtype.kind in 'biuf' or series.dtype == object):
+            df[col] = series.astype(str).where(~missing, np.nan)
+        elif series.dtype == object and missing.any():
+            # arrow nulls come back as None, read_csv gives NaN
+            df[col] = series.where(~missing, np.nan)
+    return df
+
+
+def frame_like_csv(df, dtype=None):
+    # Copy of an in-memory frame typed (and indexed) like read_frame() gives
+    # the same rows from a file
+    return _as_csv_frame(df.reset_index(drop=True), dtype or ())
+
+
+def read_frame(file_path, dtype=None, columns=None, parse_cache=None):
+    """The file as a DataFrame typed like pd.read_csv(file_path, dtype=dtype),
+    for any supported format; `columns` limits the columns read."""
+    fmt = input_format(file_path)
+    text_columns = [col for col in (dtype or {}) if columns is None or col in columns]
+    if fmt != 'csv':
+        return _as_csv_frame(_read_table(file_path, fmt, columns).to_pandas(), text_columns)
+    if parse_cache is None:
+        return pd.read_csv(file_path, dtype=dtype, usecols=columns)
+
+    key = parse_cache.key(file_path, dtype)
+    path = parse_cache.get_path(key)
+    if path is not None:
+        return _as_csv_frame(_read_table(path, 'arrow', columns).to_pandas())
+    df = pd.read_csv(file_path, dtype=dtype)
+    parse_cache.put(key, df)
+    return df[columns] if columns is not None else df
+
+
+def iter_chunks(file_path, chunksize, dtype=None, columns=None):
+    # Like pd.read_csv(file_path, chunksize=chunksize, dtype=dtype), for any
+    # supported format
+    fmt = input_format(file_path)
+    if fmt == 'csv':
+        yield from pd.read_csv(file_path, chunksize=chunksize, dtype=dtype, usecols=columns)
+        return
+    dtype = {col: t for col, t in (dtype or {}).items() if columns is None or col in columns}
+    text_columns = [col for col, t in dtype.items() if t is str]
+    if fmt == 'parquet':
+        parquet = _pyarrow().parquet.ParquetFile(file_path, memory_map=True)
+        batches = parquet.iter_batches(batch_size=chunksize, columns=columns)
+    else:
+        batches = _read_table(file_path, fmt, columns).to_batches(max_chunksize=chunksize)
+    cast = {col: t for col, t in dtype.items() if t is not str}
+    # row positions continue across chunks, as with read_csv(chunksize=...)
+    offset = 0
+    for batch in batches:
+        chunk = _as_csv_frame(batch.to_pandas(), text_columns)
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk.astype(cast) if cast else chunk
+
+
+class ParseCache:
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        directory = directory or os.path.join(default_cache_dir(), 'parsed')
+        self.store = DiskCache(directory, max_bytes, suffix='.arrow')
+
+    @staticmethod
+    def key(file_path, dtype=None):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(repr((PARSE_VERSION, pd.__version__, sorted((dtype or {}).items(), key=str))).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def get_path(self, key):
+        return self.store.get_path(key)
+
+    def put(self, key, df):
+        pa = _pyarrow()
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            print(f"Not caching the parsed CSV: {e}", file=sys.stderr)
+            return
+
+        def write(f):
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+
+        return self.store.put_with(key, write)
+
+    def clear(self):
+        self.store.clear()
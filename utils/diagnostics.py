@@ -0,0 +1,134 @@
+# Per-stage timing and memory instrumentation.
+#
+#   python enhanced_csv_reader.py --diagnostics <data.csv>           # "diagnostics" block in "analysis"
+#   python enhanced_csv_reader.py --diagnostics-events <data.csv>    # one JSON line per stage on stderr
+#   python enhanced_csv_reader.py --profile run.prof <data.csv>      # cProfile stats, for pstats/snakeviz
+#   python enhanced_csv_reader.py --tracemalloc run.snap <data.csv>  # tracemalloc snapshot
+#
+# The analysis wraps each stage in `with diagnostics.stage('name'):`. While no
+# Recorder is active that returns one shared no-op context manager, so turned
+# off the instrumentation costs a function call per stage, not per row.
+#
+# Every stage records wall and CPU seconds and the process peak RSS at its
+# end. With tracemalloc on (--tracemalloc) it also records the peak of Python
+# allocations made during the stage; tracing slows the run down noticeably,
+# so the peak is only measured then. Stages must not be nested.
+#
+# With --diagnostics the summary goes into the output: add_block() puts it in
+# the "analysis" object just before that is written, so the serialization
+# stage itself only shows up in stderr events. The streaming and NDJSON
+# writers call it for their final analysis / summary line. With
+# --result-cache the analysis text is cached, so there the block is a
+# top-level "diagnostics" next to "result_cache"; on a hit it only has the
+# totals of the lookup.
+import contextlib
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+_NULL_STAGE = contextlib.nullcontext()
+_active = None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / 2**20 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+class Recorder:
+    """Collects one record per stage; `events` is a stream for JSON-line events, or None."""
+
+    def __init__(self, events=None, trace_memory=False, in_output=False):
+        self.events = events
+        self.trace_memory = trace_memory
+        self.in_output = in_output
+        self.stages = []
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                'stage': name,
+                'wall_s': round(time.perf_counter() - wall, 4),
+                'cpu_s': round(time.process_time() - cpu, 4),
+                'peak_rss_mb': _peak_rss_mb(),
+            }
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['alloc_peak_mb'] = round((peak - allocated) / 2**20, 2)
+                record['alloc_net_mb'] = round((current - allocated) / 2**20, 2)
+            self.stages.append(record)
+            self.emit('stage', record)
+
+    def emit(self, event, record):
+        if self.events is not None:
+            self.events.write(json.dumps({'event': event, **record}) + '\n')
+            self.events.flush()
+
+    def summary(self):
+        return {
+            'stages': list(self.stages),
+            'wall_s': round(time.perf_counter() - self._wall, 4),
+            'cpu_s': round(time.process_time() - self._cpu, 4),
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+
+
+def start(events=None, trace_memory=False, in_output=False):
+    # in_output: add_block() adds the summary to the output (--diagnostics)
+    global _active
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _active = Recorder(events, trace_memory, in_output)
+    return _active
+
+
+def stop(snapshot_path=None):
+    # Deactivate the recorder (emitting a "run" event with the totals) and
+    # dump the tracemalloc snapshot to snapshot_path if given
+    global _active
+    recorder, _active = _active, None
+    if recorder is None:
+        return None
+    recorder.emit('run', {k: v for k, v in recorder.summary().items() if k != 'stages'})
+    if recorder.trace_memory:
+        if snapshot_path:
+            tracemalloc.take_snapshot().dump(snapshot_path)
+        tracemalloc.stop()
+    return recorder
+
+
+def active():
+    return _active
+
+
+def block():
+    # The summary for the output, or None when it is not asked for
+    if _active is None or not _active.in_output:
+        return None
+    return _active.summary()
+
+
+def add_block(analysis):
+    # Put block() into an "analysis" dict as "diagnostics", if asked for
+    summary = block()
+    if summary is not None:
+        analysis['diagnostics'] = summary
+
+
+def stage(name):
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
@@ -0,0 +1,132 @@
+# Size-bounded on-disk LRU cache shared by the model and result caches.
+#
+# Entries are plain files named after their key. A hit refreshes the file's
+# mtime, so eviction (oldest mtime first) is least-recently-used. Writes go
+# through a temp file and os.replace(), so several worker processes can share
+# one cache directory without ever reading a half-written entry. An entry
+# larger than the whole cache is not stored (eviction would only delete
+# everything, itself included), and a cache opened with a smaller size is
+# trimmed to it straight away.
+import os
+import sys
+import tempfile
+
+CACHE_DIR_ENV = 'ACADEMESENSE_CACHE_DIR'
+
+
+def default_cache_dir():
+    # <repo>/.cache unless ACADEMESENSE_CACHE_DIR says otherwise
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(repo_root, '.cache')
+
+
+class DiskCache:
+    """Bytes stored under string keys in `directory`, at most `max_bytes` in total."""
+
+    def __init__(self, directory, max_bytes, suffix='.bin'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def get_path(self, key):
+        # Path of the entry for key, refreshed like get(), or None; for
+        # entries that are memory-mapped rather than read
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _too_large(self, key, size):
+        if size <= self.max_bytes:
+            return False
+        print(f"Not caching {key[:12]}: the entry ({size / 2**20:.0f} MB) is larger than the cache "
+              f"({self.max_bytes / 2**20:.0f} MB)", file=sys.stderr)
+        return True
+
+    def put(self, key, data):
+        # Store data under key; False when it is too large to keep
+        if self._too_large(key, len(data)):
+            return False
+        return self.put_with(key, lambda f: f.write(data))
+
+    def put_with(self, key, write):
+        # Like put(), with write(f) writing the entry to a binary file
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                size = os.fstat(f.fileno()).st_size
+            if self._too_large(key, size):
+                os.unlink(tmp_path)
+                return False
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict()
+        return True
+
+    def discard(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, name in self._entries():
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes}
@@ -1,379 +1,870 @@
-import pandas as pd
-import csv
+import argparse
+import importlib.util
 import json
+import os
 import sys
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.preprocessing import LabelEncoder
+import time
 import warnings
 import re
+import diagnostics
+from lazy_modules import lazy_module
+from model_cache import ModelCache
+from result_cache import ResultCache, cached_analysis, with_block
+from schema_plan import overrides_key, plan_for
+from grade_bins import DEFAULT_BINS, GradeBins
+import columnar_input
+from columnar_input import ParseCache
+from ml_strategy import (PROBE_MIN_ROWS, cache_variant, choose_strategy, fit_with_strategy, predict_batches,
+                         probe_rates)
 warnings.filterwarnings('ignore')
 
-def is_identifier_col(col_name):
-    col_lower = col_name.lower()
-    return any(keyword in col_lower for keyword in ['id', 'student_id', 'studentid', 'name', 'email'])
+# imported on first use, so runs answered from the result cache never load
+# them (see lazy_modules.py)
+pd = lazy_module('pandas')
+np = lazy_module('numpy')
+student_analysis = lazy_module('student_analysis')
+
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+EMAIL_RE = re.compile(EMAIL_PATTERN)
+# lean mode stores a text column as categorical when it has at most this
+# many distinct values per non-empty cell
+LEAN_CATEGORY_RATIO = 0.5
+# pieces of the JSON encoder's output joined per write in lean mode
+LEAN_WRITE_CHUNKS = 8192
+# students whose predicted target falls below this percentile of the actual
+# target are flagged by the model
+RISK_PERCENTILE = 30
+
+
+def find_identifier_columns(columns):
+    # Identify identifier columns that shouldn't be analyzed
+    return list(plan_for(columns).identifier)
+
+
+def clean_emails(df, plan=None):
+    # Email columns validated with the pandas string engine, df untouched.
+    # Returns ({col: object array}, invalid count); each array holds the
+    # stripped address, None for an invalid one and NaN for an empty cell.
+    # With pyarrow installed the strip and the match run in Arrow's
+    # compute kernels instead of once per cell in Python.
+    emails = {}
+    invalid = 0
+    arrow = importlib.util.find_spec('pyarrow') is not None
+    for col in (plan or plan_for(df.columns)).email:
+        series = df[col]
+        present = series.notna().to_numpy()
+        text = series[present].astype(str)
+        if arrow:
+            text = text.astype('string[pyarrow]')
+        stripped = text.str.strip()
+        valid = stripped.str.fullmatch(EMAIL_PATTERN).to_numpy(dtype=bool)
+        values = series.to_numpy(dtype=object, copy=True)
+        rows = np.flatnonzero(present)
+        values[rows[valid]] = stripped[valid].to_numpy(dtype=object)
+        values[rows[~valid]] = None
+        emails[col] = values
+        invalid += int((~valid).sum())
+    return emails, invalid
+
+
+def clean_frame(df, plan=None, dedupe=True):
+    # Cleaning stage: trims text identifier columns (in place), drops rows
+    # whose student id repeats an earlier row (whole-row duplicates when there
+    # is no id column) and validates the email columns. Returns
+    # (df, emails, quality): the cleaned frame, clean_emails() of it and the
+    # counts reported as analysis.data_quality.
+    plan = plan or plan_for(df.columns)
+    quality = {'rows_received': len(df), 'duplicate_rows': 0, 'trimmed_identifiers': 0, 'invalid_emails': 0}
+    for col in plan.identifier:
+        series = df[col]
+        if col in plan.email or series.dtype != object:
+            continue
+        stripped = series.str.strip()
+        changed = stripped.notna() & (stripped != series)
+        if changed.any():
+            # non-string cells come back as NaN from .str; keep them as they were
+            df[col] = stripped.where(stripped.notna(), series)
+            quality['trimmed_identifiers'] += int(changed.sum())
+
+    if dedupe and len(df):
+        if plan.key is not None:
+            duplicated = df[plan.key].duplicated() & df[plan.key].notna()
+        else:
+            duplicated = df.duplicated()
+        if duplicated.any():
+            df = df[~duplicated.to_numpy()].reset_index(drop=True)
+            quality['duplicate_rows'] = int(duplicated.sum())
+
+    emails, quality['invalid_emails'] = clean_emails(df, plan)
+    return df, emails, quality
+
+
+def process_records(df, plan=None, emails=None):
+    # Rows of df as dicts, with the email columns replaced by their validated
+    # values (clean_emails(), computed here unless passed in)
+    if emails is None:
+        emails, _ = clean_emails(df, plan)
+    records = df.to_dict('records')
+    for col, values in emails.items():
+        for row, value in zip(records, values.tolist()):
+            row[col] = value
+    return records
+
+
+def lean_frame(df):
+    # Narrow df in place for lean mode, one column at a time: integers to the
+    # smallest integer type, floats to float32 when every value survives the
+    # round trip, repetitive text to categoricals. Nothing is rounded, so the
+    # analysis output stays the same.
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif series.dtype == np.float64:
+            values = series.to_numpy()
+            narrow = values.astype(np.float32)
+            if np.array_equal(narrow.astype(np.float64), values, equal_nan=True):
+                df[col] = narrow
+        elif series.dtype == object and series.nunique() <= LEAN_CATEGORY_RATIO * series.count():
+            df[col] = series.astype('category')
+    return df
+
+
+def _widen(series):
+    # full-width copy of a lean-mode column, so statistics are computed in float64
+    if series.dtype.kind in 'if' and series.dtype.itemsize < 8:
+        return series.astype(np.float64 if series.dtype.kind == 'f' else np.int64)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(object)
+    return series
+
+
+def new_stats(total_students, columns, identifier_columns, analysis_columns):
+    # Stats container
+    return {
+        'total_students': total_students,
+        'columns': list(columns),
+        'identifier_columns': identifier_columns,
+        'analysis_columns': list(analysis_columns),
+        'data_quality': {},
+        'summary_stats': {},
+        'ml_predictions': {},
+        'performance_insights': {},
+        'grade_distribution': {},
+        'risk_analysis': {},
+        'individual_student_analysis': []
+    }
 
-def find_metric_key(perf_metrics, candidates):
-    # case-insensitive search for a metric key among perf_metrics
-    for cand in candidates:
-        for k in perf_metrics.keys():
-            if cand.lower() == k.lower():
-                return k
-    return None
 
-# --- Read input CSV ---
-if len(sys.argv) < 2:
-    print("Usage: python script.py <data.csv>", file=sys.stderr)
-    sys.exit(1)
+def summarize_columns(stats, analysis_df, plan=None, grade_bins=None):
+    # Summary statistics; grade_bins (a grade_bins.GradeBins) turns the grade
+    # distributions into bounded histograms
+    grade_cols = set((plan or plan_for(analysis_df.columns)).grade)
+    for col in analysis_df.columns:
+        series = _widen(analysis_df[col])
+        if pd.api.types.is_numeric_dtype(series):
+            col_series = series.dropna()
+            if len(col_series) > 0:
+                stats['summary_stats'][col] = {
+                    'mean': float(col_series.mean()),
+                    'median': float(col_series.median()),
+                    'std': float(col_series.std(ddof=0)) if len(col_series) > 1 else 0.0,
+                    'min': float(col_series.min()),
+                    'max': float(col_series.max())
+                }
+            else:
+                stats['summary_stats'][col] = {'mean': None, 'median': None, 'std': None, 'min': None, 'max': None}
+            # grade distribution for mark-like columns
+            if col in grade_cols and grade_bins is not None:
+                stats['grade_distribution'][col] = grade_bins.histogram(series.to_numpy(dtype=float, na_value=np.nan))
+            elif col in grade_cols:
+                stats['grade_distribution'][col] = {str(k): int(v) for k, v in series.value_counts().to_dict().items()}
+        else:
+            # categorical summarization
+            stats['summary_stats'][col] = {k: int(v) for k, v in series.value_counts().to_dict().items()}
 
-file_path = sys.argv[1]
-df = pd.read_csv(file_path)
 
-# Identify identifier columns that shouldn't be analyzed
-identifier_columns = []
-for col in df.columns:
-    if is_identifier_col(col):
-        identifier_columns.append(col)
+def choose_ml_columns(numeric_cols, plan=None):
+    # Attempt to pick a target column; returns (target_col, feature_cols)
+    plan = plan or plan_for(numeric_cols)
+    target_col = next((col for col in plan.target if col in numeric_cols), None)
 
-print(f"Identifier columns excluded from analysis: {identifier_columns}", file=sys.stderr)
+    if not target_col:
+        # choose last numeric column not clearly attendance/study
+        non_target = set(plan.non_target)
+        for col in reversed(numeric_cols):
+            if col not in non_target:
+                target_col = col
+                break
 
-# Convert to list of dictionaries for original data (preserve original)
-data = df.to_dict('records')
+    if not target_col:
+        return None, []
+    return target_col, [c for c in numeric_cols if c != target_col]
+
+
+def fit_model(X, y, feature_cols):
+    # 80/20 split, RandomForest fit and test metrics. sklearn is imported
+    # here, so runs that fit no model never load it.
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model.fit(X_train, y_train)
+
+    y_pred = model.predict(X_test)
+    mse = mean_squared_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
+
+    return {
+        'model': model,
+        'model_performance': {
+            'mse': float(mse),
+            'r2_score': float(r2),
+            'rmse': float(np.sqrt(mse))
+        },
+        'feature_importance': {col: float(model.feature_importances_[i]) for i, col in enumerate(feature_cols)}
+    }
 
-# Enhanced data processing - add email detection and validation
-processed_data = []
-email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-for row in data:
-    processed_row = dict(row)
-    for col in df.columns:
-        if 'email' in col.lower() and pd.notna(row.get(col)):
-            email = str(row[col]).strip()
-            if re.match(email_pattern, email):
-                processed_row[col] = email
-            else:
-                processed_row[col] = None
-    processed_data.append(processed_row)
-
-# Prepare analysis dataframe (drop identifier columns)
-analysis_df = df.drop(columns=identifier_columns, errors='ignore').copy()
-analysis_df_for_ml = analysis_df.copy()  # will be used for ML after numeric selection
-
-# Stats container
-stats = {
-    'total_students': len(df),
-    'columns': list(df.columns),
-    'identifier_columns': identifier_columns,
-    'analysis_columns': list(analysis_df.columns),
-    'summary_stats': {},
-    'ml_predictions': {},
-    'performance_insights': {},
-    'grade_distribution': {},
-    'risk_analysis': {},
-    'individual_student_analysis': []
-}
-
-# Summary statistics
-for col in analysis_df.columns:
-    if pd.api.types.is_numeric_dtype(analysis_df[col]):
-        col_series = analysis_df[col].dropna()
-        if len(col_series) > 0:
-            stats['summary_stats'][col] = {
-                'mean': float(col_series.mean()),
-                'median': float(col_series.median()),
-                'std': float(col_series.std(ddof=0)) if len(col_series) > 1 else 0.0,
-                'min': float(col_series.min()),
-                'max': float(col_series.max())
-            }
-        else:
-            stats['summary_stats'][col] = {'mean': None, 'median': None, 'std': None, 'min': None, 'max': None}
-        # grade distribution for mark-like columns
-        if any(keyword in col.lower() for keyword in ['grade', 'score', 'mark', 'test', 'exam']):
-            stats['grade_distribution'][col] = {str(k): int(v) for k, v in analysis_df[col].value_counts().to_dict().items()}
+
+def fit_predict_lean(X, y, feature_cols):
+    # fit_model() plus its predictions for every row of X, without ever
+    # holding the whole forest (~1.5 GB at 200k rows). The forest grows one
+    # tree per fit() with warm_start, which draws the seeds a single fit()
+    # would; each tree adds its predictions and importances and is dropped.
+    # Same values as fit_model() and predict_batches(); the entry has
+    # 'predictions' instead of 'model'.
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_test, X_all = (frame.to_numpy(dtype=np.float32) for frame in (X_train, X_test, X))
+    forest = RandomForestRegressor(n_estimators=0, random_state=42, warm_start=True)
+    y_pred = np.zeros(len(X_test))
+    predictions = np.zeros(len(X_all))
+    importances = []
+    for n_trees in range(1, 101):
+        forest.set_params(n_estimators=n_trees)
+        forest.fit(X_train, y_train)
+        tree = forest.estimators_[-1]
+        # summed in tree order, then averaged, as RandomForestRegressor.predict()
+        y_pred += tree.predict(X_test)
+        predictions += tree.predict(X_all)
+        if tree.tree_.node_count > 1:
+            importances.append(tree.feature_importances_)
+        forest.estimators_[-1] = None
+    y_pred /= n_trees
+    predictions /= n_trees
+    if importances:
+        importances = np.mean(importances, axis=0, dtype=np.float64)
+        importances = importances / np.sum(importances)
     else:
-        # categorical summarization
-        stats['summary_stats'][col] = {k: int(v) for k, v in analysis_df[col].value_counts().to_dict().items()}
-
-# Individual student analysis
-for index, row in df.iterrows():
-    student_analysis = {
-        'index': int(index),
-        'identifier': {},
-        'performance_metrics': {},
-        'risk_factors': {},
-        'strengths': [],
-        'weaknesses': [],
-        'recommendations': [],
-        'overall_performance': None,
-        'risk_level': None,
-        'at_risk': False,
-        'risk_score': 0
+        importances = np.zeros(len(feature_cols))
+
+    mse = mean_squared_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
+    return {
+        'predictions': predictions,
+        'model_performance': {
+            'mse': float(mse),
+            'r2_score': float(r2),
+            'rmse': float(np.sqrt(mse))
+        },
+        'feature_importance': {col: float(importances[i]) for i, col in enumerate(feature_cols)}
     }
 
-    # Identifier info
-    for col in identifier_columns:
-        if col in row and pd.notna(row[col]):
-            student_analysis['identifier'][col] = str(row[col])
 
-    # Collect numeric performance metrics from analysis_df columns
-    numeric_scores = []
-    for col in analysis_df.columns:
-        val = row.get(col)
-        if pd.notna(val) and pd.api.types.is_numeric_dtype(analysis_df[col]):
-            try:
-                value = float(val)
-            except Exception:
-                continue
-            student_analysis['performance_metrics'][col] = value
-            # treat columns that look like subject/score columns as academic scores
-            if any(keyword in col.lower() for keyword in ['grade', 'score', 'mark', 'test', 'exam', 'math', 'english', 'science', 'history', 'physics', 'chemistry']):
-                numeric_scores.append(value)
-        else:
-            # keep non-numeric as-is (e.g., category) if present
-            if pd.notna(val):
-                student_analysis['performance_metrics'][col] = val
-
-    # Default fallback for academic_score if no explicit subject columns found:
-    if not numeric_scores:
-        # try to infer academic numeric columns (exclude attendance/study hours)
-        for col in analysis_df.columns:
-            if pd.api.types.is_numeric_dtype(analysis_df[col]):
-                if not any(k in col.lower() for k in ['attendance', 'study', 'hours']):
-                    v = row.get(col)
-                    if pd.notna(v):
-                        try:
-                            numeric_scores.append(float(v))
-                        except Exception:
-                            pass
-
-    # Compute academic_score (mean of academic numeric columns) or None
-    if numeric_scores:
-        academic_score = float(sum(numeric_scores) / len(numeric_scores))
+def load_or_fit_model(X, y, target_col, feature_cols, model_cache=None, ml_budget=None, lean=False):
+    # Fitted model entry for (X, y), from model_cache when this exact training
+    # data was seen before. Entries also carry the 30th-percentile threshold.
+    # With ml_budget (seconds) the model is chosen by ml_strategy, with rates
+    # probed on this data when it is large enough, and the entry has a
+    # 'strategy' report. Otherwise, with lean, the entry is the one of
+    # fit_predict_lean(), with the predictions for X and no model.
+    lean = lean and not ml_budget
+    cache_key = None
+    if model_cache is not None:
+        variant = cache_variant(ml_budget) if ml_budget else 'lean' if lean else ''
+        cache_key = ModelCache.key(target_col, feature_cols, X, y, variant)
+        entry = model_cache.get(cache_key)
+        if entry is not None:
+            print(f"Loaded cached model {cache_key[:12]}", file=sys.stderr)
+            if 'strategy' in entry:
+                # nothing was fitted in this run
+                entry['strategy'] = dict(entry['strategy'], probe_s=0.0, fit_s=0.0, cached=True)
+            return entry
+
+    if ml_budget:
+        rates = probe_rates(X, y) if len(X) > PROBE_MIN_ROWS else None
+        strategy = choose_strategy(len(X), len(feature_cols), ml_budget, rates=rates)
+        print(f"ML strategy: {strategy['name']} on {strategy['train_rows']} rows, n_jobs={strategy['n_jobs']}, "
+              f"estimated {strategy['estimated_total_s']}s", file=sys.stderr)
+        entry = fit_with_strategy(X, y, feature_cols, strategy)
+    elif lean:
+        entry = fit_predict_lean(X, y, feature_cols)
     else:
-        academic_score = 0.0
+        entry = fit_model(X, y, feature_cols)
+    # Determine threshold (bottom 30th percentile of actual target)
+    entry['threshold'] = float(np.percentile(y, RISK_PERCENTILE))
+    if cache_key is not None:
+        model_cache.put(cache_key, entry)
+    return entry
 
-    # Fetch attendance & study_hours with case-insensitive keys
-    att_key = find_metric_key(student_analysis['performance_metrics'], ['attendance', 'att'])
-    study_key = find_metric_key(student_analysis['performance_metrics'], ['study_hours', 'study_hours', 'studyhours', 'study', 'hours'])
 
-    attendance = student_analysis['performance_metrics'].get(att_key, 100 if att_key is None else student_analysis['performance_metrics'].get(att_key, 100))
-    study_hours = student_analysis['performance_metrics'].get(study_key, 5 if study_key is None else student_analysis['performance_metrics'].get(study_key, 5))
+def ml_training_data(stats, analysis_df_for_ml, plan=None, lean=False):
+    # (target_col, feature_cols, X, y) with missing values filled by column
+    # means and a 0..n-1 index, or None when no model can be fitted
+    # Select numeric columns for ML
+    numeric_cols = analysis_df_for_ml.select_dtypes(include=[np.number]).columns.tolist()
+    if len(numeric_cols) < 2:
+        stats['ml_predictions'] = {'note': 'Not enough numeric columns for ML'}
+        return None
+
+    target_col, feature_cols = choose_ml_columns(numeric_cols, plan)
+    # If no feature columns available, skip ML
+    if not target_col or len(feature_cols) < 1 or len(analysis_df_for_ml) <= 1:
+        return None
+
+    if lean:
+        # The forest converts X to float32 anyway, so build it as float32,
+        # filling one full-width column at a time: same values, no float64
+        # copy of the whole feature matrix
+        X = pd.DataFrame({col: _fill_mean(_widen(analysis_df_for_ml[col])).to_numpy(dtype=np.float32)
+                          for col in feature_cols})
+        y = _fill_mean(_widen(analysis_df_for_ml[target_col]))
+        return target_col, feature_cols, X, y.reset_index(drop=True)
+
+    X = analysis_df_for_ml[feature_cols].fillna(analysis_df_for_ml[feature_cols].mean())
+    y = analysis_df_for_ml[target_col].fillna(analysis_df_for_ml[target_col].mean())
+    # Reset index to align with stats['individual_student_analysis']
+    return target_col, feature_cols, X.reset_index(drop=True), y.reset_index(drop=True)
+
+
+def _fill_mean(series):
+    return series.fillna(series.mean())
+
+
+def ml_summary(target_col, feature_cols, entry):
+    summary = {
+        'target_column': target_col,
+        'feature_columns': feature_cols,
+        'model_performance': dict(entry['model_performance']),
+        'feature_importance': dict(entry['feature_importance'])
+    }
+    if 'strategy' in entry:
+        summary['strategy'] = dict(entry['strategy'])
+    return summary
 
-    # Normalize numeric placeholders
-    try:
-        attendance = float(attendance)
-    except Exception:
-        attendance = 100.0
+
+def run_ml(stats, analysis_df_for_ml, model_cache=None, plan=None, lean=False, ml_budget=None):
+    # --- Machine Learning Predictions (if possible) ---
+    # Fills stats['ml_predictions']; returns (all_predictions, threshold) when
+    # a model was fitted, else None. ml_budget: see load_or_fit_model().
     try:
-        study_hours = float(study_hours)
-    except Exception:
-        study_hours = 5.0
-
-    # Clamp attendance
-    attendance = min(max(attendance, 0.0), 100.0)
-    # Convert study hours to 0-100 scale (e.g., 10 hours -> 100). Adjust as per your context.
-    study_hours_score = min(max(study_hours * 10.0, 0.0), 100.0)
-
-    # Weighted final performance score: marks 70%, attendance 20%, study_hours 10%
-    final_performance_score = (0.7 * academic_score) + (0.2 * attendance) + (0.1 * study_hours_score)
-    student_analysis['overall_performance'] = round(final_performance_score, 2)
-
-    # Begin risk calculation dominated by academic performance
-    risk_score = 0
-
-    # Academic risk contribution
-    if academic_score <= 0:
-        # Extremely poor or missing academic marks
-        risk_score += 60
-        student_analysis['weaknesses'].append("Very poor or missing academic marks")
-    elif academic_score < 40:
-        risk_score += 50
-        student_analysis['weaknesses'].append("Very poor marks — immediate intervention needed")
-    elif academic_score < 60:
-        risk_score += 30
-        student_analysis['weaknesses'].append("Below-average academic performance")
-    elif academic_score >= 85:
-        student_analysis['strengths'].append("Excellent academic performance")
-
-    # Attendance risk (secondary)
-    if attendance < 70:
-        risk_score += 20
-        student_analysis['weaknesses'].append("Poor attendance record")
-    elif attendance < 85:
-        risk_score += 10
-        student_analysis['weaknesses'].append("Inconsistent attendance")
-    elif attendance >= 95:
-        student_analysis['strengths'].append("Outstanding attendance")
-
-    # Study hours contribution (minor)
-    if study_hours < 3:
-        risk_score += 20
-        student_analysis['weaknesses'].append("Insufficient study hours")
-    elif study_hours < 5:
-        risk_score += 10
-        student_analysis['weaknesses'].append("Limited study time")
-    elif study_hours >= 7:
-        student_analysis['strengths'].append("Excellent study discipline")
-
-    # Subject-specific analysis (best/worst subject) using probable subject columns
-    subject_performance = {}
-    for col in analysis_df.columns:
-        if pd.api.types.is_numeric_dtype(analysis_df[col]) and any(keyword in col.lower() for keyword in ['math', 'english', 'science', 'history', 'physics', 'chemistry', 'biology', 'score', 'mark', 'exam', 'test']):
-            v = row.get(col)
-            if pd.notna(v):
-                try:
-                    subject_performance[col] = float(v)
-                except Exception:
-                    pass
-
-    if subject_performance:
-        best_subject = max(subject_performance, key=subject_performance.get)
-        worst_subject = min(subject_performance, key=subject_performance.get)
-        student_analysis['best_subject'] = {'subject': best_subject, 'score': subject_performance[best_subject]}
-        student_analysis['worst_subject'] = {'subject': worst_subject, 'score': subject_performance[worst_subject]}
-
-        if subject_performance[best_subject] >= 85:
-            student_analysis['strengths'].append(f"Excellent performance in {best_subject}")
-        if subject_performance[worst_subject] < 70:
-            student_analysis['weaknesses'].append(f"Needs improvement in {worst_subject}")
-            student_analysis['recommendations'].append(f"Focus on improving {worst_subject} through extra practice")
-
-    # Final risk classification
-    if risk_score >= 60:
-        student_analysis['risk_level'] = 'high'
-        student_analysis['at_risk'] = True
-    elif risk_score >= 30:
-        student_analysis['risk_level'] = 'medium'
-        student_analysis['at_risk'] = True
-    else:
-        student_analysis['risk_level'] = 'low'
-        student_analysis['at_risk'] = False
+        data = ml_training_data(stats, analysis_df_for_ml, plan, lean)
+        if data is not None:
+            target_col, feature_cols, X, y = data
+            with diagnostics.stage('ml_fit'):
+                entry = load_or_fit_model(X, y, target_col, feature_cols, model_cache, ml_budget, lean)
+            stats['ml_predictions'] = ml_summary(target_col, feature_cols, entry)
+
+            # Predict for all rows (aligned); lean entries come with them
+            with diagnostics.stage('predict'):
+                start = time.perf_counter()
+                all_predictions = entry['predictions'] if 'predictions' in entry else predict_batches(entry['model'], X)
+                stats['ml_predictions']['predictions'] = [float(p) for p in all_predictions]
+            strategy = stats['ml_predictions'].get('strategy')
+            if strategy is not None:
+                strategy['predict_s'] = round(time.perf_counter() - start, 3)
+                strategy['within_budget'] = (strategy['probe_s'] + strategy['fit_s'] + strategy['predict_s']
+                                             <= strategy['budget_s'])
+            return all_predictions, entry['threshold']
+    except Exception as e:
+        stats['ml_predictions'] = {'error': str(e)}
+        print(f"ML Error: {str(e)}", file=sys.stderr)
+    return None
 
-    student_analysis['risk_score'] = int(risk_score)
 
-    # Recommendations based on thresholds
-    if student_analysis['overall_performance'] is not None and student_analysis['overall_performance'] < 75:
-        student_analysis['recommendations'].extend([
-            "Consider additional tutoring or study groups",
-            "Schedule a meeting with subject teachers"
-        ])
+def add_ml_predictions(stats, analysis_df_for_ml, model_cache=None, plan=None, lean=False, ml_budget=None):
+    ml = run_ml(stats, analysis_df_for_ml, model_cache, plan, lean, ml_budget)
+    if ml is not None:
+        all_predictions, threshold = ml
+        at_risk_indices = apply_ml_predictions(stats['individual_student_analysis'], all_predictions, threshold)
+        stats['risk_analysis'] = risk_summary(threshold, at_risk_indices, stats['total_students'])
+
+
+def apply_ml_predictions(individual, predictions, threshold, offset=0):
+    # Attach ml_prediction / ml_at_risk to each student; returns the indices
+    # (offset by the position of the first student) flagged either way
+    at_risk_indices = []
+    for i, pred in enumerate(predictions):
+        manual_at_risk = individual[i].get('at_risk', False)
+        ml_at_risk = bool(pred < threshold)
+        student_at_risk = manual_at_risk or ml_at_risk
+        individual[i]['ml_prediction'] = float(pred)
+        individual[i]['ml_at_risk'] = ml_at_risk
+        if student_at_risk:
+            at_risk_indices.append(offset + i)
+    return at_risk_indices
+
+
+def risk_summary(threshold, at_risk_indices, total_students):
+    return {
+        'threshold': float(threshold),
+        'at_risk_count': len(at_risk_indices),
+        'at_risk_percentage': float(len(at_risk_indices) / total_students * 100),
+        'at_risk_students': at_risk_indices,
+        'criteria': 'ML prediction below 30th percentile OR manual risk assessment'
+    }
 
-    if attendance < 90:
-        student_analysis['recommendations'].append("Improve class attendance")
 
-    if study_hours < 5:
-        student_analysis['recommendations'].extend([
-            "Establish a consistent study schedule",
-            "Create a dedicated study environment"
-        ])
+def performance_insights(summary_stats, needing_attention, high_performers):
+    # --- Performance insights ---
+    numeric_stats = {k: v for k, v in summary_stats.items() if isinstance(v, dict) and v.get('mean') is not None}
+    if not numeric_stats:
+        return {}
+    means = {k: v['mean'] for k, v in numeric_stats.items()}
+    best_subject = max(means, key=means.get) if means else None
+    worst_subject = min(means, key=means.get) if means else None
+    return {
+        'best_performing_area': best_subject,
+        'worst_performing_area': worst_subject,
+        'average_scores': means,
+        'class_average': float(np.mean(list(means.values()))) if means else 0.0,
+        'students_needing_attention': needing_attention,
+        'high_performers': high_performers
+    }
 
-    stats['individual_student_analysis'].append(student_analysis)
 
-# --- Machine Learning Predictions (if possible) ---
-try:
-    # Select numeric columns for ML
-    numeric_cols = analysis_df_for_ml.select_dtypes(include=[np.number]).columns.tolist()
+def read_planned_csv(file_path, schema_path=None, parse_cache=None):
+    # Column roles for the file's header, then the file read with them
+    # (categorical columns as text). CSV, Parquet or Arrow, from parse_cache
+    # when given (see columnar_input). Returns (plan, df).
+    plan = plan_for(columnar_input.header(file_path), schema_path)
+    return plan, columnar_input.read_frame(file_path, plan.read_dtypes(), parse_cache=parse_cache)
+
+
+def analyze_csv(file_path, model_cache=None, schema_path=None, lean=False, grade_bins=None, ml_budget=None,
+                parse_cache=None, scores_path=None):
+    # Full analysis of one CSV file; returns the result dict that the CLI prints.
+    # lean=True narrows the frame (lean_frame), skips the defensive copies,
+    # predicts without keeping the forest (fit_predict_lean()) and builds
+    # the output rows once; the result is the same. grade_bins: see
+    # summarize_columns(); ml_budget: see load_or_fit_model(); parse_cache:
+    # see read_planned_csv(); scores_path: see rescoring.save_inputs().
+    # --- Read input CSV ---
+    with diagnostics.stage('parse'):
+        plan, df = read_planned_csv(file_path, schema_path, parse_cache)
+    return analyze_frame(df, plan, model_cache, lean, grade_bins, ml_budget, scores_path)
+
+
+def analyze(source, model_cache=None, schema_path=None, lean=False, grade_bins=None, ml_budget=None,
+            parse_cache=None, scores_path=None):
+    """Result dict for `source`: a file path (CSV, Parquet or Arrow) or a
+    DataFrame, analyzed exactly as the CLI analyzes a file. A DataFrame is
+    not modified; it is typed the way read_planned_csv() types a file."""
+    if not isinstance(source, pd.DataFrame):
+        return analyze_csv(source, model_cache, schema_path, lean, grade_bins, ml_budget, parse_cache,
+                           scores_path)
+    plan = plan_for(source.columns, schema_path)
+    return analyze_frame(columnar_input.frame_like_csv(source, plan.read_dtypes()), plan, model_cache, lean,
+                         grade_bins, ml_budget, scores_path)
+
+
+def analyze_frame(df, plan, model_cache=None, lean=False, grade_bins=None, ml_budget=None, scores_path=None):
+    # analyze_csv() from the parse stage on, for a frame read with
+    # plan.read_dtypes(); df is consumed (cleaned and, when lean, narrowed
+    # in place)
+    identifier_columns = list(plan.identifier)
+    print(f"Identifier columns excluded from analysis: {identifier_columns}", file=sys.stderr)
+
+    # Trim identifiers, drop duplicate students, validate emails
+    with diagnostics.stage('cleaning'):
+        df, emails, quality = clean_frame(df, plan)
+        if lean:
+            lean_frame(df)
+
+    if lean:
+        # nothing below modifies the analysis frame, so it is not copied
+        analysis_df = analysis_df_for_ml = df.drop(columns=identifier_columns, errors='ignore')
+    else:
+        with diagnostics.stage('records'):
+            processed_data = process_records(df, plan, emails)
+
+        # Prepare analysis dataframe (drop identifier columns)
+        analysis_df = df.drop(columns=identifier_columns, errors='ignore').copy()
+        analysis_df_for_ml = analysis_df.copy()  # will be used for ML after numeric selection
+
+    stats = new_stats(len(df), df.columns, identifier_columns, analysis_df.columns)
+    stats['data_quality'] = quality
+    with diagnostics.stage('summary_stats'):
+        summarize_columns(stats, analysis_df, plan, grade_bins)
+
+    if lean:
+        # the predictions are made before the per-student entries are built,
+        # one tree at a time (fit_predict_lean()), so no whole forest is held
+        ml = run_ml(stats, analysis_df_for_ml, model_cache, plan, lean, ml_budget)
+
+    # Individual student analysis (column-wise, see student_analysis.py)
+    with diagnostics.stage('student_analysis'):
+        stats['individual_student_analysis'] = student_analysis.analyze_students(df, analysis_df, identifier_columns,
+                                                                                 plan)
+
+    if not lean:
+        add_ml_predictions(stats, analysis_df_for_ml, model_cache, plan, lean, ml_budget)
+    elif ml is not None:
+        predictions, threshold = ml
+        at_risk_indices = apply_ml_predictions(stats['individual_student_analysis'], predictions, threshold)
+        stats['risk_analysis'] = risk_summary(threshold, at_risk_indices, stats['total_students'])
+
+    if scores_path:
+        import rescoring
+        with diagnostics.stage('save_scores'):
+            rescoring.save_inputs(scores_path, analysis_df, plan, stats)
+
+    if lean:
+        # built last, once the analysis frames are gone
+        del analysis_df, analysis_df_for_ml
+        with diagnostics.stage('records'):
+            processed_data = process_records(df, plan, emails)
+        del df
+
+    if stats['summary_stats']:
+        individual = stats['individual_student_analysis']
+        stats['performance_insights'] = performance_insights(
+            stats['summary_stats'],
+            len([s for s in individual if s['at_risk']]),
+            len([s for s in individual if s.get('overall_performance', 0) >= 85]))
+
+    # Final combined result
+    return {
+        'data': processed_data,
+        'analysis': stats
+    }
 
-    if len(numeric_cols) >= 2:
-        # Attempt to pick a target column
-        target_col = None
-        for col in numeric_cols:
-            if any(keyword in col.lower() for keyword in ['final', 'total', 'overall', 'gpa', 'cgpa']):
-                target_col = col
-                break
 
-        if not target_col:
-            # choose last numeric column not clearly attendance/study
-            for col in reversed(numeric_cols):
-                if not any(keyword in col.lower() for keyword in ['attendance', 'study', 'hours']):
-                    target_col = col
-                    break
-
-        if target_col:
-            feature_cols = [c for c in numeric_cols if c != target_col]
-            # If no feature columns available, skip ML
-            if len(feature_cols) >= 1:
-                X = analysis_df_for_ml[feature_cols].fillna(analysis_df_for_ml[feature_cols].mean())
-                y = analysis_df_for_ml[target_col].fillna(analysis_df_for_ml[target_col].mean())
-
-                if len(X) > 1:
-                    # Reset index to align with stats['individual_student_analysis']
-                    X_reset = X.reset_index(drop=True)
-                    y_reset = y.reset_index(drop=True)
-
-                    X_train, X_test, y_train, y_test = train_test_split(X_reset, y_reset, test_size=0.2, random_state=42)
-                    model = RandomForestRegressor(n_estimators=100, random_state=42)
-                    model.fit(X_train, y_train)
-
-                    y_pred = model.predict(X_test)
-                    mse = mean_squared_error(y_test, y_pred)
-                    r2 = r2_score(y_test, y_pred)
-
-                    stats['ml_predictions'] = {
-                        'target_column': target_col,
-                        'feature_columns': feature_cols,
-                        'model_performance': {
-                            'mse': float(mse),
-                            'r2_score': float(r2),
-                            'rmse': float(np.sqrt(mse))
-                        },
-                        'feature_importance': {}
-                    }
-
-                    for i, col in enumerate(feature_cols):
-                        stats['ml_predictions']['feature_importance'][col] = float(model.feature_importances_[i])
-
-                    # Predict for all rows (aligned)
-                    all_predictions = model.predict(X_reset)
-                    stats['ml_predictions']['predictions'] = [float(p) for p in all_predictions]
-
-                    # Determine threshold (bottom 30th percentile of actual target)
-                    threshold = np.percentile(y_reset, 30)
-                    at_risk_indices = []
-
-                    for i, pred in enumerate(all_predictions):
-                        manual_at_risk = stats['individual_student_analysis'][i].get('at_risk', False)
-                        ml_at_risk = bool(pred < threshold)
-                        student_at_risk = manual_at_risk or ml_at_risk
-                        stats['individual_student_analysis'][i]['ml_prediction'] = float(pred)
-                        stats['individual_student_analysis'][i]['ml_at_risk'] = ml_at_risk
-                        if student_at_risk:
-                            at_risk_indices.append(i)
-
-                    stats['risk_analysis'] = {
-                        'threshold': float(threshold),
-                        'at_risk_count': len(at_risk_indices),
-                        'at_risk_percentage': float(len(at_risk_indices) / len(df) * 100),
-                        'at_risk_students': at_risk_indices,
-                        'criteria': 'ML prediction below 30th percentile OR manual risk assessment'
-                    }
-    else:
-        stats['ml_predictions'] = {'note': 'Not enough numeric columns for ML'}
-except Exception as e:
-    stats['ml_predictions'] = {'error': str(e)}
-    print(f"ML Error: {str(e)}", file=sys.stderr)
-
-# --- Performance insights ---
-if stats['summary_stats']:
-    numeric_stats = {k: v for k, v in stats['summary_stats'].items() if isinstance(v, dict) and v.get('mean') is not None}
-    if numeric_stats:
-        means = {k: v['mean'] for k, v in numeric_stats.items()}
-        best_subject = max(means, key=means.get) if means else None
-        worst_subject = min(means, key=means.get) if means else None
-        stats['performance_insights'] = {
-            'best_performing_area': best_subject,
-            'worst_performing_area': worst_subject,
-            'average_scores': means,
-            'class_average': float(np.mean(list(means.values()))) if means else 0.0,
-            'students_needing_attention': len([s for s in stats['individual_student_analysis'] if s['at_risk']]),
-            'high_performers': len([s for s in stats['individual_student_analysis'] if s.get('overall_performance', 0) >= 85])
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Analyze a student CSV and print the result as JSON')
+    parser.add_argument('file', nargs='?', help='CSV, Parquet or Arrow IPC file to analyze')
+    parser.add_argument('--schema', metavar='FILE',
+                        help='JSON file overriding inferred column roles (see schema_plan.py)')
+    streaming = parser.add_argument_group('streaming mode')
+    streaming.add_argument('--ndjson', action='store_true',
+                           help='write compact NDJSON: a header line, one line per student as soon as it is '
+                                'analyzed, then a summary line (see ndjson_output.py)')
+    streaming.add_argument('--chunksize', type=int, metavar='ROWS',
+                           help='read the CSV in chunks of ROWS rows and stream the result (bounded memory)')
+    streaming.add_argument('--sample-size', type=int, default=50_000, metavar='ROWS',
+                           help='rows sampled for model training in streaming mode (default: 50000)')
+    cache = parser.add_argument_group('caches')
+    cache.add_argument('--cache-dir', metavar='DIR',
+                       help='cache directory (default: $ACADEMESENSE_CACHE_DIR or <repo>/.cache)')
+    cache.add_argument('--no-model-cache', action='store_true', help='always fit a fresh model')
+    cache.add_argument('--clear-model-cache', action='store_true', help='delete all cached models first')
+    cache.add_argument('--model-cache-size', type=int, default=512, metavar='MB',
+                       help='evict least recently used models beyond this size; a larger model is not cached '
+                            '(default: 512)')
+    cache.add_argument('--result-cache', action='store_true',
+                       help='return the stored result for byte-identical inputs and add a "result_cache" '
+                            'block (hit/miss, cache size) to the output')
+    cache.add_argument('--clear-result-cache', action='store_true', help='delete all cached results first')
+    cache.add_argument('--result-cache-size', type=int, default=256, metavar='MB',
+                       help='evict least recently used results beyond this size (default: 256)')
+    cache.add_argument('--parse-cache', action='store_true',
+                       help='keep parsed CSVs as Arrow files keyed by content hash and memory-map them on '
+                            'later runs (needs pyarrow, see columnar_input.py)')
+    cache.add_argument('--clear-parse-cache', action='store_true', help='delete all parsed CSVs first')
+    cache.add_argument('--parse-cache-size', type=int, default=1024, metavar='MB',
+                       help='evict least recently used parsed CSVs beyond this size (default: 1024)')
+    incremental = parser.add_argument_group('incremental mode')
+    incremental.add_argument('--state', metavar='FILE',
+                             help='keep the analysis state of this roster in FILE (and its model in FILE.model) '
+                                  'and only re-analyze rows added or changed since the last run '
+                                  '(see incremental_analysis.py)')
+    incremental.add_argument('--retrain-threshold', type=float, default=0.05, metavar='FRACTION',
+                             help='refit the model once this share of rows changed since the last fit '
+                                  '(default: 0.05)')
+    parser.add_argument('--ml-budget', type=float, metavar='SECONDS',
+                        help='time budget for fitting and predicting; picks the estimator, training sample '
+                             'and cores by data size (see ml_strategy.py)')
+    cohort = parser.add_argument_group('cohort mode')
+    cohort.add_argument('--cohort', metavar='COLUMN',
+                        help='analyze each cohort (class, section, school) of COLUMN on a process pool and add '
+                             'per-cohort results as "cohorts" (see cohort_analysis.py)')
+    cohort.add_argument('--cohort-workers', type=int, metavar='N',
+                        help='pool processes for --cohort (default: one per CPU)')
+    cohort.add_argument('--cohort-models', action='store_true',
+                        help='also fit a model per cohort and report its risk analysis')
+    parser.add_argument('--lean', action='store_true',
+                        help='use narrower column types, fewer copies and a forest grown and dropped one tree '
+                             'at a time to cut peak memory (same output)')
+    grades = parser.add_argument_group('grade distribution').add_mutually_exclusive_group()
+    grades.add_argument('--grade-bins', nargs='?', const=str(DEFAULT_BINS), metavar='N|EDGES',
+                        help='count grade columns into N equal-width bins (default: %(const)s) or into fixed '
+                             'bins given as comma-separated edges, instead of one entry per distinct mark '
+                             '(see grade_bins.py)')
+    grades.add_argument('--grade-bands', nargs='?', const='', metavar='LABEL:MARK,...',
+                        help='count grade columns per letter band, given lowest band first '
+                             '(default: F/E/D/C/B/A/A+ from 0/33/40/50/60/75/90)')
+    diag = parser.add_argument_group('diagnostics')
+    diag.add_argument('--diagnostics', action='store_true',
+                      help='add per-stage wall/CPU time and peak memory as "diagnostics" in "analysis" (at the '
+                           'top level with --result-cache)')
+    diag.add_argument('--diagnostics-events', action='store_true',
+                      help='write one JSON line per stage to stderr')
+    diag.add_argument('--profile', metavar='FILE', help='write cProfile stats of the run to FILE')
+    diag.add_argument('--tracemalloc', metavar='FILE',
+                      help='trace Python allocations: per-stage allocation peaks, snapshot written to FILE')
+    worker = parser.add_argument_group('worker mode')
+    worker.add_argument('--worker', action='store_true',
+                        help='stay running and read JSON-line jobs from stdin (or --socket)')
+    worker.add_argument('--socket', metavar='PATH', help='listen on this Unix socket instead of stdin')
+    worker.add_argument('--workers', type=int, default=2, help='number of pool processes (default: 2)')
+    worker.add_argument('--job-timeout', type=float, default=120.0,
+                        help='seconds before a job is abandoned and its worker restarted (default: 120)')
+    store = parser.add_argument_group('student store')
+    store.add_argument('--student-store', metavar='DIR',
+                       help='also write the per-student results to a memory-mapped store in DIR for lookups '
+                            'by student id (see student_store.py); not with --chunksize or --ndjson')
+    sink = parser.add_argument_group('database sink')
+    sink.add_argument('--mongo-sink', action='store_true',
+                      help='upsert the students into MongoDB in batches, as the upload controller saves them, '
+                           'and add a "database_sink" block to the output (needs pymongo, see mongo_sink.py); '
+                           'not with --chunksize, --ndjson or --batch')
+    sink.add_argument('--mongo-uri', metavar='URI',
+                      help='MongoDB connection string (default: $MONGODB_URI, else the server\'s default '
+                           'mongodb://127.0.0.1:27017/AcademeSense)')
+    sink.add_argument('--mongo-collection', default='students', metavar='NAME',
+                      help='collection of the Student model (default: students)')
+    sink.add_argument('--mongo-batch-size', type=int, default=1000, metavar='ROWS',
+                      help='upserts per bulk write (default: 1000)')
+    sink.add_argument('--mongo-retries', type=int, default=3, metavar='N',
+                      help='retries of a bulk write that failed as a whole (default: 3)')
+    whatif = parser.add_argument_group('what-if rescoring')
+    whatif.add_argument('--save-scores', metavar='FILE',
+                        help='save the score inputs and model predictions of this run to FILE (.npz) for '
+                             'rescoring under other risk policies (see rescoring.py); bypasses the result cache')
+    batch = parser.add_argument_group('batch mode')
+    batch.add_argument('--batch', metavar='DIR_OR_MANIFEST',
+                       help='analyze every file in a directory, or listed in a manifest (one path per line), '
+                            'in one run (see batch_analysis.py)')
+    batch.add_argument('--batch-out', metavar='DIR', help='write <file name>.json results here (required)')
+    batch.add_argument('--batch-workers', type=int, metavar='N',
+                       help='number of pool processes (default: one per CPU)')
+    return parser
+
+
+def cache_options(args):
+    # Plain dicts of ModelCache / ResultCache / ParseCache arguments, so they
+    # can be handed to worker processes
+    def options(name, size_mb):
+        return {
+            'directory': os.path.join(args.cache_dir, name) if args.cache_dir else None,
+            'max_bytes': size_mb * 1024 * 1024,
         }
+    return (options('models', args.model_cache_size), options('results', args.result_cache_size),
+            options('parsed', args.parse_cache_size))
+
+
+def grade_bins_option(args):
+    # GradeBins for --grade-bins / --grade-bands, or None
+    if args.grade_bins is not None:
+        return GradeBins.parse_bins(args.grade_bins)
+    if args.grade_bands is not None:
+        return GradeBins.parse_bands(args.grade_bands or None)
+    return None
 
-# Final combined result
-result = {
-    'data': processed_data,
-    'analysis': stats
-}
 
-print(json.dumps(result, indent=2))
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        grade_bins = grade_bins_option(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.batch and not args.batch_out:
+        parser.error('--batch needs --batch-out')
+    for option, given in (('--student-store', args.student_store), ('--mongo-sink', args.mongo_sink)):
+        if given and (args.chunksize or args.ndjson or args.batch):
+            parser.error(f"{option} needs the whole result in memory: not with --chunksize, --ndjson or --batch")
+    if args.save_scores and (args.chunksize or args.ndjson or args.batch or args.cohort or args.state):
+        parser.error('--save-scores works with a plain analysis: not with --chunksize, --ndjson, --batch, '
+                     '--cohort or --state')
+    if args.lean and (args.state or args.cohort or args.chunksize or args.ndjson or args.worker):
+        parser.error('--lean works with a plain or --batch analysis: not with --state, --cohort, --chunksize, '
+                     '--ndjson or --worker')
+    if args.parse_cache and (args.chunksize or args.worker):
+        parser.error('--parse-cache reads whole files: not with --chunksize or --worker')
+    if args.worker and (grade_bins is not None or args.ml_budget):
+        parser.error('--worker jobs run the default analysis: not with --grade-bins, --grade-bands or '
+                     '--ml-budget')
+    if args.mongo_batch_size < 1:
+        parser.error('--mongo-batch-size must be at least 1')
+    if args.diagnostics and (args.batch or args.worker):
+        parser.error('--diagnostics reports on one analysis: not with --batch or --worker')
+
+    model_options, result_options, parse_options = cache_options(args)
+    if args.clear_model_cache:
+        ModelCache(**model_options).clear()
+    if args.clear_result_cache:
+        ResultCache(**result_options).clear()
+    if args.clear_parse_cache:
+        ParseCache(**parse_options).clear()
+    clearing = args.clear_model_cache or args.clear_result_cache or args.clear_parse_cache
+    if clearing and args.file is None and not args.worker and not args.batch:
+        return
+    if args.no_model_cache:
+        model_options = None
+    if not args.result_cache:
+        result_options = None
+
+    if args.worker:
+        import analysis_worker
+        analysis_worker.run(workers=args.workers, job_timeout=args.job_timeout, socket_path=args.socket,
+                            model_cache=model_options, result_cache=result_options, schema_path=args.schema)
+        return
+
+    if args.batch:
+        import batch_analysis
+        summary = batch_analysis.analyze_batch(args.batch, args.batch_out, args.batch_workers, model_options,
+                                               result_options, parse_options if args.parse_cache else None,
+                                               args.schema, args.lean, grade_bins, args.ml_budget)
+        print(json.dumps(summary))
+        if summary['failed']:
+            sys.exit(1)
+        return
+
+    if args.file is None:
+        print("Usage: python script.py <data.csv>", file=sys.stderr)
+        sys.exit(1)
+
+    model_cache = ModelCache(**model_options) if model_options else None
+    parse_cache = ParseCache(**parse_options) if args.parse_cache else None
+
+    recording = args.diagnostics or args.diagnostics_events or args.tracemalloc
+    if recording:
+        diagnostics.start(events=sys.stderr if args.diagnostics_events else None,
+                          trace_memory=bool(args.tracemalloc), in_output=args.diagnostics)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run(args, model_cache, result_options, grade_bins, parse_cache)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if recording:
+            diagnostics.stop(args.tracemalloc)
+
+
+def print_result(result, lean=False):
+    # The diagnostics block (--diagnostics) is added before serializing, so
+    # the serialization stage only shows up in stderr events
+    diagnostics.add_block(result['analysis'])
+    with diagnostics.stage('serialization'):
+        if lean:
+            # same text as below, written in blocks of LEAN_WRITE_CHUNKS pieces
+            # instead of built as one string (json.dump() writes every piece)
+            pieces = []
+            for piece in json.JSONEncoder(indent=2).iterencode(result):
+                pieces.append(piece)
+                if len(pieces) == LEAN_WRITE_CHUNKS:
+                    sys.stdout.write(''.join(pieces))
+                    pieces.clear()
+            pieces.append('\n')
+            sys.stdout.write(''.join(pieces))
+        else:
+            print(json.dumps(result, indent=2))
+
+
+def export_result(args, result):
+    # --student-store / --mongo-sink; returns the blocks to add to the output
+    blocks = {}
+    if args.student_store:
+        import student_store
+        with diagnostics.stage('student_store'):
+            student_store.write_store(args.student_store, result, args.schema)
+    if args.mongo_sink:
+        import mongo_sink
+        with diagnostics.stage('database_sink'):
+            target = mongo_sink.MongoTarget(args.mongo_uri, args.mongo_collection)
+            try:
+                blocks['database_sink'] = mongo_sink.write_students(target, result, args.mongo_batch_size,
+                                                                    args.mongo_retries)
+            finally:
+                target.close()
+    return blocks
+
+
+def run(args, model_cache, result_options, grade_bins=None, parse_cache=None):
+    # One analysis of args.file, in the mode the arguments ask for
+    if args.state:
+        # the state file replaces the result cache for this roster
+        import incremental_analysis
+        result = incremental_analysis.analyze_csv_incremental(args.file, args.state, model_cache, args.schema,
+                                                              args.retrain_threshold, grade_bins, parse_cache,
+                                                              args.ml_budget)
+        result.update(export_result(args, result))
+        print_result(result)
+        return
+
+    if args.ndjson:
+        # NDJSON is written as it is produced, so it bypasses the result cache too
+        import ndjson_output
+        if args.chunksize:
+            ndjson_output.write_ndjson_streaming(args.file, sys.stdout, args.chunksize, args.sample_size,
+                                                 model_cache=model_cache, schema_path=args.schema,
+                                                 grade_bins=grade_bins, ml_budget=args.ml_budget)
+        else:
+            ndjson_output.write_ndjson(args.file, sys.stdout, model_cache=model_cache, schema_path=args.schema,
+                                       grade_bins=grade_bins, ml_budget=args.ml_budget, parse_cache=parse_cache)
+        return
+
+    if args.chunksize:
+        # streaming output is never held in memory, so it bypasses the result cache
+        import streaming_analysis
+        streaming_analysis.analyze_csv_streaming(args.file, sys.stdout, args.chunksize, args.sample_size,
+                                                 model_cache=model_cache, schema_path=args.schema,
+                                                 grade_bins=grade_bins, ml_budget=args.ml_budget)
+        return
+
+    if args.cohort:
+        import cohort_analysis
+        result = cohort_analysis.analyze_csv_cohorts(args.file, args.cohort, args.cohort_workers, model_cache,
+                                                     args.schema, grade_bins, args.cohort_models, args.ml_budget,
+                                                     parse_cache)
+        result.update(export_result(args, result))
+        print_result(result)
+        return
+
+    if result_options and not args.save_scores:
+        # cached text is served as is; the diagnostics block is added next to
+        # the result_cache one
+        text = cached_analysis(ResultCache(**result_options), args.file,
+                               lambda path: analyze_csv(path, model_cache, args.schema, args.lean, grade_bins,
+                                                        args.ml_budget, parse_cache),
+                               indent=2, schema_key=overrides_key(args.schema),
+                               grades_key=grade_bins.key if grade_bins else '',
+                               ml_key=f"budget={args.ml_budget:g}" if args.ml_budget else '')
+        if args.student_store or args.mongo_sink:
+            for name, block in export_result(args, json.loads(text)).items():
+                text = with_block(text, name, block, indent=2)
+        summary = diagnostics.block()
+        if summary is not None:
+            text = with_block(text, 'diagnostics', summary, indent=2)
+        print(text)
+        return
+
+    result = analyze_csv(args.file, model_cache, args.schema, args.lean, grade_bins, args.ml_budget, parse_cache,
+                         args.save_scores)
+    result.update(export_result(args, result))
+    print_result(result, args.lean)
+
+
+if __name__ == '__main__':
+    main()
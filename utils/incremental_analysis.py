@@ -0,0 +1,315 @@
+# Incremental re-analysis of a roster that is uploaded again and again.
+#
+#   python enhanced_csv_reader.py --state states/class-10a.pkl <data.csv>
+#   python enhanced_csv_reader.py --state states/class-10a.pkl --retrain-threshold 0.1 <data.csv>
+#
+# The state file keeps what the previous run on the same roster produced,
+# keyed by the student id column (SchemaPlan.key): a hash of every row, the
+# processed row, its student analysis and ML prediction, a value histogram of
+# every analysis column and the model's metrics and threshold. The fitted
+# model itself, by far the largest part, is in a file of its own next to the
+# state (<state>.model); it is written when the model is refitted and only
+# read when some predictions are stale. A new upload is hashed row by
+# row and only added or changed rows are processed and analyzed again. The
+# histograms, from which the summary stats and grade distributions are
+# derived, have the old values of changed and removed rows taken out and the
+# new ones added. The model is refitted once the share of rows added, changed
+# or removed since the last fit reaches `retrain_threshold`; until then only
+# added and changed rows are predicted again. A run that finds no added,
+# changed or removed rows leaves the state file as it is.
+#
+# A full run is done, and the state rebuilt, when there is no usable state or
+# the header, dtypes or schema overrides changed. Without a unique id column
+# the file is analyzed by analyze_csv() and no state is written.
+#
+# Differences from a full run: mean and std are computed from the histograms
+# and may differ in the last few bits; grade distribution entries with equal
+# counts may come in a different order; until the model is refitted,
+# model_performance, feature_importance and the risk threshold are those of
+# the last fit, and so are the predictions of unchanged rows with a missing
+# feature, whose column-mean fill may have moved since.
+import os
+import pickle
+import sys
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import enhanced_csv_reader as reader
+from schema_plan import overrides_key
+from student_analysis import analyze_students
+
+DEFAULT_RETRAIN_THRESHOLD = 0.05
+# bump when the state layout or the analysis output changes
+STATE_VERSION = 'incremental-v2'
+MODEL_SUFFIX = '.model'
+
+
+def load_state(path):
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # e.g. written by another sklearn build: start over
+        print(f"Ignoring unreadable state {path}: {e}", file=sys.stderr)
+        return None
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def _dump(path, obj):
+    # Written through a temp file and os.replace(), like DiskCache.put()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def save_state(path, state):
+    _dump(path, state)
+
+
+def save_model(state_path, model):
+    # Write the model file of a state; returns the id the state refers to it by
+    model_id = uuid.uuid4().hex
+    _dump(state_path + MODEL_SUFFIX, {'id': model_id, 'model': model})
+    return model_id
+
+
+def load_model(state_path, model_id):
+    # The model saved with model_id, or None when the file is missing,
+    # unreadable or from another fit (e.g. a run that stopped before
+    # writing its state)
+    try:
+        with open(state_path + MODEL_SUFFIX, 'rb') as f:
+            saved = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable model {state_path + MODEL_SUFFIX}: {e}", file=sys.stderr)
+        return None
+    if not isinstance(saved, dict) or saved.get('id') != model_id:
+        return None
+    return saved['model']
+
+
+def _row_keys(df, plan):
+    # Student ids in row order, or None when they cannot identify rows
+    if plan.key is None or df[plan.key].isna().any() or not df[plan.key].is_unique:
+        return None
+    return df[plan.key].tolist()
+
+
+def _update_histogram(histogram, added, removed):
+    histogram = histogram.add(added.value_counts(), fill_value=0)
+    if len(removed):
+        histogram = histogram.sub(removed.value_counts(), fill_value=0)
+    return histogram[histogram > 0].astype(np.int64)
+
+
+def _numeric_summary(histogram):
+    # summarize_columns() figures for a column, from its value histogram
+    if not len(histogram):
+        return {'mean': None, 'median': None, 'std': None, 'min': None, 'max': None}
+    histogram = histogram.sort_index()
+    values = histogram.index.to_numpy(dtype=float)
+    counts = histogram.to_numpy(dtype=np.int64)
+    total = int(counts.sum())
+    mean = float(np.dot(values, counts) / total)
+    cumulative = np.cumsum(counts)
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, total // 2, side='right')]
+    return {
+        'mean': mean,
+        'median': float((lower + upper) / 2),
+        'std': float(np.sqrt(np.dot((values - mean) ** 2, counts) / total)) if total > 1 else 0.0,
+        'min': float(values[0]),
+        'max': float(values[-1])
+    }
+
+
+def _summarize_histograms(stats, analysis_df, histograms, plan, grade_bins=None):
+    grade_cols = set(plan.grade)
+    for col in analysis_df.columns:
+        # value_counts() order: most frequent first
+        by_count = histograms[col].sort_values(ascending=False, kind='mergesort')
+        if pd.api.types.is_numeric_dtype(analysis_df[col]):
+            stats['summary_stats'][col] = _numeric_summary(histograms[col])
+            if col in grade_cols and grade_bins is not None:
+                # the value histogram, weighted, is counted into the bins
+                stats['grade_distribution'][col] = grade_bins.histogram(
+                    histograms[col].index.to_numpy(dtype=float), weights=histograms[col].to_numpy())
+            elif col in grade_cols:
+                stats['grade_distribution'][col] = {str(k): int(v) for k, v in by_count.items()}
+        else:
+            stats['summary_stats'][col] = {k: int(v) for k, v in by_count.items()}
+
+
+def _refresh_model(stats, analysis_df, plan, model_state, changed_rows, predictions, model_cache,
+                   retrain_threshold, state_path, ml_budget=None):
+    # Returns (model_state, predictions, refitted) after refitting or patching
+    # the predictions; model_state is None when no model applies to this data.
+    # A refitted model (chosen within ml_budget seconds, if given) is saved
+    # with save_model().
+    data = reader.ml_training_data(stats, analysis_df, plan)
+    if data is None:
+        return None, None, False
+    target_col, feature_cols, X, y = data
+
+    reuse = (model_state is not None
+             and model_state['target_col'] == target_col
+             and model_state['feature_cols'] == feature_cols
+             and model_state.get('ml_budget') == ml_budget
+             and (model_state['changed_rows'] + changed_rows) / model_state['fitted_rows'] < retrain_threshold)
+    if reuse:
+        model_state = dict(model_state, changed_rows=model_state['changed_rows'] + changed_rows)
+        predictions = np.array([np.nan if p is None else p for p in predictions], dtype=float)
+        stale = np.isnan(predictions)
+        if stale.any():
+            model = load_model(state_path, model_state['model_id'])
+            if model is None:
+                print("No usable model file, refitting", file=sys.stderr)
+                reuse = False
+            else:
+                predictions[stale] = model.predict(X[stale])
+        if reuse:
+            print(f"Reusing model, {stale.sum()} predictions updated", file=sys.stderr)
+    if not reuse:
+        entry = reader.load_or_fit_model(X, y, target_col, feature_cols, model_cache, ml_budget)
+        model_state = {'entry': {k: v for k, v in entry.items() if k != 'model'},
+                       'model_id': save_model(state_path, entry['model']),
+                       'target_col': target_col, 'feature_cols': feature_cols, 'ml_budget': ml_budget,
+                       'fitted_rows': len(X), 'changed_rows': 0}
+        predictions = entry['model'].predict(X)
+
+    stats['ml_predictions'] = reader.ml_summary(target_col, feature_cols, model_state['entry'])
+    stats['ml_predictions']['predictions'] = [float(p) for p in predictions]
+    return model_state, predictions, not reuse
+
+
+def analyze_csv_incremental(file_path, state_path, model_cache=None, schema_path=None,
+                            retrain_threshold=DEFAULT_RETRAIN_THRESHOLD, grade_bins=None, parse_cache=None,
+                            ml_budget=None):
+    """analyze_csv() result for `file_path`, reusing and updating the state in `state_path`."""
+    plan, df = reader.read_planned_csv(file_path, schema_path, parse_cache)
+    df, _, quality = reader.clean_frame(df, plan)
+    keys = _row_keys(df, plan)
+    if keys is None:
+        print("No unique student id column, running a full analysis without state", file=sys.stderr)
+        return reader.analyze_csv(file_path, model_cache, schema_path, grade_bins=grade_bins,
+                                  ml_budget=ml_budget, parse_cache=parse_cache)
+
+    identifier_columns = list(plan.identifier)
+    print(f"Identifier columns excluded from analysis: {identifier_columns}", file=sys.stderr)
+    analysis_df = df.drop(columns=identifier_columns, errors='ignore')
+
+    signature = (tuple(df.columns), tuple(str(dtype) for dtype in df.dtypes), overrides_key(schema_path))
+    state = load_state(state_path)
+    if state is not None and state['signature'] != signature:
+        print("Header or column types changed, rebuilding the state", file=sys.stderr)
+        state = None
+    old_rows = state['rows'] if state else {}
+
+    # --- find added / changed / removed rows ---
+    hashes = pd.util.hash_pandas_object(df, index=False).tolist()
+    dirty = [i for i, (key, h) in enumerate(zip(keys, hashes))
+             if key not in old_rows or old_rows[key]['hash'] != h]
+    current = set(keys)
+    removed = [key for key in old_rows if key not in current]
+    replaced = [old_rows[keys[i]] for i in dirty if keys[i] in old_rows]
+    print(f"{len(dirty) - len(replaced)} added, {len(replaced)} changed, {len(removed)} removed rows",
+          file=sys.stderr)
+
+    # --- aggregates ---
+    if state is None:
+        histograms = {col: analysis_df[col].value_counts() for col in analysis_df.columns}
+    else:
+        gone = [entry['row'] for entry in replaced] + [old_rows[key]['row'] for key in removed]
+        histograms = {}
+        for col in analysis_df.columns:
+            old_values = pd.Series([row[col] for row in gone], dtype=analysis_df[col].dtype)
+            histograms[col] = _update_histogram(state['histograms'][col], analysis_df[col].iloc[dirty], old_values)
+
+    stats = reader.new_stats(len(df), df.columns, identifier_columns, analysis_df.columns)
+    stats['data_quality'] = quality
+    _summarize_histograms(stats, analysis_df, histograms, plan, grade_bins)
+
+    # --- per-student analysis, only for added and changed rows ---
+    dirty_df = df.iloc[dirty]
+    fresh = dict(zip(dirty, zip(reader.process_records(dirty_df, plan),
+                                analyze_students(dirty_df, analysis_df.iloc[dirty], identifier_columns, plan))))
+    data = []
+    individual = []
+    predictions = []
+    for i, key in enumerate(keys):
+        if i in fresh:
+            row, student = fresh[i]
+            prediction = None
+        else:
+            entry = old_rows[key]
+            row, student, prediction = entry['row'], entry['student'], entry['prediction']
+            student['index'] = i
+            student.pop('ml_prediction', None)
+            student.pop('ml_at_risk', None)
+        data.append(row)
+        individual.append(student)
+        predictions.append(prediction)
+    stats['individual_student_analysis'] = individual
+
+    # --- ML predictions ---
+    model_state = state['model'] if state else None
+    refitted = False
+    try:
+        model_state, predictions, refitted = _refresh_model(stats, analysis_df, plan, model_state,
+                                                            len(dirty) + len(removed), predictions, model_cache,
+                                                            retrain_threshold, state_path, ml_budget)
+    except Exception as e:
+        model_state, predictions = None, None
+        stats['ml_predictions'] = {'error': str(e)}
+        print(f"ML Error: {str(e)}", file=sys.stderr)
+    if model_state is not None:
+        threshold = model_state['entry']['threshold']
+        at_risk_indices = reader.apply_ml_predictions(individual, predictions, threshold)
+        stats['risk_analysis'] = reader.risk_summary(threshold, at_risk_indices, stats['total_students'])
+
+    if stats['summary_stats']:
+        stats['performance_insights'] = reader.performance_insights(
+            stats['summary_stats'],
+            len([s for s in individual if s['at_risk']]),
+            len([s for s in individual if s.get('overall_performance', 0) >= 85]))
+
+    if state is not None and not dirty and not removed and not refitted:
+        print("No rows changed, state left as it is", file=sys.stderr)
+    else:
+        save_state(state_path, {
+            'version': STATE_VERSION,
+            'signature': signature,
+            'rows': {key: {'hash': h, 'row': row, 'student': student,
+                           'prediction': float(predictions[i]) if predictions is not None else None}
+                     for i, (key, h, row, student) in enumerate(zip(keys, hashes, data, individual))},
+            'histograms': histograms,
+            'model': model_state,
+        })
+
+    return {
+        'data': data,
+        'analysis': stats,
+        'incremental': {
+            'full_run': state is None,
+            'rows_analyzed': len(dirty),
+            'rows_removed': len(removed),
+            'model_refitted': refitted,
+        }
+    }
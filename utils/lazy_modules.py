@@ -0,0 +1,32 @@
+# Deferred imports of the heavy packages.
+#
+#   np = lazy_module('numpy')      # in place of `import numpy as np`
+#
+# pandas and numpy take most of the analyzer's start-up time, yet a run
+# answered from the result cache never touches them. Modules on the path
+# of every run (enhanced_csv_reader and what it imports at the top) bind
+# them with lazy_module(): the name stands in for the module and imports it
+# the first time one of its attributes is read, so the cost moves to the
+# first analysis and runs that do none skip it. Nothing is put in
+# sys.modules, so other importers get the real module as usual.
+import importlib
+
+
+class LazyModule:
+
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        # only reached for names not copied yet: import, then copy the
+        # module's attributes so later reads are plain lookups
+        module = importlib.import_module(self._lazy_name)
+        self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._lazy_name}'>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
@@ -0,0 +1,219 @@
+# Size-adaptive model training for the ML stage.
+#
+#   python enhanced_csv_reader.py --ml-budget 30 <data.csv>    # fit + predict in about 30 seconds
+#
+# Without a budget the ML stage fits the original model (fit_model(): a
+# 100-tree RandomForest on one core, 80/20 split). With one, choose_strategy()
+# sizes the work from the row count, the number of features and the cores:
+#
+#   forest                  the same forest on every training row, on all
+#                           cores (one core below SMALL_ROWS rows, where a
+#                           worker pool costs more than it saves)
+#   forest_subsampled       the forest on a uniform sample of the training
+#                           rows, when fitting on all of them would not fit
+#                           the budget but predicting every row would
+#   hist_gradient_boosting  HistGradientBoostingRegressor (binned features,
+#                           multithreaded) on as many rows as the budget
+#                           allows; predicting with 100 deep trees is what
+#                           makes the forest too slow for millions of rows
+#
+# The estimate of a strategy covers the whole ML stage: fitting, predicting
+# the held-out test set (20% of the rows, at most MAX_TEST_ROWS) and
+# predicting every row; a strategy is only chosen when that total fits the
+# budget, else the next, cheaper one is tried. Forest costs grow with the
+# depth of its trees, about log2 of the training rows. The rates come from
+# probe_rates(): a few trees fitted on PROBE_ROWS rows of the data and
+# timed on this machine (the DEFAULT_RATES below are used for inputs too
+# small to be worth a probe); the probe's time comes out of the budget. The
+# report in ml_predictions.strategy has the estimates next to the measured
+# seconds. Predictions are always computed in batches of PREDICT_BATCH_ROWS
+# rows. sklearn is imported by the functions that fit, like fit_model().
+import os
+import time
+
+from lazy_modules import lazy_module
+
+np = lazy_module('numpy')
+
+N_TREES = 100
+SMALL_ROWS = 2_000
+MIN_TRAIN_ROWS = 1_000
+MAX_TEST_ROWS = 50_000
+PREDICT_BATCH_ROWS = 100_000
+# rows for the permutation importances of the boosting model
+IMPORTANCE_ROWS = 2_000
+# the probe: PROBE_TREES trees (at least two per core) fitted on PROBE_ROWS
+# sampled rows, timed predicting PROBE_PREDICT_ROWS rows; inputs of up to
+# PROBE_MIN_ROWS rows are not probed
+PROBE_ROWS = 5_000
+PROBE_TREES = 10
+PROBE_PREDICT_ROWS = 50_000
+PROBE_MIN_ROWS = 20_000
+# single-core rows x trees per second with ~5 features, forests trained on
+# PROBE_ROWS rows (benchmarks/ data)
+DEFAULT_RATES = {
+    'forest_fit': 400_000,
+    'forest_predict': 10_000_000,
+    'boosting_fit': 3_000_000,
+    'boosting_predict': 60_000_000,
+}
+
+
+def _width(n_features):
+    # work grows with the number of features
+    return max(n_features, 1) / 5
+
+
+def _timed(call, *args):
+    start = time.perf_counter()
+    call(*args)
+    # a floor keeps a probe below the timer's resolution from dividing by 0
+    return max(time.perf_counter() - start, 1e-6)
+
+
+def probe_rates(X, y, cpus=None):
+    """DEFAULT_RATES measured on X, y and this machine; also has 'probe_s',
+    the seconds the probe took."""
+    from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+
+    start = time.perf_counter()
+    n_jobs = cpus or os.cpu_count() or 1
+    width = _width(X.shape[1])
+    rows = np.sort(np.random.default_rng(42).choice(len(X), min(PROBE_ROWS, len(X)), replace=False))
+    X_fit, y_fit = X.iloc[rows], y.iloc[rows]
+    X_predict = X.iloc[:PROBE_PREDICT_ROWS]
+
+    def rate(units, rows, seconds):
+        return units * rows * width / (seconds * n_jobs)
+
+    trees = max(PROBE_TREES, 2 * n_jobs)
+    forest = RandomForestRegressor(n_estimators=trees, random_state=42, n_jobs=n_jobs)
+    rates = {'forest_fit': rate(trees, len(X_fit), _timed(forest.fit, X_fit, y_fit)),
+             'forest_predict': rate(trees, len(X_predict), _timed(forest.predict, X_predict))}
+    boosting = HistGradientBoostingRegressor(max_iter=PROBE_TREES, early_stopping=False, random_state=42)
+    rates['boosting_fit'] = rate(PROBE_TREES, len(X_fit), _timed(boosting.fit, X_fit, y_fit))
+    rates['boosting_predict'] = rate(PROBE_TREES, len(X_predict), _timed(boosting.predict, X_predict))
+    rates['probe_s'] = round(time.perf_counter() - start, 3)
+    return rates
+
+
+def choose_strategy(n_rows, n_features, budget_s, cpus=None, rates=None):
+    """Strategy dict (name, train_rows, test_rows, n_jobs, estimates) for
+    fitting and predicting `n_rows` rows within about `budget_s` seconds, at
+    `rates` (probe_rates(); DEFAULT_RATES when None)."""
+    cpus = cpus or os.cpu_count() or 1
+    rates = rates or DEFAULT_RATES
+    n_jobs = 1 if n_rows < SMALL_ROWS else cpus
+    width = _width(n_features)
+    test_rows = min(int(np.ceil(n_rows * 0.2)), MAX_TEST_ROWS)
+    available = n_rows - test_rows
+    probe_s = rates.get('probe_s', 0.0)
+    remaining = budget_s - probe_s
+
+    def seconds(kind, train_rows):
+        # (fit, predict) seconds of a forest or boosting model on train_rows
+        # rows; the prediction covers every row plus the test set
+        depth = np.log2(max(train_rows, 2)) / np.log2(PROBE_ROWS) if kind == 'forest' else 1.0
+        work = N_TREES * width * depth / n_jobs
+        return (work * train_rows / rates[f'{kind}_fit'],
+                work * (n_rows + test_rows) / rates[f'{kind}_predict'])
+
+    def rows_within(kind):
+        # most training rows whose fit and predict fit the remaining budget
+        lo, hi = 0, available
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if sum(seconds(kind, mid)) <= remaining:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def strategy(name, kind, train_rows):
+        fit_s, predict_s = seconds(kind, train_rows)
+        return {
+            'name': name,
+            'train_rows': int(train_rows),
+            'test_rows': test_rows,
+            'n_jobs': n_jobs,
+            'budget_s': budget_s,
+            'rates': 'probed' if 'probe_s' in rates else 'default',
+            'probe_s': probe_s,
+            'estimated_fit_s': round(fit_s, 3),
+            'estimated_predict_s': round(predict_s, 3),
+            'estimated_total_s': round(probe_s + fit_s + predict_s, 3),
+        }
+
+    forest_rows = rows_within('forest')
+    if forest_rows >= available:
+        return strategy('forest', 'forest', available)
+    if forest_rows >= MIN_TRAIN_ROWS:
+        return strategy('forest_subsampled', 'forest', forest_rows)
+    boosting_rows = max(rows_within('boosting'), MIN_TRAIN_ROWS)
+    return strategy('hist_gradient_boosting', 'boosting', min(boosting_rows, available))
+
+
+def cache_variant(budget_s):
+    # The strategy depends on the measured rates, so cached models are
+    # keyed by the budget they were chosen for
+    return f"budget={budget_s:g}"
+
+
+def predict_batches(model, X, batch_rows=PREDICT_BATCH_ROWS):
+    # model.predict() over X in slices of batch_rows rows, so the temporary
+    # arrays of one prediction stay bounded; same values as one call
+    predictions = np.empty(len(X))
+    rows = X.iloc if hasattr(X, 'iloc') else X
+    for start in range(0, len(X), batch_rows):
+        predictions[start:start + batch_rows] = model.predict(rows[start:start + batch_rows])
+    return predictions
+
+
+def _importances(model, X_test, y_test, feature_cols):
+    if hasattr(model, 'feature_importances_'):
+        values = model.feature_importances_
+    else:
+        from sklearn.inspection import permutation_importance
+        # permutation importances on a few test rows, scaled to sum to 1
+        # like the forest's
+        rows = min(len(X_test), IMPORTANCE_ROWS)
+        result = permutation_importance(model, X_test.iloc[:rows], y_test.iloc[:rows], n_repeats=3,
+                                        random_state=42)
+        values = np.clip(result.importances_mean, 0, None)
+        if values.sum() > 0:
+            values = values / values.sum()
+    return {col: float(values[i]) for i, col in enumerate(feature_cols)}
+
+
+def fit_with_strategy(X, y, feature_cols, strategy):
+    # fit_model() counterpart for a choose_strategy() result; the entry also
+    # carries the strategy report with the measured fit seconds
+    from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    start = time.perf_counter()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=strategy['test_rows'], random_state=42)
+    if strategy['train_rows'] < len(X_train):
+        keep = np.sort(np.random.default_rng(42).choice(len(X_train), strategy['train_rows'], replace=False))
+        X_train, y_train = X_train.iloc[keep], y_train.iloc[keep]
+
+    if strategy['name'] == 'hist_gradient_boosting':
+        model = HistGradientBoostingRegressor(max_iter=N_TREES, early_stopping=False, random_state=42)
+    else:
+        model = RandomForestRegressor(n_estimators=N_TREES, random_state=42, n_jobs=strategy['n_jobs'])
+    model.fit(X_train, y_train)
+
+    y_pred = predict_batches(model, X_test)
+    mse = mean_squared_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
+    return {
+        'model': model,
+        'model_performance': {
+            'mse': float(mse),
+            'r2_score': float(r2),
+            'rmse': float(np.sqrt(mse))
+        },
+        'feature_importance': _importances(model, X_test, y_test, feature_cols),
+        'strategy': dict(strategy, fit_s=round(time.perf_counter() - start, 3)),
+    }
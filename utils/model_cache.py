@@ -0,0 +1,55 @@
+# Cache of fitted RandomForest models.
+#
+# The key hashes the target column, the feature columns and the exact
+# training matrix (plus the sklearn version and model settings, since pickled
+# estimators are not portable across versions). Re-uploading the same class
+# roster therefore loads the model, its test metrics, feature importances and
+# risk threshold instead of fitting 100 trees again.
+import hashlib
+import os
+import pickle
+
+from disk_cache import DiskCache, default_cache_dir
+from lazy_modules import lazy_module
+
+np = lazy_module('numpy')
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# bump when the model settings or the cached entry layout change
+MODEL_VERSION = 'rf-100-rs42-v1'
+
+
+class ModelCache:
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        directory = directory or os.path.join(default_cache_dir(), 'models')
+        self.store = DiskCache(directory, max_bytes, suffix='.pkl')
+
+    @staticmethod
+    def key(target_col, feature_cols, X, y, variant=''):
+        # variant: how the model is fitted when that is not the default
+        # (ml_strategy.cache_variant())
+        import sklearn  # only needed once a model is about to be fitted or loaded
+        h = hashlib.blake2b(digest_size=20)
+        settings = (MODEL_VERSION, sklearn.__version__, target_col, list(feature_cols), X.shape)
+        h.update(repr(settings + ((variant,) if variant else ())).encode('utf-8'))
+        h.update(np.ascontiguousarray(X.to_numpy(dtype=float)).tobytes())
+        h.update(np.ascontiguousarray(y.to_numpy(dtype=float)).tobytes())
+        return h.hexdigest()
+
+    def get(self, key):
+        data = self.store.get(key)
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # unreadable entry (e.g. written by another sklearn build): drop it
+            self.store.discard(key)
+            return None
+
+    def put(self, key, entry):
+        return self.store.put(key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def clear(self):
+        self.store.clear()
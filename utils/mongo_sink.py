@@ -0,0 +1,302 @@
+# Database sink: analysis results upserted into MongoDB in batches.
+#
+#   python enhanced_csv_reader.py --mongo-sink <data.csv>
+#   python enhanced_csv_reader.py --mongo-sink --mongo-batch-size 2000 <data.csv>
+#   python enhanced_csv_reader.py --mongo-sink --mongo-uri mongodb://db:27017/AcademeSense <data.csv>
+#
+# StudentController.saveStudentsToDatabase() does a findOne() and a save()
+# per student. The sink builds the same documents (student_document(), which
+# follows that function and the Student model field by field: id and name
+# fallbacks, the grades map, the model's insights and the controller's
+# final risk level) and writes them as unordered bulk upserts keyed by
+# student_id, `batch_size` per round trip. Fields the controller never
+# overwrites (alerts_sent, createdAt) are only set on insert.
+#
+# A batch that fails as a whole (connection lost, retryable write error) is
+# retried up to `retries` times with backoff; upserts are idempotent, so a
+# retried batch counts its earlier inserts as updates. Rows the database
+# rejects, and rows that would fail the Student model's validation, are
+# counted as failed and the rest of their batch is still written. The
+# report ends up as the "database_sink" block of the output:
+#
+#   "database_sink": {"inserted": 98012, "updated": 1988, "failed": 0, "duplicates": 0, "batches": 100,
+#                     "retried_batches": 0, "errors": [], "seconds": 3.8}
+#
+# pymongo is optional (not in requirements.txt); MemoryTarget is an
+# in-memory stand-in with the same interface as MongoTarget.
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+DEFAULT_URI = 'mongodb://127.0.0.1:27017/AcademeSense'
+DEFAULT_COLLECTION = 'students'
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 0.5
+# errors kept in the report
+MAX_REPORTED_ERRORS = 20
+# saveStudentsToDatabase(): columns that go into the grades map
+GRADE_KEYWORDS = ('math', 'english', 'science', 'history', 'grade', 'score')
+# the Student model's email validator
+EMAIL_RE = re.compile(r'^[\w.%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$', re.ASCII)
+
+
+class TransientError(Exception):
+    """A batch failed as a whole and may succeed when retried."""
+
+
+def default_uri():
+    return os.environ.get('MONGODB_URI') or DEFAULT_URI
+
+
+def _first(record, keys):
+    # JavaScript `a || b || c`: the first truthy value
+    for key in keys:
+        value = record.get(key)
+        if value:
+            return value
+    return None
+
+
+def _number(value, field):
+    # Mongoose Number cast
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: cannot cast {value!r} to a number")
+
+
+def _parse_float(value):
+    # JavaScript `parseFloat(value) || 0`
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(value) else value
+
+
+def _insights(performance, attendance, study_hours):
+    # Student.methods.generateInsights()
+    strengths = []
+    weaknesses = []
+    recommendations = []
+    if performance >= 85:
+        strengths.append("Excellent academic performance")
+    if attendance >= 95:
+        strengths.append("Exceptional attendance consistency")
+    if study_hours >= 6:
+        strengths.append("Strong study discipline")
+    if performance < 60:
+        weaknesses.append("Low academic performance")
+    if attendance < 80:
+        weaknesses.append("Inconsistent attendance")
+    if study_hours < 4:
+        weaknesses.append("Needs to dedicate more study time")
+    if performance < 75:
+        recommendations.append("Join study groups or seek mentoring for weak subjects")
+    if attendance < 85:
+        recommendations.append("Maintain regular attendance to keep learning continuity")
+    if study_hours < 5:
+        recommendations.append("Follow a daily study routine for at least 2 more hours")
+    return {'strengths': strengths, 'weaknesses': weaknesses, 'recommendations': recommendations}
+
+
+def _risk_level(grades, attendance, study_hours):
+    # saveStudentsToDatabase()'s "Enhanced Risk Prediction Logic"
+    average = sum(_parse_float(v) for v in grades.values()) / (len(grades) or 1)
+    attendance = _parse_float(attendance)
+    study_hours = _parse_float(study_hours)
+    if average == 0:
+        return 'high'
+    performance = 0.7 * average + 0.2 * attendance + 0.1 * study_hours * 10
+    if performance >= 85:
+        return 'low'
+    if performance >= 70:
+        return 'medium'
+    return 'high'
+
+
+def saved_fields(record, i):
+    """The fields saveStudentsToDatabase() derives from row `i` of the result
+    (student_id, name, email, grades, attendance, study_hours, final_grade,
+    risk_level), plus the Student model's overall_performance virtual.
+    Raises ValueError for a row the Student model would reject."""
+    student_id = str(_first(record, ('Student_Id', 'student_id', 'id')) or f"student_{i + 1}")
+    name = str(_first(record, ('Name', 'name')) or f"Student {i + 1}")
+    email = _first(record, ('Email', 'email'))
+    if email is not None and not EMAIL_RE.match(str(email)):
+        raise ValueError(f"email: {email!r} is not a valid email address")
+
+    grades = {key: _number(value, key) for key, value in record.items()
+              if any(word in key.lower() for word in GRADE_KEYWORDS)}
+    attendance = _number(_first(record, ('Attendence', 'Attendance', 'attendance')), 'attendance')
+    study_hours = _number(_first(record, ('Study_Hours', 'study_hours')), 'study_hours')
+    final_grade = _number(_first(record, ('Final_Grade', 'final_grade')), 'final_grade')
+    for field, value, low, high in (('attendance', attendance, 0, 100), ('study_hours', study_hours, 0, None),
+                                    ('final_grade', final_grade, 0, 100)):
+        if value is not None and (value < low or (high is not None and value > high)):
+            raise ValueError(f"{field}: {value} is out of range")
+
+    numeric_grades = [v for v in grades.values() if v is not None]
+    return {
+        'student_id': student_id,
+        'name': name,
+        'email': email,
+        'grades': grades,
+        'attendance': attendance,
+        'study_hours': study_hours,
+        'final_grade': final_grade,
+        'overall_performance': (sum(numeric_grades) / len(numeric_grades) if numeric_grades
+                                else (final_grade or 0)),
+        'risk_level': _risk_level(grades, attendance, study_hours),
+    }
+
+
+def student_document(record, student, i, now):
+    """(student_id, fields to set, fields to set on insert only) for row `i`
+    of the result, as saveStudentsToDatabase() would save it. Raises
+    ValueError for a row the Student model would reject."""
+    saved = saved_fields(record, i)
+    attendance, study_hours = saved['attendance'], saved['study_hours']
+    fields = {
+        'name': saved['name'],
+        'email': saved['email'],
+        'grades': saved['grades'],
+        'ml_prediction': student.get('ml_prediction'),
+        'risk_level': saved['risk_level'],
+        'at_risk': saved['risk_level'] == 'high',
+        # generateInsights() works from the overall_performance virtual
+        'performance_insights': _insights(saved['overall_performance'], attendance or 0, study_hours or 0),
+        'last_updated': now,
+        'updatedAt': now,
+    }
+    defaults = {'alerts_sent': [], 'createdAt': now, '__v': 0}
+    # missing numbers keep the stored value, or get the model default
+    for field in ('attendance', 'study_hours', 'final_grade'):
+        if saved[field] is None:
+            defaults[field] = 0
+        else:
+            fields[field] = saved[field]
+    return saved['student_id'], fields, defaults
+
+
+class MongoTarget:
+    """Upserts into a MongoDB collection (pymongo)."""
+
+    def __init__(self, uri=None, collection=DEFAULT_COLLECTION):
+        try:
+            import pymongo
+        except ImportError:
+            raise ImportError("--mongo-sink needs pymongo (pip install pymongo)")
+        self.pymongo = pymongo
+        self.client = pymongo.MongoClient(uri or default_uri())
+        self.collection = self.client.get_default_database('AcademeSense')[collection]
+
+    def upsert(self, batch):
+        # (inserted, updated, {position in batch: error}) of one bulk write
+        from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+        ops = [self.pymongo.UpdateOne({'student_id': student_id}, {'$set': fields, '$setOnInsert': defaults},
+                                      upsert=True)
+               for student_id, fields, defaults in batch]
+        try:
+            result = self.collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            details = e.details
+            if not details.get('writeErrors'):
+                raise TransientError(str(details.get('writeConcernErrors')))
+            errors = {error['index']: error.get('errmsg', 'write error') for error in details['writeErrors']}
+            return details.get('nUpserted', 0), details.get('nMatched', 0), errors
+        except ConnectionFailure as e:
+            raise TransientError(str(e))
+        except OperationFailure as e:
+            if e.has_error_label('RetryableWriteError'):
+                raise TransientError(str(e))
+            raise
+        return result.upserted_count, result.matched_count, {}
+
+    def close(self):
+        self.client.close()
+
+
+class MemoryTarget:
+    """In-memory stand-in for MongoTarget: documents by student_id."""
+
+    def __init__(self):
+        self.documents = {}
+
+    def upsert(self, batch):
+        inserted = updated = 0
+        for student_id, fields, defaults in batch:
+            document = self.documents.get(student_id)
+            if document is None:
+                self.documents[student_id] = {'student_id': student_id, **defaults, **fields}
+                inserted += 1
+            else:
+                document.update(fields)
+                updated += 1
+        return inserted, updated, {}
+
+    def close(self):
+        pass
+
+
+def write_students(target, result, batch_size=DEFAULT_BATCH_SIZE, retries=DEFAULT_RETRIES):
+    """Upsert every student of an analyze_csv() result into `target`;
+    returns the report dict."""
+    start = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    report = {'inserted': 0, 'updated': 0, 'failed': 0, 'duplicates': 0, 'batches': 0, 'retried_batches': 0,
+              'errors': []}
+
+    def fail(student_id, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'student_id': student_id, 'error': error})
+
+    # one upsert per student_id: a later row replaces an earlier one, as
+    # saving them one after the other would
+    documents = {}
+    individual = result['analysis']['individual_student_analysis']
+    for i, (record, student) in enumerate(zip(result['data'], individual)):
+        try:
+            student_id, fields, defaults = student_document(record, student, i, now)
+        except ValueError as e:
+            fail(str(_first(record, ('Student_Id', 'student_id', 'id')) or f"student_{i + 1}"), str(e))
+            continue
+        if student_id in documents:
+            report['duplicates'] += 1
+        documents[student_id] = (student_id, fields, defaults)
+    documents = list(documents.values())
+
+    for offset in range(0, len(documents), batch_size):
+        batch = documents[offset:offset + batch_size]
+        report['batches'] += 1
+        for attempt in range(retries + 1):
+            try:
+                inserted, updated, errors = target.upsert(batch)
+                break
+            except TransientError as e:
+                if attempt == retries:
+                    print(f"Database sink: batch of {len(batch)} failed after {retries} retries: {e}",
+                          file=sys.stderr)
+                    inserted, updated, errors = 0, 0, {i: str(e) for i in range(len(batch))}
+                    break
+                if attempt == 0:
+                    report['retried_batches'] += 1
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+        report['inserted'] += inserted
+        report['updated'] += updated
+        for i, error in sorted(errors.items()):
+            fail(batch[i][0], error)
+
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    return report
@@ -0,0 +1,171 @@
+# Compact NDJSON output: one line per student, written as soon as it is ready.
+#
+#   python enhanced_csv_reader.py --ndjson <data.csv>
+#   python enhanced_csv_reader.py --ndjson --chunksize 50000 <data.csv>
+#
+#   {"type":"header","columns":[...],"identifier_columns":[...],"messages":{"S1":"Excellent academic performance",...}}
+#   {"type":"student","index":0,"data":{...},"overall_performance":81.2,"strengths":["S1","S4:Maths"],...}
+#   ...
+#   {"type":"summary","analysis":{...}}
+#
+# Each student is written once: "data" is the processed CSV row and the
+# analysis fields that only repeat it (identifier, performance_metrics and the
+# always-empty risk_factors) are left out. Feedback messages are short codes
+# looked up in the header's "messages" table; a ":Subject" suffix fills the
+# {subject} placeholder. The summary is the usual "analysis" object without
+# the per-student lists (individual_student_analysis,
+# ml_predictions.predictions, risk_analysis.at_risk_students), since those
+# values are already on the student lines. Empty cells are written as null.
+import json
+import sys
+
+import diagnostics
+import enhanced_csv_reader as reader
+from student_analysis import (ACADEMIC_WEAKNESSES, ATTENDANCE_WEAKNESSES, STUDY_WEAKNESSES,
+                              LOW_PERFORMANCE_RECOMMENDATIONS, STUDY_RECOMMENDATIONS, iter_students)
+
+MESSAGES = {
+    'S1': "Excellent academic performance",
+    'S2': "Outstanding attendance",
+    'S3': "Excellent study discipline",
+    'S4': "Excellent performance in {subject}",
+    'W1': ACADEMIC_WEAKNESSES[1],
+    'W2': ACADEMIC_WEAKNESSES[2],
+    'W3': ACADEMIC_WEAKNESSES[3],
+    'W4': ATTENDANCE_WEAKNESSES[1],
+    'W5': ATTENDANCE_WEAKNESSES[2],
+    'W6': STUDY_WEAKNESSES[1],
+    'W7': STUDY_WEAKNESSES[2],
+    'W8': "Needs improvement in {subject}",
+    'R1': "Focus on improving {subject} through extra practice",
+    'R2': LOW_PERFORMANCE_RECOMMENDATIONS[0],
+    'R3': LOW_PERFORMANCE_RECOMMENDATIONS[1],
+    'R4': "Improve class attendance",
+    'R5': STUDY_RECOMMENDATIONS[0],
+    'R6': STUDY_RECOMMENDATIONS[1],
+}
+
+_FIXED_CODES = {text: code for code, text in MESSAGES.items() if '{subject}' not in text}
+_TEMPLATE_CODES = [(code, *text.split('{subject}')) for code, text in MESSAGES.items() if '{subject}' in text]
+_MESSAGE_KEYS = ('strengths', 'weaknesses', 'recommendations')
+_REPEATED_KEYS = ('identifier', 'performance_metrics', 'risk_factors')
+
+
+def encode_message(text):
+    code = _FIXED_CODES.get(text)
+    if code is not None:
+        return code
+    for code, prefix, suffix in _TEMPLATE_CODES:
+        if text.startswith(prefix) and text.endswith(suffix):
+            return f"{code}:{text[len(prefix):len(text) - len(suffix)]}"
+    return text
+
+
+def decode_message(code):
+    name, _, subject = code.partition(':')
+    template = MESSAGES.get(name)
+    if template is None:
+        return code
+    return template.format(subject=subject) if subject else template
+
+
+def _clean_row(row):
+    # NaN is not valid JSON; write empty cells as null
+    return {k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()}
+
+
+class NDJSONWriter:
+
+    def __init__(self, out=None, flush_every=1000):
+        self.out = out or sys.stdout
+        self.flush_every = flush_every
+        self._pending = 0
+
+    def _write(self, record):
+        self.out.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def header(self, columns, identifier_columns):
+        self._write({'type': 'header', 'columns': list(columns),
+                     'identifier_columns': identifier_columns, 'messages': MESSAGES})
+        self.out.flush()
+
+    def student(self, row, analysis):
+        record = {'type': 'student', 'index': analysis['index'], 'data': _clean_row(row)}
+        for key, value in analysis.items():
+            if key in _REPEATED_KEYS or key == 'index':
+                continue
+            if key in _MESSAGE_KEYS:
+                value = [encode_message(text) for text in value]
+            record[key] = value
+        self._write(record)
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._pending = 0
+        self.out.flush()
+
+    def summary(self, stats):
+        analysis = {k: v for k, v in stats.items() if k != 'individual_student_analysis'}
+        if 'predictions' in analysis.get('ml_predictions', {}):
+            analysis['ml_predictions'] = {k: v for k, v in analysis['ml_predictions'].items() if k != 'predictions'}
+        if 'at_risk_students' in analysis.get('risk_analysis', {}):
+            analysis['risk_analysis'] = {k: v for k, v in analysis['risk_analysis'].items() if k != 'at_risk_students'}
+        self._write({'type': 'summary', 'analysis': analysis})
+        self.flush()
+
+
+def write_ndjson(file_path, out=None, model_cache=None, schema_path=None, grade_bins=None, ml_budget=None,
+                 parse_cache=None):
+    # In-memory path: the model is fitted before any student line is written,
+    # so each line already carries its ml_prediction
+    writer = NDJSONWriter(out)
+    with diagnostics.stage('parse'):
+        plan, df = reader.read_planned_csv(file_path, schema_path, parse_cache)
+
+    identifier_columns = list(plan.identifier)
+    print(f"Identifier columns excluded from analysis: {identifier_columns}", file=sys.stderr)
+    with diagnostics.stage('cleaning'):
+        df, emails, quality = reader.clean_frame(df, plan)
+
+    analysis_df = df.drop(columns=identifier_columns, errors='ignore')
+    stats = reader.new_stats(len(df), df.columns, identifier_columns, analysis_df.columns)
+    stats['data_quality'] = quality
+    with diagnostics.stage('summary_stats'):
+        reader.summarize_columns(stats, analysis_df, plan, grade_bins)
+    ml = reader.run_ml(stats, analysis_df, model_cache, plan, ml_budget=ml_budget)
+
+    writer.header(df.columns, identifier_columns)
+    at_risk_indices = []
+    needing_attention = 0
+    high_performers = 0
+    # records, student analysis and writing are interleaved, one stage
+    with diagnostics.stage('students'):
+        students = iter_students(df, analysis_df, identifier_columns, plan)
+        for i, (row, student) in enumerate(zip(reader.process_records(df, plan, emails), students)):
+            if ml is not None:
+                predictions, threshold = ml
+                at_risk_indices += reader.apply_ml_predictions([student], predictions[i:i + 1], threshold, i)
+            needing_attention += student['at_risk']
+            high_performers += student.get('overall_performance', 0) >= 85
+            writer.student(row, student)
+
+    if ml is not None:
+        stats['risk_analysis'] = reader.risk_summary(ml[1], at_risk_indices, stats['total_students'])
+    if stats['summary_stats']:
+        stats['performance_insights'] = reader.performance_insights(
+            stats['summary_stats'], needing_attention, high_performers)
+    diagnostics.add_block(stats)
+    writer.summary(stats)
+
+
+def write_ndjson_streaming(file_path, out=None, chunksize=None, sample_size=None, model_cache=None,
+                           schema_path=None, grade_bins=None, ml_budget=None):
+    # Chunked path: students are written chunk by chunk, see streaming_analysis
+    import streaming_analysis
+    writer = NDJSONWriter(out)
+    streaming_analysis.analyze_csv_streaming(
+        file_path, writer.out, chunksize or streaming_analysis.DEFAULT_CHUNKSIZE,
+        sample_size or streaming_analysis.DEFAULT_SAMPLE_SIZE, model_cache=model_cache, writer=writer,
+        schema_path=schema_path, grade_bins=grade_bins, ml_budget=ml_budget)
@@ -0,0 +1,23 @@
+# Start method of the analyzer's process pools.
+#
+# The worker (analysis_worker), batch mode (batch_analysis) and cohort mode
+# (cohort_analysis) fork their pool processes from a server that has
+# already imported the analysis modules, pandas and sklearn, so a new
+# process starts warm. Without a forkserver (macOS, Windows) processes are
+# spawned and import everything themselves.
+import multiprocessing
+
+# enhanced_csv_reader imports pandas and sklearn lazily, so they are named
+# here rather than reached through it
+PRELOAD = ['enhanced_csv_reader', 'pandas', 'student_analysis', 'sklearn.ensemble', 'sklearn.metrics',
+           'sklearn.model_selection']
+
+
+def mp_context(*modules):
+    # multiprocessing context for a pool whose processes run code from
+    # `modules`; those are preloaded before PRELOAD
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(list(modules) + PRELOAD)
+        return ctx
+    return multiprocessing.get_context('spawn')
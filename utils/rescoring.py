@@ -0,0 +1,176 @@
+# What-if rescoring: the risk results of the last run under another policy.
+#
+#   python enhanced_csv_reader.py --save-scores scores/roster.npz <data.csv>
+#   python rescoring.py scores/roster.npz --policy policy.json            # summary
+#   python rescoring.py scores/roster.npz --policy policy.json --details  # plus per-student arrays
+#   python rescoring.py scores/roster.npz --stdin                         # one policy per line, one result per line
+#
+# --save-scores keeps what the scores are computed from: each student's
+# academic score, attendance and study hours (student_analysis.score_inputs())
+# plus the model's predictions and the target they are compared with. A
+# policy is a JSON object overriding any part of DEFAULT_POLICY:
+#
+#   {"weights": {"academic": 0.6, "attendance": 0.3}, "academic_cutoffs": [45, 65, 85],
+#    "risk_levels": {"high": 70}, "ml_percentile": 25}
+#
+# (keys as in student_analysis.SCORING, plus "ml_percentile"). Rescorer
+# applies it with student_analysis.score_students(), the function the
+# analysis itself uses, in one vectorized pass over all students; nothing
+# is parsed or fitted again, so a dashboard slider can send policies to one
+# --stdin process. Under DEFAULT_POLICY the risk scores, levels and at-risk
+# students are those of the analysis; overall_performance is rounded with
+# np.round, which can differ from the analysis' round() in the last digit.
+import argparse
+import copy
+import json
+import sys
+import time
+
+import numpy as np
+
+from student_analysis import SCORING, score_inputs, score_students
+
+DEFAULT_POLICY = dict(copy.deepcopy(SCORING), ml_percentile=30)
+# keys whose values are lists, with their required lengths
+LIST_KEYS = {'academic_cutoffs': 3, 'attendance_cutoffs': 3, 'study_cutoffs': 3, 'academic_points': 3,
+             'attendance_points': 2, 'study_points': 2}
+
+
+def save_inputs(path, analysis_df, plan, stats):
+    # Write the rescoring inputs of one analysis (analyze_frame()) to `path`
+    academic_score, attendance, study_hours = score_inputs(analysis_df, plan)
+    arrays = {'academic_score': academic_score, 'attendance': attendance, 'study_hours': study_hours}
+    ml = stats.get('ml_predictions', {})
+    if 'predictions' in ml:
+        # the threshold is a percentile of the target, filled like ml_training_data()
+        target = analysis_df[ml['target_column']]
+        arrays['predictions'] = np.asarray(ml['predictions'], dtype=float)
+        arrays['target'] = target.fillna(target.mean()).to_numpy(dtype=float)
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def load_policy(policy):
+    """DEFAULT_POLICY with the overrides in `policy` (a dict) applied;
+    raises ValueError for unknown keys, values of the wrong shape and
+    cutoffs that do not strictly increase."""
+    if not isinstance(policy, dict):
+        raise ValueError("policy must be a JSON object")
+    merged = copy.deepcopy(DEFAULT_POLICY)
+    for key, value in policy.items():
+        if key not in merged:
+            raise ValueError(f"unknown policy key '{key}'")
+        default = merged[key]
+        if isinstance(default, dict):
+            if not isinstance(value, dict) or set(value) - set(default):
+                raise ValueError(f"'{key}' must be an object with keys {sorted(default)}")
+            merged[key].update(value)
+        else:
+            merged[key] = value
+
+    def number(name, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"'{name}' must be a number, not {value!r}")
+
+    for key, length in LIST_KEYS.items():
+        value = merged[key]
+        if not isinstance(value, list) or len(value) != length:
+            raise ValueError(f"'{key}' must be a list of {length} numbers")
+        for item in value:
+            number(key, item)
+        if key.endswith('_cutoffs') and any(a >= b for a, b in zip(value, value[1:])):
+            raise ValueError(f"'{key}' must be strictly increasing, not {value}")
+    for key in ('weights', 'risk_levels'):
+        for name, value in merged[key].items():
+            number(f"{key}.{name}", value)
+    number('ml_percentile', merged['ml_percentile'])
+    if not 0 <= merged['ml_percentile'] <= 100:
+        raise ValueError("'ml_percentile' must be between 0 and 100")
+    return merged
+
+
+class Rescorer:
+    """Rescoring inputs saved by save_inputs(), held in memory."""
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.arrays = {name: data[name] for name in data.files}
+        self.total = len(self.arrays['academic_score'])
+
+    def rescore(self, policy=None, details=False):
+        # Result dict for a policy dict (see load_policy()); with details,
+        # also the per-student overall_performance, risk_score and risk_level
+        start = time.perf_counter()
+        policy = load_policy(policy or {})
+        scored = score_students(self.arrays['academic_score'], self.arrays['attendance'],
+                                self.arrays['study_hours'], policy)
+        at_risk = scored['risk_level'] != 'low'
+        threshold = None
+        if 'predictions' in self.arrays:
+            threshold = float(np.percentile(self.arrays['target'], policy['ml_percentile']))
+            at_risk = at_risk | (self.arrays['predictions'] < threshold)
+        at_risk_indices = np.flatnonzero(at_risk)
+
+        performance = np.round(scored['performance'], 2)
+        levels, counts = np.unique(scored['risk_level'], return_counts=True)
+        result = {
+            'policy': policy,
+            'total_students': self.total,
+            'risk_levels': {level: 0 for level in ('high', 'medium', 'low')},
+            'risk_analysis': {
+                'threshold': threshold,
+                'at_risk_count': len(at_risk_indices),
+                'at_risk_percentage': float(len(at_risk_indices) / self.total * 100) if self.total else 0.0,
+                'at_risk_students': at_risk_indices.tolist(),
+            },
+            'mean_overall_performance': float(performance.mean()) if self.total else 0.0,
+        }
+        result['risk_levels'].update({str(level): int(count) for level, count in zip(levels, counts)})
+        if details:
+            result['overall_performance'] = performance.tolist()
+            result['risk_score'] = scored['risk_score'].tolist()
+            result['risk_level'] = scored['risk_level'].tolist()
+        result['seconds'] = round(time.perf_counter() - start, 6)
+        return result
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Rescore a saved analysis under another risk policy')
+    parser.add_argument('scores', help='file written by enhanced_csv_reader.py --save-scores')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--policy', metavar='FILE', help='policy JSON file (default: the built-in policy)')
+    source.add_argument('--stdin', action='store_true',
+                        help='read one policy JSON object per line and write one result line for each')
+    parser.add_argument('--details', action='store_true',
+                        help='include per-student overall_performance, risk_score and risk_level')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    rescorer = Rescorer(args.scores)
+    if not args.stdin:
+        policy = {}
+        if args.policy:
+            with open(args.policy, encoding='utf-8') as f:
+                policy = json.load(f)
+        try:
+            result = rescorer.rescore(policy, args.details)
+        except ValueError as e:
+            print(f"Invalid policy: {e}", file=sys.stderr)
+            sys.exit(2)
+        print(json.dumps(result, indent=2))
+        return
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            print(json.dumps(rescorer.rescore(json.loads(line), args.details)))
+        except ValueError as e:
+            print(json.dumps({'error': str(e)}))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
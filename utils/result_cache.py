@@ -0,0 +1,95 @@
+# Content-addressed cache of finished analysis results.
+#
+# Multer stores every upload under a random name, but teachers often upload
+# the very same export. The key is a hash of the file's bytes (plus the output
+# format, any schema overrides, RESULT_VERSION and the versions of the
+# libraries the numbers come from), so a repeated upload returns the stored
+# JSON text without parsing the CSV, analyzing it or touching the model.
+import functools
+import hashlib
+import importlib.metadata
+import json
+import os
+
+from disk_cache import DiskCache, default_cache_dir
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# bump whenever the analysis output changes, so stale results are not served
+# (v2: schema plan column roles, data_quality, grade bin labels, ML strategy report)
+RESULT_VERSION = 'v2'
+# a model fitted by another scikit-learn, or statistics computed by another
+# pandas/numpy, can differ in the last digits
+KEY_PACKAGES = ('scikit-learn', 'pandas', 'numpy')
+
+
+@functools.lru_cache(maxsize=None)
+def _package_versions():
+    # read from the installed metadata, so a cache hit never imports sklearn
+    versions = []
+    for package in KEY_PACKAGES:
+        try:
+            versions.append(f"{package}={importlib.metadata.version(package)}")
+        except importlib.metadata.PackageNotFoundError:
+            versions.append(f"{package}=none")
+    return ','.join(versions)
+
+
+class ResultCache:
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        directory = directory or os.path.join(default_cache_dir(), 'results')
+        self.store = DiskCache(directory, max_bytes, suffix='.json')
+
+    @staticmethod
+    def key(file_path, variant=''):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{RESULT_VERSION}|{_package_versions()}|{variant}|".encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def get(self, key):
+        data = self.store.get(key)
+        return data.decode('utf-8') if data is not None else None
+
+    def put(self, key, text):
+        return self.store.put(key, text.encode('utf-8'))
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        return self.store.stats()
+
+
+def cached_analysis(result_cache, file_path, analyze, indent=None, schema_key='', grades_key='', ml_key=''):
+    # JSON text for file_path, from the cache when the same bytes were
+    # analyzed before (with the same schema overrides, see schema_plan, grade
+    # bins, see grade_bins, and ML budget, see ml_strategy), with a
+    # "result_cache" block reporting hit/miss
+    variant = f"indent={indent}" + (f"|schema={schema_key}" if schema_key else '')
+    variant += f"|grades={grades_key}" if grades_key else ''
+    variant += f"|ml={ml_key}" if ml_key else ''
+    key = result_cache.key(file_path, variant=variant)
+    text = result_cache.get(key)
+    status = 'hit'
+    if text is None:
+        status = 'miss'
+        text = json.dumps(analyze(file_path), indent=indent)
+        result_cache.put(key, text)
+    return with_cache_status(text, {'status': status, 'key': key, **result_cache.stats()}, indent)
+
+
+def with_cache_status(text, block, indent=None):
+    return with_block(text, 'result_cache', block, indent)
+
+
+def with_block(text, name, block, indent=None):
+    # Append "<name>": block to a serialized result object, formatted the
+    # way json.dumps(..., indent=indent) would have done it
+    if indent:
+        pad = ' ' * indent
+        nested = json.dumps(block, indent=indent).replace('\n', '\n' + pad)
+        return text[:-2] + f',\n{pad}{json.dumps(name)}: {nested}\n}}'
+    return text[:-1] + f', {json.dumps(name)}: {json.dumps(block)}}}'
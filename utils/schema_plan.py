@@ -0,0 +1,172 @@
+# Column roles, worked out once per CSV header.
+#
+# The analysis needs to know which columns identify a student, which are
+# subject marks, which one is attendance, study hours or the ML target. Those
+# roles come from keyword checks on the column names; a SchemaPlan runs every
+# check once per column and the rest of the code reads the result. Plans are
+# cached per header signature, so a worker that keeps getting the same export
+# format does no inference after the first upload.
+#
+# Inference can be overridden with a small JSON file (--schema FILE, or
+# "schema" in a worker job). Every key is optional and lists column names:
+#
+#   {
+#     "identifier":  ["Roll No"],
+#     "subject":     ["Midterm", "Lab"],
+#     "attendance":  ["Present %"],
+#     "study_hours": ["Self Study"],
+#     "target":      ["Final"],
+#     "categorical": ["Section"],
+#     "other":       ["Paid"]
+#   }
+#
+# A listed column loses its inferred roles and gets the listed one instead,
+# except "target", which only picks the ML target and leaves the column's
+# other roles alone. "categorical" columns are read as text; "other" columns
+# are plain features with no role.
+import json
+import os
+import re
+from functools import lru_cache
+
+# Keyword lists used to decide which columns feed the per-student scores
+ACADEMIC_KEYWORDS = ['grade', 'score', 'mark', 'test', 'exam', 'math', 'english', 'science', 'history', 'physics', 'chemistry']
+SUBJECT_KEYWORDS = ['math', 'english', 'science', 'history', 'physics', 'chemistry', 'biology', 'score', 'mark', 'exam', 'test']
+NON_ACADEMIC_KEYWORDS = ['attendance', 'study', 'hours']
+ATTENDANCE_KEYS = ['attendance', 'att']
+STUDY_KEYS = ['study_hours', 'study_hours', 'studyhours', 'study', 'hours']
+# ... and the ones used for the summary and the ML model
+GRADE_KEYWORDS = ['grade', 'score', 'mark', 'test', 'exam']
+TARGET_KEYWORDS = ['final', 'total', 'overall', 'gpa', 'cgpa']
+NON_TARGET_KEYWORDS = ['attendance', 'study', 'hours']
+# 'id' has to be a whole word of the name ("Student_Id", "StudentID"), so
+# that "Midterm" or "Paid" are not taken for identifiers
+IDENTIFIER_KEYWORDS = ['studentid', 'name', 'email']
+
+ROLES = ('identifier', 'subject', 'attendance', 'study_hours', 'target', 'categorical', 'other')
+
+_NAME_WORDS = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+
+def _has_keyword(col, keywords):
+    col_lower = col.lower()
+    return any(keyword in col_lower for keyword in keywords)
+
+
+def _has_id_word(col_name):
+    return any(word.lower() == 'id' for word in _NAME_WORDS.findall(col_name))
+
+
+def is_identifier_col(col_name):
+    return _has_keyword(col_name, IDENTIFIER_KEYWORDS) or _has_id_word(col_name)
+
+
+def _exact_matches(columns, candidates):
+    # Columns equal (case-insensitively) to a candidate, in candidate order
+    ordered = []
+    for cand in candidates:
+        for col in columns:
+            if cand.lower() == col.lower() and col not in ordered:
+                ordered.append(col)
+    return ordered
+
+
+class SchemaPlan:
+    """Roles of every column of one CSV header.
+
+    Each attribute is a tuple of column names in header order, except
+    `attendance`, `study_hours` and `target`, which are in lookup priority
+    order (the first one with a value wins), and `key`, the student id
+    column or None.
+    """
+
+    def __init__(self, columns, overrides=None):
+        self.columns = tuple(columns)
+        overrides = overrides or {}
+        assigned = {}
+        for role in ROLES:
+            if role == 'target':
+                continue
+            for col in overrides.get(role, ()):
+                assigned[col] = role
+        inferred = [col for col in self.columns if col not in assigned]
+
+        def pick(role, test):
+            return tuple(col for col in self.columns
+                         if assigned.get(col) == role or (col in inferred and test(col)))
+
+        self.identifier = pick('identifier', is_identifier_col)
+        # column that tells students apart across uploads (Student_Id), if any
+        self.key = next((col for col in self.identifier
+                         if _has_id_word(col) or 'studentid' in col.lower()), None)
+        self.email = tuple(col for col in self.columns if 'email' in col.lower())
+        self.academic = pick('subject', lambda col: _has_keyword(col, ACADEMIC_KEYWORDS))
+        self.subject = pick('subject', lambda col: _has_keyword(col, SUBJECT_KEYWORDS))
+        self.grade = pick('subject', lambda col: _has_keyword(col, GRADE_KEYWORDS))
+        self.non_academic = tuple(col for col in self.columns
+                                  if assigned.get(col) in ('attendance', 'study_hours')
+                                  or (col in inferred and _has_keyword(col, NON_ACADEMIC_KEYWORDS)))
+        self.non_target = tuple(col for col in self.columns
+                                if assigned.get(col) in ('attendance', 'study_hours')
+                                or (col in inferred and _has_keyword(col, NON_TARGET_KEYWORDS)))
+        self.categorical = pick('categorical', lambda col: False)
+
+        def listed(role):
+            return tuple(col for col in overrides.get(role, ()) if col in self.columns)
+
+        self.attendance = listed('attendance') + tuple(_exact_matches(inferred, ATTENDANCE_KEYS))
+        self.study_hours = listed('study_hours') + tuple(_exact_matches(inferred, STUDY_KEYS))
+        target = listed('target')
+        self.target = target + tuple(col for col in self.columns
+                                     if col not in target and col in inferred
+                                     and _has_keyword(col, TARGET_KEYWORDS))
+
+    def analysis_columns(self):
+        identifier = set(self.identifier)
+        return [col for col in self.columns if col not in identifier]
+
+    def read_dtypes(self):
+        # dtype= argument for pd.read_csv: categorical columns stay text
+        return {col: str for col in self.categorical} or None
+
+
+def load_overrides(path):
+    """Parse and check a schema override file; returns a dict of role -> columns."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: schema must be a JSON object of role -> column names")
+    unknown = set(data) - set(ROLES)
+    if unknown:
+        raise ValueError(f"{path}: unknown schema role(s): {', '.join(sorted(unknown))}")
+    overrides = {}
+    for role, columns in data.items():
+        if isinstance(columns, str):
+            columns = [columns]
+        if not isinstance(columns, list) or not all(isinstance(c, str) for c in columns):
+            raise ValueError(f"{path}: '{role}' must be a column name or a list of column names")
+        overrides[role] = columns
+    return overrides
+
+
+@lru_cache(maxsize=32)
+def _cached_overrides(path, mtime_ns):
+    overrides = load_overrides(path)
+    return json.dumps(overrides, sort_keys=True)
+
+
+def overrides_key(schema_path):
+    # Canonical JSON of the override file ('' for none); re-read when the file changes
+    if not schema_path:
+        return ''
+    return _cached_overrides(os.path.abspath(schema_path), os.stat(schema_path).st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _cached_plan(columns, key):
+    return SchemaPlan(columns, json.loads(key) if key else None)
+
+
+def plan_for(columns, schema_path=None):
+    """SchemaPlan for a header, shared by every file with the same columns."""
+    return _cached_plan(tuple(columns), overrides_key(schema_path))
@@ -0,0 +1,438 @@
+# Streaming (chunked) analysis for CSVs too large to hold in memory.
+#
+#   python enhanced_csv_reader.py --chunksize 50000 <data.csv>
+#
+# The file is read twice, one chunk at a time:
+#   pass 1  numeric summary stats (Welford mean/std, min/max, quantile sketch
+#           for the median), dtype tracking and a bounded uniform sample of
+#           rows used to fit the RandomForest;
+#   pass 2  email validation, per-student analysis, ML predictions, value
+#           counts for categorical and grade columns (bin counts with a
+#           GradeBins, whose edges come from the pass-1 min/max). Records
+#           are written to the output as soon as their chunk is done.
+# Per-student records that belong later in the document are spooled to
+# temporary files, so memory depends on the chunk and sample sizes and not on
+# the size of the CSV.
+#
+# Differences from the in-memory path: mean/std are accumulated online and may
+# differ in the last few bits; the median and the 30th-percentile risk
+# threshold come from QuantileSketch (exact while a column has at most `k`
+# values, see QuantileSketch for the bound otherwise); the model is fitted on
+# at most `sample_size` rows.
+#
+# Parquet and Arrow files are read batch by batch the same way (see
+# columnar_input); pass 1 reads only the analysis columns.
+import json
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import columnar_input
+import diagnostics
+import enhanced_csv_reader as reader
+from schema_plan import plan_for
+from student_analysis import analyze_students
+
+DEFAULT_CHUNKSIZE = 50_000
+DEFAULT_SAMPLE_SIZE = 50_000
+
+
+class RunningStats:
+    """Count, mean, M2, min and max, merged one chunk at a time (Chan et al.)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        values = values[~np.isnan(values)]
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * n_a * n_b / n
+        self.count = n
+        lo, hi = float(values.min()), float(values.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    @property
+    def std(self):
+        # population std (ddof=0), as in summarize_columns()
+        return float(np.sqrt(self.m2 / self.count)) if self.count > 1 else 0.0
+
+
+class QuantileSketch:
+    """Bounded-memory quantile sketch (multi-level compactor, as in KLL/MRL).
+
+    Level h holds items of weight 2**h. When a level holds more than `k`
+    items it is sorted and every other item (alternating start offset) is
+    promoted to level h + 1, halving it. While nothing has been compacted the
+    sketch holds every value and answers exactly.
+
+    Error bound: a compaction at level h moves any rank by at most 2**h and
+    level h is compacted at most n / (k * 2**h) + 1 times, so for n values
+    every rank is within (log2(n / k) + 2) * n / k of the truth. With the
+    default k = 4096 that is under 0.4% of n for a 10M-row column (about
+    one percentile point), using at most ~k * log2(n / k) floats.
+    """
+
+    def __init__(self, k=4096):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._offsets = [0]
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self.k:
+                self._compact(h)
+            h += 1
+
+    def _compact(self, h):
+        if h + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+            self._offsets.append(0)
+        while len(self.levels[h]) > self.k:
+            items = np.sort(self.levels[h])
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            pairs = items[:len(items) - len(keep)]
+            offset = self._offsets[h]
+            self._offsets[h] ^= 1
+            self.levels[h] = keep
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], pairs[offset::2]])
+
+    def quantile(self, q, extra_value=None, extra_weight=0):
+        # q in [0, 1]; extra_value/extra_weight add one weighted point (used
+        # for missing targets filled with the column mean)
+        if self.exact:
+            values = self.levels[0]
+            if extra_weight:
+                values = np.concatenate([values, np.full(extra_weight, extra_value)])
+            return float(np.quantile(values, q)) if len(values) else None
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.int64)
+                                  for h, level in enumerate(self.levels)])
+        if extra_weight:
+            values = np.append(values, extra_value)
+            weights = np.append(weights, extra_weight)
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        rank = q * (cumulative[-1] - 1)
+        return float(values[np.searchsorted(cumulative, rank, side='right')])
+
+    def median(self):
+        if self.exact:
+            return float(np.median(self.levels[0])) if len(self.levels[0]) else None
+        return self.quantile(0.5)
+
+
+class _Spool:
+    # Comma-separated JSON values written to a temp file, copied out later
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, texts):
+        for text in texts:
+            if self.count:
+                self.file.write(', ')
+            self.file.write(text)
+            self.count += 1
+
+    def copy_to(self, out):
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, out)
+        self.file.close()
+
+
+def _write_object(out, obj):
+    # json.dumps(obj) for a dict whose values may be _Spool lists
+    out.write('{')
+    for i, (key, value) in enumerate(obj.items()):
+        if i:
+            out.write(', ')
+        out.write(json.dumps(key) + ': ')
+        if isinstance(value, _Spool):
+            out.write('[')
+            value.copy_to(out)
+            out.write(']')
+        elif isinstance(value, dict) and any(isinstance(v, _Spool) for v in value.values()):
+            _write_object(out, value)
+        else:
+            out.write(json.dumps(value))
+    out.write('}')
+
+
+def _merge_counts(counts, series):
+    for key, value in series.value_counts().items():
+        counts[key] = counts.get(key, 0) + int(value)
+
+
+def _sorted_counts(counts, key=lambda k: k):
+    # value_counts() order: most frequent first
+    return {key(k): v for k, v in sorted(counts.items(), key=lambda item: -item[1])}
+
+
+def _sample_rows(sample, sample_keys, chunk, rng, sample_size):
+    # Bottom-k sampling: every row gets a uniform random key and the rows
+    # with the smallest keys form a uniform sample of the whole file
+    keys = rng.random(len(chunk))
+    if sample is not None:
+        chunk = pd.concat([sample, chunk], ignore_index=True)
+        keys = np.concatenate([sample_keys, keys])
+    if len(chunk) > sample_size:
+        keep = np.argpartition(keys, sample_size)[:sample_size]
+        chunk = chunk.iloc[keep].reset_index(drop=True)
+        keys = keys[keep]
+    return chunk, keys
+
+
+def _scan(file_path, chunksize, sample_size, columns, identifier_set, plan):
+    # Pass 1: column dtypes, numeric accumulators and the training sample.
+    # Only the analysis columns are read.
+    read_columns = [col for col in columns if col not in identifier_set] or None
+    numeric = {col: True for col in columns}     # True while every chunk had a numeric dtype
+    ml_numeric = dict(numeric)                   # same, for np.number (excludes bool, like select_dtypes)
+    floating = set()
+    running = {}
+    sketches = {}
+    sample = sample_keys = None
+    rng = np.random.default_rng(42)
+    total = 0
+
+    for chunk in columnar_input.iter_chunks(file_path, chunksize, plan.read_dtypes(), read_columns):
+        total += len(chunk)
+        for col in chunk.columns:
+            if col in identifier_set:
+                continue
+            dtype = chunk[col].dtype
+            numeric[col] = numeric[col] and pd.api.types.is_numeric_dtype(dtype)
+            ml_numeric[col] = ml_numeric[col] and np.issubdtype(dtype, np.number)
+            if not numeric[col]:
+                continue
+            if pd.api.types.is_float_dtype(dtype):
+                floating.add(col)
+            values = chunk[col].to_numpy(dtype=float, na_value=np.nan)
+            running.setdefault(col, RunningStats()).update(values)
+            sketches.setdefault(col, QuantileSketch()).update(values)
+
+        ml_cols = [col for col in columns if col not in identifier_set and ml_numeric[col]]
+        sample, sample_keys = _sample_rows(sample, sample_keys, chunk[ml_cols], rng, sample_size)
+
+    return {
+        'columns': columns,
+        'total': total,
+        'numeric': numeric,
+        'ml_numeric': ml_numeric,
+        'floating': floating,
+        'running': running,
+        'sketches': sketches,
+        'sample': sample,
+    }
+
+
+def _fit_model(scan, analysis_columns, plan, model_cache=None, ml_budget=None):
+    # Same column choice and model as add_ml_predictions(), fitted on the
+    # pass-1 sample (within ml_budget seconds, if given). Returns
+    # (ml_predictions, model_state or None).
+    numeric_cols = [col for col in analysis_columns if scan['ml_numeric'][col]]
+    if len(numeric_cols) < 2:
+        return {'note': 'Not enough numeric columns for ML'}, None
+
+    target_col, feature_cols = reader.choose_ml_columns(numeric_cols, plan)
+    if not target_col or not feature_cols or scan['total'] <= 1:
+        return {}, None
+
+    means = {col: scan['running'][col].mean if scan['running'][col].count else np.nan
+             for col in numeric_cols}
+    sample = scan['sample']
+    X = sample[feature_cols].fillna({col: means[col] for col in feature_cols})
+    y = sample[target_col].fillna(means[target_col])
+    entry = reader.load_or_fit_model(X, y, target_col, feature_cols, model_cache, ml_budget)
+
+    # The cached threshold only covers the sample; use the whole-file sketch
+    target_stats = scan['running'][target_col]
+    threshold = scan['sketches'][target_col].quantile(
+        0.3, extra_value=means[target_col], extra_weight=scan['total'] - target_stats.count)
+
+    ml_predictions = reader.ml_summary(target_col, feature_cols, entry)
+    return ml_predictions, {
+        'model': entry['model'],
+        'feature_cols': feature_cols,
+        'fill': {col: means[col] for col in feature_cols},
+        'threshold': threshold,
+    }
+
+
+def analyze_csv_streaming(file_path, out=None, chunksize=DEFAULT_CHUNKSIZE, sample_size=DEFAULT_SAMPLE_SIZE,
+                          model_cache=None, writer=None, schema_path=None, grade_bins=None, ml_budget=None):
+    """Analyze `file_path` chunk by chunk and write the result JSON to `out`.
+
+    With an ndjson_output.NDJSONWriter as `writer`, records go to the writer
+    instead and nothing is spooled.
+    """
+    out = out or sys.stdout
+
+    header = columnar_input.header(file_path)
+    plan = plan_for(header, schema_path)
+    identifier_columns = list(plan.identifier)
+    print(f"Identifier columns excluded from analysis: {identifier_columns}", file=sys.stderr)
+    identifier_set = set(identifier_columns)
+
+    with diagnostics.stage('scan'):
+        scan = _scan(file_path, chunksize, sample_size, header, identifier_set, plan)
+    analysis_columns = [col for col in scan['columns'] if col not in identifier_set]
+
+    try:
+        with diagnostics.stage('ml_fit'):
+            ml_predictions, model_state = _fit_model(scan, analysis_columns, plan, model_cache, ml_budget)
+    except Exception as e:
+        ml_predictions, model_state = {'error': str(e)}, None
+        print(f"ML Error: {str(e)}", file=sys.stderr)
+
+    # Pass 2 reads with the dtypes a whole-file read would have inferred
+    dtype = {}
+    for col in analysis_columns:
+        if not scan['numeric'][col]:
+            dtype[col] = object
+        elif col in scan['floating']:
+            dtype[col] = 'float64'
+
+    grade_set = set(plan.grade)
+    grade_cols = [col for col in analysis_columns if scan['numeric'][col] and col in grade_set]
+    category_cols = [col for col in analysis_columns if not scan['numeric'][col]]
+    if grade_bins is None:
+        grade_counts = {col: {} for col in grade_cols}
+    else:
+        grade_edges = {col: grade_bins.edges_for(scan['running'][col].min, scan['running'][col].max)
+                       for col in grade_cols}
+        grade_counts = {col: np.zeros(len(grade_edges[col]) + 1, dtype=np.int64) for col in grade_cols}
+    category_counts = {col: {} for col in category_cols}
+
+    predictions = _Spool() if model_state and writer is None else None
+    at_risk = _Spool() if model_state else None
+    students = _Spool() if writer is None else None
+    needing_attention = 0
+    high_performers = 0
+    offset = 0
+
+    if writer is None:
+        out.write('{"data": [')
+    else:
+        writer.header(scan['columns'], identifier_columns)
+    first_chunk = True
+    # duplicates would need every id in memory, so they are only counted
+    # by the in-memory modes
+    quality = {'rows_received': scan['total'], 'duplicate_rows': 0, 'trimmed_identifiers': 0, 'invalid_emails': 0}
+    with diagnostics.stage('analysis'):
+        for chunk in columnar_input.iter_chunks(file_path, chunksize, dtype):
+            chunk, emails, chunk_quality = reader.clean_frame(chunk, plan, dedupe=False)
+            quality['trimmed_identifiers'] += chunk_quality['trimmed_identifiers']
+            quality['invalid_emails'] += chunk_quality['invalid_emails']
+            processed = reader.process_records(chunk, plan, emails)
+            if writer is None:
+                if processed:
+                    if not first_chunk:
+                        out.write(', ')
+                    out.write(', '.join(json.dumps(row) for row in processed))
+                    first_chunk = False
+                del processed
+
+            analysis_chunk = chunk.drop(columns=identifier_columns, errors='ignore')
+            for col in grade_cols:
+                if grade_bins is None:
+                    _merge_counts(grade_counts[col], analysis_chunk[col])
+                else:
+                    grade_counts[col] += grade_bins.count(
+                        grade_edges[col], analysis_chunk[col].to_numpy(dtype=float, na_value=np.nan))
+            for col in category_cols:
+                _merge_counts(category_counts[col], analysis_chunk[col])
+
+            individual = analyze_students(chunk, analysis_chunk, identifier_columns, plan)
+            if model_state:
+                X = analysis_chunk[model_state['feature_cols']].fillna(model_state['fill'])
+                chunk_predictions = model_state['model'].predict(X)
+                flagged = reader.apply_ml_predictions(individual, chunk_predictions, model_state['threshold'], offset)
+                if predictions is not None:
+                    predictions.extend(json.dumps(float(p)) for p in chunk_predictions)
+                at_risk.extend(str(i) for i in flagged)
+
+            needing_attention += sum(1 for s in individual if s['at_risk'])
+            high_performers += sum(1 for s in individual if s.get('overall_performance', 0) >= 85)
+            if writer is None:
+                students.extend(json.dumps(s) for s in individual)
+            else:
+                for row, student in zip(processed, individual):
+                    writer.student(row, student)
+                writer.flush()
+            offset += len(chunk)
+
+    stats = reader.new_stats(scan['total'], scan['columns'], identifier_columns, analysis_columns)
+    stats['data_quality'] = quality
+    for col in analysis_columns:
+        if scan['numeric'][col]:
+            running = scan['running'].get(col)
+            if running and running.count:
+                stats['summary_stats'][col] = {
+                    'mean': float(running.mean),
+                    'median': scan['sketches'][col].median(),
+                    'std': running.std,
+                    'min': running.min,
+                    'max': running.max
+                }
+            else:
+                stats['summary_stats'][col] = {'mean': None, 'median': None, 'std': None, 'min': None, 'max': None}
+            if col in grade_counts and grade_bins is not None:
+                stats['grade_distribution'][col] = grade_bins.distribution(grade_edges[col], grade_counts[col])
+            elif col in grade_counts:
+                stats['grade_distribution'][col] = _sorted_counts(grade_counts[col], key=str)
+        else:
+            stats['summary_stats'][col] = _sorted_counts(category_counts[col])
+
+    stats['ml_predictions'] = ml_predictions
+    if model_state:
+        if predictions is not None:
+            ml_predictions['predictions'] = predictions
+        stats['risk_analysis'] = reader.risk_summary(model_state['threshold'], at_risk, scan['total'])
+    if stats['summary_stats']:
+        stats['performance_insights'] = reader.performance_insights(
+            stats['summary_stats'], needing_attention, high_performers)
+
+    diagnostics.add_block(stats)
+    if writer is not None:
+        # at_risk_students is left out of the summary, only the count is kept
+        writer.summary(stats)
+        return
+    stats['individual_student_analysis'] = students
+    out.write('], "analysis": ')
+    _write_object(out, stats)
+    out.write('}\n')
+    out.flush()
@@ -0,0 +1,343 @@
+import gc
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from schema_plan import plan_for
+
+# Fixed feedback messages, indexed by the codes computed in analyze_students
+ACADEMIC_WEAKNESSES = {
+    1: "Very poor or missing academic marks",
+    2: "Very poor marks — immediate intervention needed",
+    3: "Below-average academic performance",
+}
+ATTENDANCE_WEAKNESSES = {1: "Poor attendance record", 2: "Inconsistent attendance"}
+STUDY_WEAKNESSES = {1: "Insufficient study hours", 2: "Limited study time"}
+LOW_PERFORMANCE_RECOMMENDATIONS = [
+    "Consider additional tutoring or study groups",
+    "Schedule a meeting with subject teachers"
+]
+STUDY_RECOMMENDATIONS = [
+    "Establish a consistent study schedule",
+    "Create a dedicated study environment"
+]
+
+# Scoring policy of iter_students(): performance weights, the cutoffs behind
+# the academic / attendance / study codes (very poor, below average,
+# excellent; poor, inconsistent, outstanding; insufficient, limited,
+# excellent), the risk points of the codes that add risk, and the risk
+# score at which a student is high / medium risk. See rescoring.py.
+SCORING = {
+    'weights': {'academic': 0.7, 'attendance': 0.2, 'study_hours': 0.1},
+    'academic_cutoffs': [40, 60, 85],
+    'attendance_cutoffs': [70, 85, 95],
+    'study_cutoffs': [3, 5, 7],
+    'academic_points': [60, 50, 30],
+    'attendance_points': [20, 10],
+    'study_points': [20, 10],
+    'risk_levels': {'high': 60, 'medium': 30},
+}
+
+_MISSING = object()
+
+
+def find_metric_key(perf_metrics, candidates):
+    # case-insensitive search for a metric key among perf_metrics
+    for cand in candidates:
+        for k in perf_metrics.keys():
+            if cand.lower() == k.lower():
+                return k
+    return None
+
+
+def _row_dtype(df):
+    # dtype iterrows() upcasts each row to, with narrowed columns (lean mode,
+    # see enhanced_csv_reader.lean_frame) counted at their full width, so the
+    # values handed out do not depend on how the frame was loaded
+    widened = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            widened[col] = object
+        elif dtype.kind == 'i' and dtype.itemsize < 8:
+            widened[col] = np.int64
+        elif dtype.kind == 'f' and dtype.itemsize < 8:
+            widened[col] = np.float64
+    frame = df.iloc[:0]
+    return (frame.astype(widened) if widened else frame).values.dtype
+
+
+def _row_values(series, row_dtype):
+    # Values as iterrows() would hand them out: iterrows upcasts each row to
+    # the frame's common dtype, so an all-numeric frame yields floats.
+    if row_dtype != object and series.dtype != row_dtype:
+        series = series.astype(row_dtype)
+    return series.tolist()
+
+
+def _running_mean(columns, n):
+    # Left-to-right sum over columns, skipping NaN, so the result matches a
+    # Python sum() over the per-row list of values bit for bit.
+    total = np.zeros(n)
+    count = np.zeros(n, dtype=np.int64)
+    for values in columns:
+        present = ~np.isnan(values)
+        total = np.where(present, total + values, total)
+        count += present
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+    return mean, count
+
+
+def _to_float_or(value, default):
+    try:
+        return float(value)
+    except Exception:
+        return default
+
+
+def _resolve_metric(analysis_df, numeric, ordered, default, n):
+    # Vectorized find_metric_key(): for every row take the first column (in
+    # the plan's priority order) that has a value for that row.
+    result = np.full(n, default, dtype=float)
+    found = np.zeros(n, dtype=bool)
+    for col in ordered:
+        if col not in analysis_df.columns:
+            continue
+        series = analysis_df[col]
+        take = series.notna().to_numpy() & ~found
+        if not take.any():
+            continue
+        if col in numeric:
+            values = numeric[col]
+        else:
+            values = np.array([_to_float_or(v, default) for v in series.tolist()], dtype=float)
+        result[take] = values[take]
+        found |= take
+    return result
+
+
+def _numeric_columns(analysis_df):
+    numeric_cols = [col for col in analysis_df.columns if pd.api.types.is_numeric_dtype(analysis_df[col])]
+    return {col: analysis_df[col].to_numpy(dtype=float, na_value=np.nan) for col in numeric_cols}
+
+
+def score_inputs(analysis_df, plan, numeric=None):
+    # Per-row (academic score, attendance, study hours) arrays: the inputs of
+    # score_students(), which do not depend on the policy
+    numeric = _numeric_columns(analysis_df) if numeric is None else numeric
+    n = len(analysis_df)
+
+    # --- academic score: subject-like columns, else any non attendance/study column ---
+    academic_set = set(plan.academic)
+    non_academic_set = set(plan.non_academic)
+    academic_cols = [col for col in numeric if col in academic_set]
+    fallback_cols = [col for col in numeric if col not in non_academic_set]
+    academic_mean, academic_count = _running_mean([numeric[c] for c in academic_cols], n)
+    fallback_mean, fallback_count = _running_mean([numeric[c] for c in fallback_cols], n)
+    academic_score = np.where(academic_count > 0, academic_mean,
+                              np.where(fallback_count > 0, fallback_mean, 0.0))
+
+    # --- attendance & study hours ---
+    attendance = _resolve_metric(analysis_df, numeric, plan.attendance, 100.0, n)
+    study_hours = _resolve_metric(analysis_df, numeric, plan.study_hours, 5.0, n)
+    attendance = np.minimum(np.maximum(attendance, 0.0), 100.0)
+    return academic_score, attendance, study_hours
+
+
+def score_students(academic_score, attendance, study_hours, policy=None):
+    """Unrounded performance, the academic / attendance / study codes
+    (0 = no message), risk score and risk level of every row under a
+    scoring policy (SCORING when omitted), as a dict of arrays."""
+    policy = policy or SCORING
+    weights = policy['weights']
+    study_hours_score = np.minimum(np.maximum(study_hours * 10.0, 0.0), 100.0)
+    performance = ((weights['academic'] * academic_score) + (weights['attendance'] * attendance)
+                   + (weights['study_hours'] * study_hours_score))
+
+    very_poor, below_average, excellent = policy['academic_cutoffs']
+    academic_code = np.select(
+        [academic_score <= 0, academic_score < very_poor, academic_score < below_average,
+         academic_score >= excellent],
+        [1, 2, 3, 4], 0)
+    poor, inconsistent, outstanding = policy['attendance_cutoffs']
+    attendance_code = np.select([attendance < poor, attendance < inconsistent, attendance >= outstanding],
+                                [1, 2, 3], 0)
+    insufficient, limited, disciplined = policy['study_cutoffs']
+    study_code = np.select([study_hours < insufficient, study_hours < limited, study_hours >= disciplined],
+                           [1, 2, 3], 0)
+
+    risk_score = (np.select([academic_code == 1, academic_code == 2, academic_code == 3],
+                            policy['academic_points'], 0)
+                  + np.select([attendance_code == 1, attendance_code == 2], policy['attendance_points'], 0)
+                  + np.select([study_code == 1, study_code == 2], policy['study_points'], 0))
+    levels = policy['risk_levels']
+    risk_level = np.select([risk_score >= levels['high'], risk_score >= levels['medium']], ['high', 'medium'],
+                           'low')
+    return {
+        'performance': performance,
+        'academic_code': academic_code,
+        'attendance_code': attendance_code,
+        'study_code': study_code,
+        'risk_score': risk_score,
+        'risk_level': risk_level,
+    }
+
+
+def iter_students(df, analysis_df, identifier_columns, plan=None):
+    """Per-student analysis computed column-wise, yielded one dict per row.
+
+    Yields exactly the same dicts as the original iterrows() loop (kept in
+    benchmarks/student_analysis_rowwise.py), but every score, threshold and
+    best/worst lookup is a whole-column NumPy operation; only the final dict
+    assembly walks the rows. Column roles come from `plan` (a SchemaPlan,
+    inferred from df's header when omitted).
+    """
+    plan = plan or plan_for(df.columns)
+    n = len(df)
+    row_dtype = _row_dtype(df)
+
+    numeric = _numeric_columns(analysis_df)
+    numeric_cols = list(numeric)
+    academic_score, attendance, study_hours = score_inputs(analysis_df, plan, numeric)
+    scored = score_students(academic_score, attendance, study_hours)
+
+    # Python's round() is correctly rounded; np.round is not, so keep round()
+    overall_performance = [round(x, 2) for x in scored['performance'].tolist()]
+    overall_array = np.array(overall_performance, dtype=float)
+
+    # --- risk codes (0 = no message) ---
+    academic_code = scored['academic_code']
+    attendance_code = scored['attendance_code']
+    study_code = scored['study_code']
+    risk_score = scored['risk_score']
+    risk_level = scored['risk_level']
+
+    low_performance = overall_array < 75
+    poor_attendance = attendance < 90
+    short_study = study_hours < 5
+
+    # --- best / worst subject (first occurrence wins, like max()/min()) ---
+    subject_set = set(plan.subject)
+    subject_cols = [col for col in numeric_cols if col in subject_set]
+    if subject_cols:
+        matrix = np.column_stack([numeric[c] for c in subject_cols])
+        present = ~np.isnan(matrix)
+        has_subject = present.any(axis=1)
+        best_score = np.where(present, matrix, -np.inf).max(axis=1)
+        worst_score = np.where(present, matrix, np.inf).min(axis=1)
+        best_idx = np.argmax(present & (matrix == best_score[:, None]), axis=1)
+        worst_idx = np.argmax(present & (matrix == worst_score[:, None]), axis=1)
+    else:
+        has_subject = np.zeros(n, dtype=bool)
+        best_score = worst_score = np.zeros(n)
+        best_idx = worst_idx = np.zeros(n, dtype=np.int64)
+
+    # --- columns needed to rebuild the per-row dicts ---
+    identifier_values = [(col, _row_values(df[col], row_dtype), df[col].isna().tolist())
+                         for col in identifier_columns if col in df.columns]
+    metric_values = []
+    row_has_missing = np.zeros(n, dtype=bool)
+    for col in analysis_df.columns:
+        series = analysis_df[col]
+        values = numeric[col].tolist() if col in numeric else _row_values(series, row_dtype)
+        missing = series.isna().to_numpy()
+        if missing.any():
+            values = [_MISSING if m else v for v, m in zip(values, missing.tolist())]
+            row_has_missing |= missing
+        metric_values.append((col, values))
+    metric_names = [col for col, _ in metric_values]
+    metric_columns = [values for _, values in metric_values]
+    metric_rows = zip(*metric_columns) if metric_columns else itertools.repeat(())
+
+    index_values = df.index.tolist()
+    row_has_missing = row_has_missing.tolist()
+    academic_code = academic_code.tolist()
+    attendance_code = attendance_code.tolist()
+    study_code = study_code.tolist()
+    risk_score = risk_score.tolist()
+    risk_level = risk_level.tolist()
+    low_performance = low_performance.tolist()
+    poor_attendance = poor_attendance.tolist()
+    short_study = short_study.tolist()
+    has_subject = has_subject.tolist()
+    best_idx = best_idx.tolist()
+    worst_idx = worst_idx.tolist()
+    best_score = best_score.tolist()
+    worst_score = worst_score.tolist()
+
+    for i in range(n):
+        identifier = {}
+        for col, values, missing in identifier_values:
+            if not missing[i]:
+                identifier[col] = str(values[i])
+
+        row = next(metric_rows)
+        if row_has_missing[i]:
+            performance_metrics = {col: v for col, v in zip(metric_names, row) if v is not _MISSING}
+        else:
+            performance_metrics = dict(zip(metric_names, row))
+
+        strengths = []
+        weaknesses = []
+        recommendations = []
+        if academic_code[i] == 4:
+            strengths.append("Excellent academic performance")
+        elif academic_code[i]:
+            weaknesses.append(ACADEMIC_WEAKNESSES[academic_code[i]])
+        if attendance_code[i] == 3:
+            strengths.append("Outstanding attendance")
+        elif attendance_code[i]:
+            weaknesses.append(ATTENDANCE_WEAKNESSES[attendance_code[i]])
+        if study_code[i] == 3:
+            strengths.append("Excellent study discipline")
+        elif study_code[i]:
+            weaknesses.append(STUDY_WEAKNESSES[study_code[i]])
+
+        student_analysis = {
+            'index': int(index_values[i]),
+            'identifier': identifier,
+            'performance_metrics': performance_metrics,
+            'risk_factors': {},
+            'strengths': strengths,
+            'weaknesses': weaknesses,
+            'recommendations': recommendations,
+            'overall_performance': overall_performance[i],
+            'risk_level': risk_level[i],
+            'at_risk': risk_level[i] != 'low',
+            'risk_score': int(risk_score[i])
+        }
+
+        if has_subject[i]:
+            best_subject = subject_cols[best_idx[i]]
+            worst_subject = subject_cols[worst_idx[i]]
+            student_analysis['best_subject'] = {'subject': best_subject, 'score': best_score[i]}
+            student_analysis['worst_subject'] = {'subject': worst_subject, 'score': worst_score[i]}
+            if best_score[i] >= 85:
+                strengths.append(f"Excellent performance in {best_subject}")
+            if worst_score[i] < 70:
+                weaknesses.append(f"Needs improvement in {worst_subject}")
+                recommendations.append(f"Focus on improving {worst_subject} through extra practice")
+
+        if low_performance[i]:
+            recommendations.extend(LOW_PERFORMANCE_RECOMMENDATIONS)
+        if poor_attendance[i]:
+            recommendations.append("Improve class attendance")
+        if short_study[i]:
+            recommendations.extend(STUDY_RECOMMENDATIONS)
+
+        yield student_analysis
+
+
+def analyze_students(df, analysis_df, identifier_columns, plan=None):
+    # List form of iter_students(). Millions of small dicts and lists would
+    # otherwise keep triggering the cyclic GC, although nothing built here can
+    # form a cycle, so it is paused while the list is built.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return list(iter_students(df, analysis_df, identifier_columns, plan))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
@@ -0,0 +1,320 @@
+# Indexed columnar store of per-student results.
+#
+#   python enhanced_csv_reader.py --student-store results/roster <data.csv>
+#   python student_store.py results/roster --student S00042
+#   python student_store.py results/roster --at-risk --level high --limit 50
+#   python student_store.py results/roster --db-at-risk
+#   python student_store.py results/roster --dashboard
+#
+# Lookups by student id, the at-risk lists and the dashboard figures otherwise
+# need the whole result JSON parsed. The store is a directory of .npy files,
+# one per column, that StudentStore opens with np.load(mmap_mode='r'): a
+# lookup binary-searches the sorted id index and touches a few pages of each
+# column, so it does not depend on the number of students.
+#
+# The analyzer and the database disagree about risk: saveStudentsToDatabase()
+# replaces the analyzer's risk level with its own (high below a weighted
+# performance of 70, at_risk only when high). The store keeps both. --at-risk
+# is the analyzer's list, highest risk score first. --db-at-risk and
+# --dashboard are what getAtRiskStudents() and getDashboardStats() would
+# return after this result was saved into an empty collection. They use
+# mongo_sink.saved_fields(), the mapping the database sink writes with: one
+# document per student id, the last row winning, and no documents for rows
+# the Student model rejects.
+#
+#   meta.json                 row count, key column, column -> file names,
+#                             dashboard figures (computed when written)
+#   ids.npy, id_rows.npy      student ids (UTF-8, sorted) and their rows
+#   row_ids.npy               position in ids.npy of each row's id, -1 = none
+#   overall_performance.npy   float64, NaN when missing; likewise ml_prediction
+#   risk_score.npy            int32
+#   risk_level.npy            uint8 index into meta["risk_levels"], 255 = none
+#   at_risk.npy               bool; likewise ml_at_risk
+#   db_risk_level.npy         uint8, the risk level the database stores, 255 = rejected row
+#   db_rows.npy               int64, the row stored for each student id (its last row), in the
+#                             order the ids first appear, which is the documents' insertion order
+#   s<i>.npy                  the numeric analysis columns (scores), float64
+#   t<i>.offsets/.data.npy    other identifier columns (Name, Email) as UTF-8
+#
+# A store is written to a temporary directory and renamed into place, so
+# readers never see a half-written one. Rows without a student id are stored
+# but cannot be looked up.
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from mongo_sink import saved_fields
+from schema_plan import plan_for
+
+STORE_VERSION = 2
+RISK_LEVELS = ['low', 'medium', 'high']
+NO_LEVEL = 255
+# performanceDistribution bands of the dashboard (studentController.getDashboardStats)
+PERFORMANCE_BANDS = [('excellent', 90), ('good', 80), ('average', 70)]
+
+
+def _text_arrays(values):
+    # (offsets, data) of a list of str/None; None is stored as ''
+    encoded = [v.encode('utf-8') if isinstance(v, str) else b'' for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _id_text(value):
+    # Index key of a student id as it appears in the result "data"
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return str(value)
+
+
+def dashboard_stats(db_risk_level, db_performance, db_rows):
+    # studentController.getDashboardStats() over the saved documents (see
+    # the top of the file); lastUpdated is left out
+    risk_level = db_risk_level[db_rows]
+    performance = db_performance[db_rows]
+    total = len(risk_level)
+    # saveStudentsToDatabase() sets at_risk for high risk only
+    at_risk_count = int((risk_level == RISK_LEVELS.index('high')).sum())
+    distribution = {}
+    remaining = np.ones(total, dtype=bool)
+    for band, low in PERFORMANCE_BANDS:
+        in_band = remaining & (performance >= low)
+        distribution[band] = int(in_band.sum())
+        remaining &= ~in_band
+    distribution['poor'] = int(remaining.sum())
+    return {
+        'totalStudents': total,
+        'atRiskStudents': at_risk_count,
+        'highRiskStudents': int((risk_level == RISK_LEVELS.index('high')).sum()),
+        'mediumRiskStudents': int((risk_level == RISK_LEVELS.index('medium')).sum()),
+        'atRiskPercentage': at_risk_count / total * 100 if total else 0,
+        'performanceDistribution': distribution,
+    }
+
+
+def write_store(path, result, schema_path=None):
+    """Write the per-student part of an analyze_csv() result to the store
+    directory `path`, replacing any store there."""
+    analysis = result['analysis']
+    plan = plan_for(analysis['columns'], schema_path)
+    individual = analysis['individual_student_analysis']
+    records = pd.DataFrame.from_records(result['data'], columns=analysis['columns'])
+    n = len(individual)
+
+    arrays = {}
+    meta = {'version': STORE_VERSION, 'rows': n, 'key': plan.key, 'risk_levels': RISK_LEVELS,
+            'scores': {}, 'text': {}}
+
+    def column(field, dtype, default):
+        return np.array([default if s.get(field) is None else s[field] for s in individual], dtype=dtype)
+
+    arrays['overall_performance'] = column('overall_performance', np.float64, np.nan)
+    arrays['ml_prediction'] = column('ml_prediction', np.float64, np.nan)
+    arrays['risk_score'] = column('risk_score', np.int32, 0)
+    arrays['at_risk'] = column('at_risk', bool, False)
+    arrays['ml_at_risk'] = column('ml_at_risk', bool, False)
+    codes = {level: i for i, level in enumerate(RISK_LEVELS)}
+    arrays['risk_level'] = np.array([codes.get(s.get('risk_level'), NO_LEVEL) for s in individual], dtype=np.uint8)
+
+    # what the database sink would store for each row
+    db_risk_level = np.full(n, NO_LEVEL, dtype=np.uint8)
+    db_performance = np.full(n, np.nan)
+    # student id -> its last row, kept in the order the ids first appear
+    last_row = {}
+    for i, record in enumerate(result['data']):
+        try:
+            saved = saved_fields(record, i)
+        except ValueError:
+            continue
+        db_risk_level[i] = codes[saved['risk_level']]
+        db_performance[i] = saved['overall_performance']
+        last_row[saved['student_id']] = i
+    arrays['db_risk_level'] = db_risk_level
+    arrays['db_rows'] = np.array(list(last_row.values()), dtype=np.int64)
+
+    numeric = records[analysis['analysis_columns']].select_dtypes('number')
+    for i, col in enumerate(numeric.columns):
+        meta['scores'][col] = f"s{i}"
+        arrays[f"s{i}"] = numeric[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    for i, col in enumerate(c for c in plan.identifier if c != plan.key):
+        meta['text'][col] = f"t{i}"
+        arrays[f"t{i}.offsets"], arrays[f"t{i}.data"] = _text_arrays(records[col].tolist())
+
+    if plan.key is not None:
+        ids = [_id_text(v) for v in records[plan.key].tolist()]
+        rows = np.array([i for i, v in enumerate(ids) if v is not None], dtype=np.int64)
+        keys = np.array([ids[i].encode('utf-8') for i in rows], dtype=bytes)
+        if not len(keys):
+            keys = np.array([], dtype='S1')
+        order = np.argsort(keys, kind='stable')
+        arrays['ids'] = keys[order]
+        arrays['id_rows'] = rows[order]
+        arrays['row_ids'] = np.full(n, -1, dtype=np.int64)
+        arrays['row_ids'][arrays['id_rows']] = np.arange(len(rows))
+    meta['dashboard'] = dashboard_stats(db_risk_level, db_performance, arrays['db_rows'])
+
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        # open readers keep the files they mapped
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+class StudentStore:
+    """Read side of a store written by write_store(); columns are memory-mapped
+    on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"{path}: unsupported student store version {self.meta.get('version')}")
+        self._arrays = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def _array(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return array
+
+    def row(self, student_id):
+        # Row of a student id, or None
+        if self.meta['key'] is None:
+            return None
+        ids = self._array('ids')
+        key = str(student_id).encode('utf-8')
+        i = int(np.searchsorted(ids, key))
+        if i < len(ids) and ids[i] == key:
+            return int(self._array('id_rows')[i])
+        return None
+
+    def _text(self, name, row):
+        offsets = self._array(f"{name}.offsets")
+        value = bytes(self._array(f"{name}.data")[offsets[row]:offsets[row + 1]]).decode('utf-8')
+        return value or None
+
+    def record(self, row):
+        # Everything stored for one row, as a dict
+        def number(name):
+            value = float(self._array(name)[row])
+            return None if np.isnan(value) else value
+
+        level = int(self._array('risk_level')[row])
+        db_level = int(self._array('db_risk_level')[row])
+        entry = {'row': row}
+        if self.meta['key'] is not None:
+            i = int(self._array('row_ids')[row])
+            entry[self.meta['key']] = self._array('ids')[i].decode('utf-8') if i >= 0 else None
+        for col, name in self.meta['text'].items():
+            entry[col] = self._text(name, row)
+        entry.update({
+            'scores': {col: number(name) for col, name in self.meta['scores'].items()},
+            'overall_performance': number('overall_performance'),
+            'risk_score': int(self._array('risk_score')[row]),
+            'risk_level': RISK_LEVELS[level] if level != NO_LEVEL else None,
+            'at_risk': bool(self._array('at_risk')[row]),
+            'ml_prediction': number('ml_prediction'),
+            'ml_at_risk': bool(self._array('ml_at_risk')[row]),
+            'db_risk_level': RISK_LEVELS[db_level] if db_level != NO_LEVEL else None,
+            'db_at_risk': db_level == RISK_LEVELS.index('high'),
+        })
+        return entry
+
+    def student(self, student_id):
+        # record() of a student id, or None when it is not in the store
+        row = self.row(student_id)
+        return self.record(row) if row is not None else None
+
+    def at_risk_rows(self, level=None, include_ml=True):
+        # Rows flagged at risk (by the ML model too, unless include_ml is
+        # False; only `level` risk when given), highest risk score first,
+        # then lowest overall performance
+        flagged = np.asarray(self._array('at_risk'))
+        if include_ml:
+            flagged = flagged | np.asarray(self._array('ml_at_risk'))
+        if level is not None:
+            flagged = flagged & (np.asarray(self._array('risk_level')) == RISK_LEVELS.index(level))
+        rows = np.flatnonzero(flagged)
+        performance = np.nan_to_num(np.asarray(self._array('overall_performance'))[rows], nan=0.0)
+        order = np.lexsort((performance, -np.asarray(self._array('risk_score'))[rows]))
+        return rows[order]
+
+    def at_risk(self, level=None, include_ml=True, limit=None):
+        # record() of each at_risk_rows() row, at most `limit`
+        return [self.record(int(row)) for row in self.at_risk_rows(level, include_ml)[:limit]]
+
+    def db_at_risk_rows(self):
+        # Rows of the documents getAtRiskStudents() returns, in its order:
+        # risk_level descending as text, then overall_performance, which is
+        # a virtual MongoDB cannot sort on; every at-risk document is high
+        # risk, so they stay in the order they were inserted
+        rows = np.asarray(self._array('db_rows'))
+        return rows[np.asarray(self._array('db_risk_level'))[rows] == RISK_LEVELS.index('high')]
+
+    def db_at_risk(self, limit=None):
+        # record() of each db_at_risk_rows() row, at most `limit`
+        return [self.record(int(row)) for row in self.db_at_risk_rows()[:limit]]
+
+    def dashboard(self):
+        return self.meta['dashboard']
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Query a student store written with --student-store')
+    parser.add_argument('store', help='store directory')
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument('--student', metavar='ID', help='print one student')
+    query.add_argument('--at-risk', action='store_true',
+                       help="print the analyzer's at-risk students, highest risk score first")
+    query.add_argument('--db-at-risk', action='store_true',
+                       help='print the at-risk students as getAtRiskStudents() would return them')
+    query.add_argument('--dashboard', action='store_true',
+                       help='print the figures getDashboardStats() would return')
+    parser.add_argument('--level', choices=RISK_LEVELS, help='with --at-risk: only this risk level')
+    parser.add_argument('--no-ml', action='store_true', help='with --at-risk: ignore ML flags')
+    parser.add_argument('--limit', type=int, metavar='N', help='with --at-risk or --db-at-risk: at most N students')
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    store = StudentStore(args.store)
+    if args.student is not None:
+        result = store.student(args.student)
+        if result is None:
+            print(f"Student '{args.student}' not found", file=sys.stderr)
+            sys.exit(1)
+    elif args.at_risk:
+        result = store.at_risk(args.level, not args.no_ml, args.limit)
+    elif args.db_at_risk:
+        result = store.db_at_risk(args.limit)
+    else:
+        result = store.dashboard()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()